@@ -0,0 +1,71 @@
+"""Замер стоимости поиска участника по (username, training_id) при росте таблиц.
+
+Заполняет participants и reserve во временной папке data и измеряет
+is_participant, get_participant_status и is_in_reserve. С уникальными и
+покрывающими индексами время растет логарифмически, а не линейно.
+
+Запуск из корня репозитория:
+    python -m benchmarks.participant_lookup [10000 100000 1000000]
+"""
+import random
+import sys
+import tempfile
+import time
+
+from new_bot.database import base
+from new_bot.database.trainer import TrainerDB
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+LOOKUPS = 20_000
+# Сколько участников на одной тренировке
+PER_TRAINING = 20
+
+SCHEDULER_QUERIES = {
+    'invite expiry': "SELECT username, training_id FROM invites WHERE status = 'PENDING' AND invite_timestamp < ?",
+    'payment scan': "SELECT username, training_id FROM participants WHERE status = 'ACTIVE' AND signup_time < ?",
+}
+
+def fill(db: TrainerDB, rows: int) -> None:
+    """Добавляет участников и резерв так, чтобы в participants было rows строк"""
+    start = db.fetch_one("SELECT COUNT(*) FROM participants")[0]
+    with db.transaction():
+        db.connection.executemany(
+            "INSERT INTO participants (username, training_id, signup_time) VALUES (?, ?, datetime('now'))",
+            ((f"user{i % 5000}", i // PER_TRAINING) for i in range(start, rows))
+        )
+        db.connection.executemany(
+            "INSERT INTO reserve (username, training_id, position) VALUES (?, ?, 1)",
+            ((f"user{i % 5000}", i // PER_TRAINING) for i in range(start, rows, PER_TRAINING))
+        )
+
+def measure(db: TrainerDB, rows: int) -> dict:
+    keys = [(f"user{i % 5000}", i // PER_TRAINING) for i in random.sample(range(rows), min(LOOKUPS, rows))]
+    results = {}
+    for name in ('is_participant', 'get_participant_status', 'is_in_reserve'):
+        method = getattr(db, name)
+        started = time.perf_counter()
+        for username, training_id in keys:
+            method(username, training_id)
+        results[name] = (time.perf_counter() - started) / len(keys) * 1e6
+    return results
+
+def print_plans(db: TrainerDB) -> None:
+    for name, query in SCHEDULER_QUERIES.items():
+        plan = db.fetch_all(f"EXPLAIN QUERY PLAN {query}", (0,))
+        print(f"  {name}: {'; '.join(row[3] for row in plan)}")
+
+def main(sizes) -> None:
+    with tempfile.TemporaryDirectory() as data_dir:
+        base.default_data_dir = lambda: data_dir
+        db = TrainerDB('bench')
+        print(f"{'rows':>10} " + " ".join(f"{name:>24}" for name in ('is_participant', 'get_participant_status', 'is_in_reserve')))
+        for rows in sizes:
+            fill(db, rows)
+            results = measure(db, rows)
+            print(f"{rows:>10} " + " ".join(f"{value:>21.1f} us" for value in results.values()))
+        print("Планы запросов планировщика:")
+        print_plans(db)
+        base.close_all_handles()
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
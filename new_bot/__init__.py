@@ -3,7 +3,7 @@ from telebot import TeleBot
 from new_bot.config import TOKEN as BOT_TOKEN
 from new_bot.handlers.admin import register_admin_handlers
 from new_bot.handlers.user import register_user_handlers
-from new_bot.utils.scheduler import InvitationScheduler
+from new_bot.utils.scheduler import EventScheduler
 
 def create_bot():
     bot = TeleBot(BOT_TOKEN)
@@ -12,8 +12,8 @@ def create_bot():
     register_admin_handlers(bot)
     register_user_handlers(bot)
     
-    # Запускаем планировщик проверки приглашений
-    scheduler = InvitationScheduler(bot)
+    # Запускаем планировщик фоновых событий
+    scheduler = EventScheduler(bot)
     scheduler.start()
     
     return bot 
\ No newline at end of file
@@ -1,50 +1,47 @@
-import telebot
+from new_bot import config
 from new_bot.config import TOKEN
-from new_bot.handlers import (
-    register_admin_handlers,
-    register_user_handlers,
-    register_common_handlers
-)
-import threading
-import time
-from datetime import datetime
-from new_bot.utils.scheduler import (
-    PaymentScheduler, 
-    ReserveScheduler, 
-    InvitationScheduler,
-    ReminderScheduler
-)
+from new_bot.database.migrations import migrate_all
+from new_bot.database.importer import import_legacy_trainer_dbs
+from new_bot.runtime import BotRuntime
+
+# Число потоков telebot для обработки обновлений, задается BOT_NUM_THREADS в config.py
+NUM_THREADS = getattr(config, 'BOT_NUM_THREADS', 8)
+
+# Число потоков-шардов планировщика (0 - все задания в одном потоке) и размер очереди шарда
+SCHEDULER_SHARDS = getattr(config, 'SCHEDULER_SHARDS', 0)
+SCHEDULER_SHARD_CAPACITY = getattr(config, 'SCHEDULER_SHARD_CAPACITY', 100)
+
+# Порт локального эндпоинта метрик /metrics (None - только сводка в логе)
+METRICS_PORT = getattr(config, 'METRICS_PORT', None)
+
+# Публичный HTTPS-адрес webhook (None - long polling) и локальный адрес, который слушает бот
+WEBHOOK_URL = getattr(config, 'WEBHOOK_URL', None)
+WEBHOOK_LISTEN = (getattr(config, 'WEBHOOK_HOST', '127.0.0.1'), getattr(config, 'WEBHOOK_PORT', 8443))
+WEBHOOK_SECRET = getattr(config, 'WEBHOOK_SECRET', None)
+WEBHOOK_QUEUE_SIZE = getattr(config, 'WEBHOOK_QUEUE_SIZE', 100)
+
+# Работа поверх AsyncTeleBot: один event loop для Telegram API вместо потока на обновление (нужен aiohttp)
+USE_ASYNCIO = getattr(config, 'BOT_ASYNCIO', False)
 
 def main():
-    while True:
-        try:
-            # Инициализация бота
-            bot = telebot.TeleBot(TOKEN)
-            
-            # Регистрация всех обработчиков
-            register_common_handlers(bot)
-            register_admin_handlers(bot)
-            register_user_handlers(bot)
-            
-            # Запускаем планировщики
-            payment_scheduler = PaymentScheduler(bot)
-            reserve_scheduler = ReserveScheduler(bot)
-            invitation_scheduler = InvitationScheduler(bot)
-            reminder_scheduler = ReminderScheduler(bot)
-            
-            payment_scheduler.start()
-            reserve_scheduler.start()
-            invitation_scheduler.start()
-            reminder_scheduler.start()
-            
-            # Запуск бота с настройками переподключения
-            print("Бот запущен...")
-            bot.infinity_polling(timeout=60, long_polling_timeout=60)
-        except Exception as e:
-            print(f"Произошла ошибка: {e}")
-            print("Попытка перезапуска через 5 секунд...")
-            time.sleep(5)
-            continue
+    # Один раз приводим схемы всех баз данных к актуальной версии
+    migrate_all()
+    import_legacy_trainer_dbs()
+
+    # Бот и планировщик создаются один раз, перезапускается только polling
+    runtime = BotRuntime(
+        TOKEN,
+        num_threads=NUM_THREADS,
+        scheduler_shards=SCHEDULER_SHARDS,
+        shard_capacity=SCHEDULER_SHARD_CAPACITY,
+        metrics_port=METRICS_PORT,
+        webhook_url=WEBHOOK_URL,
+        webhook_listen=WEBHOOK_LISTEN,
+        webhook_secret=WEBHOOK_SECRET,
+        webhook_queue_size=WEBHOOK_QUEUE_SIZE,
+        use_asyncio=USE_ASYNCIO
+    )
+    runtime.run()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
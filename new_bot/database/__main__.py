@@ -0,0 +1,4 @@
+# Запуск миграций: python -m new_bot.database [--dry-run]
+from new_bot.database.migrations import main
+
+main()
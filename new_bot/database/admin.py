@@ -1,47 +1,54 @@
+import json
 import os
-from typing import List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 from new_bot.database.base import BaseDB
 from new_bot.types import Training, User
+from new_bot.database.migrations import Migration, add_column_if_missing
+
+def _create_admin_schema(conn) -> None:
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS admins (
+        username TEXT PRIMARY KEY,
+        channel_id INTEGER,
+        payment_details TEXT,
+        invite_limit INTEGER DEFAULT 0,
+        payment_time_limit INTEGER DEFAULT 0
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        user_id INTEGER
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS admin_requests (
+        username TEXT,
+        channel_id INTEGER,
+        request_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+        status TEXT DEFAULT 'PENDING',
+        PRIMARY KEY (username, channel_id)
+    )
+    ''')
+
+def _add_payment_time_limit(conn) -> None:
+    add_column_if_missing(conn, 'admins', 'payment_time_limit', 'INTEGER DEFAULT 0')
+
+def _add_reminder_offsets(conn) -> None:
+    add_column_if_missing(conn, 'admins', 'reminder_offsets', 'TEXT')
+
+# Напоминания по умолчанию: за 24 часа и за час до тренировки (в минутах)
+DEFAULT_REMINDER_OFFSETS = [24 * 60, 60]
 
 class AdminDB(BaseDB):
+    MIGRATIONS = [
+        Migration(1, "Базовая схема админов и пользователей", _create_admin_schema),
+        Migration(2, "Колонка payment_time_limit в admins", _add_payment_time_limit),
+        Migration(3, "Колонка reminder_offsets в admins", _add_reminder_offsets),
+    ]
+
     def __init__(self, db_path: str = 'admin.db'):
         super().__init__(db_path)
-        self.execute_query('''
-        CREATE TABLE IF NOT EXISTS admin_requests (
-            username TEXT,
-            channel_id INTEGER,
-            request_time DATETIME DEFAULT CURRENT_TIMESTAMP,
-            status TEXT DEFAULT 'PENDING',
-            PRIMARY KEY (username, channel_id)
-        )
-        ''')
-
-    def _initialize_db(self):
-        """Инициализирует базу данных"""
-        self.execute_query('''
-        CREATE TABLE IF NOT EXISTS admins (
-            username TEXT PRIMARY KEY,
-            channel_id INTEGER,
-            payment_details TEXT,
-            invite_limit INTEGER DEFAULT 0,
-            payment_time_limit INTEGER DEFAULT 0
-        )
-        ''')
-        
-        # Проверяем существующие колонки
-        columns = self.fetch_all("PRAGMA table_info(admins)")
-        column_names = [column[1] for column in columns]
-        
-        # Добавляем колонку payment_time_limit, если её нет
-        if 'payment_time_limit' not in column_names:
-            self.execute_query('ALTER TABLE admins ADD COLUMN payment_time_limit INTEGER DEFAULT 0')
-
-        self.execute_query('''
-        CREATE TABLE IF NOT EXISTS users (
-            username TEXT PRIMARY KEY,
-            user_id INTEGER
-        )
-        ''')
 
     def is_admin(self, username: str, channel_id: int) -> bool:
         """Проверяет, является ли пользователь админом канала"""
@@ -201,4 +208,54 @@ class AdminDB(BaseDB):
             "SELECT payment_time_limit FROM admins WHERE username = ?",
             (username,)
         )
-        return result[0] if result else 0 
\ No newline at end of file
+        return result[0] if result else 0
+
+    def get_payment_context(self, admins: Iterable[str], usernames: Iterable[str]) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """Одним запросом получает лимиты времени на оплату админов и user_id пользователей"""
+        rows = self.fetch_all('''
+            SELECT 'limit', username, MAX(payment_time_limit) FROM admins
+            WHERE username IN (SELECT value FROM json_each(?))
+            GROUP BY username
+            UNION ALL
+            SELECT 'user', username, user_id FROM users
+            WHERE username IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(list(admins)), json.dumps(list(usernames))))
+        limits = {row[1]: row[2] or 0 for row in rows if row[0] == 'limit'}
+        user_ids = {row[1]: row[2] for row in rows if row[0] == 'user'}
+        return limits, user_ids
+
+    def get_broadcast_audience(self, exclude_usernames: Iterable[str] = ()) -> List[int]:
+        """Одним запросом получает user_id получателей рассылки: все пользователи,
+        кроме админов и переданных username (например, уже записанных автозаписью)"""
+        rows = self.fetch_all('''
+            SELECT DISTINCT u.user_id FROM users u
+            WHERE u.user_id IS NOT NULL
+              AND u.username NOT IN (SELECT value FROM json_each(?))
+              AND NOT EXISTS (
+                  SELECT 1 FROM admins a
+                  WHERE a.username = u.username AND a.channel_id IS NOT NULL
+              )
+        ''', (json.dumps(list(exclude_usernames)),))
+        return [row[0] for row in rows]
+
+    def set_reminder_offsets(self, username: str, offsets: List[int]) -> bool:
+        """Устанавливает, за сколько минут до тренировки напоминать (пустой список - не напоминать)"""
+        try:
+            self.execute_query(
+                "UPDATE admins SET reminder_offsets = ? WHERE username = ?",
+                (",".join(str(minutes) for minutes in offsets), username)
+            )
+            return True
+        except Exception as e:
+            print(f"Error setting reminder offsets: {e}")
+            return False
+
+    def get_reminder_offsets(self, username: str) -> List[int]:
+        """Получает, за сколько минут до тренировки напоминать"""
+        result = self.fetch_one(
+            "SELECT reminder_offsets FROM admins WHERE username = ? AND reminder_offsets IS NOT NULL",
+            (username,)
+        )
+        if not result:
+            return list(DEFAULT_REMINDER_OFFSETS)
+        return [int(minutes) for minutes in result[0].split(",") if minutes]
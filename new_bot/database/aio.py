@@ -0,0 +1,23 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+class AsyncDB:
+    """Асинхронный фасад над синхронными базами.
+
+    sqlite3 блокирует поток, поэтому вызовы уходят в ограниченный пул потоков,
+    а корутина только ждет результат: тысячи одновременных обработчиков стоят
+    в очереди пула, а не занимают каждый свой поток.
+    """
+
+    def __init__(self, workers: int = 8):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db-executor")
+
+    async def run(self, func, *args, **kwargs):
+        """Выполняет блокирующий вызов в пуле и возвращает его результат"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        """Дожидается уже поставленных вызовов и останавливает пул"""
+        self._executor.shutdown(wait=True)
@@ -1,7 +1,13 @@
-from typing import Any, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import sqlite3
+import threading
+import weakref
+from concurrent.futures import Future
 from contextlib import contextmanager
 import os
+from new_bot.database.migrations import Migration, apply_migrations, default_data_dir
+from new_bot.database.storage import get_storage_settings, open_connection
+from new_bot.database.writer import WriteQueue
 
 @contextmanager
 def db_connection(db_name):
@@ -11,59 +17,232 @@ def db_connection(db_name):
     finally:
         conn.close()
 
+# Подписчики на зафиксированные изменения: listener(db_path) после каждого commit
+_write_listeners: List[Callable[[str], None]] = []
+
+def add_write_listener(listener: Callable[[str], None]) -> None:
+    """Подписывает функцию на изменения в БД (например, чтобы разбудить планировщик)"""
+    _write_listeners.append(listener)
+
+def remove_write_listener(listener: Callable[[str], None]) -> None:
+    if listener in _write_listeners:
+        _write_listeners.remove(listener)
+
+# Число запросов к БД, выполненных текущим потоком (для метрик планировщика)
+_query_stats = threading.local()
+
+def queries_in_thread() -> int:
+    return getattr(_query_stats, 'count', 0)
+
+def _count_query() -> None:
+    _query_stats.count = getattr(_query_stats, 'count', 0) + 1
+
+class DBHandle:
+    """Соединения с файлом БД: у каждого потока свое, записи сериализуются общей блокировкой.
+
+    В режиме WAL чтения из разных потоков идут параллельно и не ждут писателя.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        # Блокировка записи: одна транзакция на файл внутри процесса
+        self.lock = threading.RLock()
+        self.initialized = False
+        self.closed = False
+        self._local = threading.local()
+        # ident потока -> (слабая ссылка на поток, соединение), чтобы закрывать их из любого потока
+        self._connections: Dict[int, Tuple[weakref.ref, sqlite3.Connection]] = {}
+        self._connections_lock = threading.Lock()
+
+        settings = get_storage_settings(db_path)
+        self.writer: Optional[WriteQueue] = (
+            WriteQueue(self, settings.write_batch_size) if settings.write_queue else None
+        )
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Соединение текущего потока, открывается при первом обращении"""
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            conn = open_connection(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            self._local.connection = conn
+            self._local.depth = 0
+            with self._connections_lock:
+                self._close_dead_connections()
+                self._connections[threading.get_ident()] = (weakref.ref(threading.current_thread()), conn)
+        return conn
+
+    @property
+    def depth(self) -> int:
+        """Глубина вложенности transaction() в текущем потоке"""
+        return getattr(self._local, 'depth', 0)
+
+    @depth.setter
+    def depth(self, value: int) -> None:
+        self._local.depth = value
+
+    def _close_dead_connections(self) -> None:
+        # Соединения завершившихся потоков больше никто не использует
+        for ident, (thread_ref, conn) in list(self._connections.items()):
+            thread = thread_ref()
+            if thread is None or not thread.is_alive():
+                conn.close()
+                del self._connections[ident]
+
+    def committed(self) -> None:
+        """Сообщает подписчикам о зафиксированной записи"""
+        for listener in list(_write_listeners):
+            try:
+                listener(self.db_path)
+            except Exception as e:
+                print(f"Error in write listener: {e}")
+
+    def close(self) -> None:
+        # Писатель сам берет lock, поэтому останавливаем его до захвата блокировки
+        if self.writer:
+            self.writer.stop()
+        with self.lock:
+            self.closed = True
+            with self._connections_lock:
+                for _, conn in self._connections.values():
+                    conn.close()
+                self._connections.clear()
+
+# Реестр открытых соединений: путь к файлу -> DBHandle
+_handles: Dict[str, DBHandle] = {}
+_handles_lock = threading.Lock()
+
+def get_handle(db_path: str) -> DBHandle:
+    """Возвращает общий DBHandle для файла БД, создавая его при первом обращении"""
+    handle = _handles.get(db_path)
+    if handle is None:
+        with _handles_lock:
+            handle = _handles.get(db_path)
+            if handle is None:
+                handle = DBHandle(db_path)
+                _handles[db_path] = handle
+    return handle
+
+def close_all_handles() -> None:
+    """Закрывает все открытые соединения (например, перед удалением файлов БД)"""
+    with _handles_lock:
+        for handle in _handles.values():
+            handle.close()
+        _handles.clear()
+
 class BaseDB:
+    # Упорядоченные шаги миграции схемы, переопределяются в наследниках
+    MIGRATIONS: List[Migration] = []
+
     def __init__(self, db_path: str = 'bot.db'):
         # Создаем папку data, если её нет
-        data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+        data_dir = default_data_dir()
         os.makedirs(data_dir, exist_ok=True)
-        
+
         # Путь к базе данных в папке data
         self.db_path = os.path.join(data_dir, db_path)
-        self.connection = None
-        self.cursor = None
-        self._connect()
-        self._initialize_db()
+        self._open()
+
+    def _open(self) -> DBHandle:
+        """Получает общее соединение и один раз за процесс инициализирует схему"""
+        handle = get_handle(self.db_path)
+        self._handle = handle
+        if not handle.initialized:
+            with handle.lock:
+                if not handle.initialized:
+                    self._initialize_db()
+                    handle.initialized = True
+        return handle
+
+    def _current_handle(self) -> DBHandle:
+        # Соединение могло быть закрыто через close_all_handles - открываем заново
+        return self._open() if self._handle.closed else self._handle
 
-    def _connect(self):
-        """Устанавливает соединение с базой данных"""
-        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
-        self.connection.row_factory = sqlite3.Row
-        self.cursor = self.connection.cursor()
+    @property
+    def connection(self) -> sqlite3.Connection:
+        return self._current_handle().connection
+
+    @contextmanager
+    def transaction(self):
+        """Объединяет несколько запросов в одну транзакцию с одним commit.
+
+        При исключении все изменения откатываются. Вложенные вызовы
+        присоединяются к внешней транзакции.
+        """
+        handle = self._current_handle()
+        with handle.lock:
+            if handle.depth:
+                handle.depth += 1
+                try:
+                    yield self
+                finally:
+                    handle.depth -= 1
+                return
+
+            conn = handle.connection
+            changes = conn.total_changes
+            conn.execute("BEGIN IMMEDIATE")
+            handle.depth = 1
+            try:
+                yield self
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+            finally:
+                handle.depth = 0
+            # Транзакция только читала - подписчиков будить незачем
+            changed = conn.total_changes != changes
+        if changed:
+            handle.committed()
+
+    def submit_query(self, query: str, params: tuple = ()) -> Future:
+        """Отправляет запрос на изменение и возвращает Future с результатом execute_query.
+
+        В режиме write_queue запрос выполняет поток-писатель в общей пачке,
+        иначе он выполняется сразу и возвращается готовый Future.
+        """
+        handle = self._current_handle()
+        if handle.writer and not handle.depth:
+            _count_query()
+            return handle.writer.submit(query, params)
+
+        future = Future()
+        try:
+            future.set_result(self.execute_query(query, params))
+        except Exception as e:
+            future.set_exception(e)
+        return future
 
     def execute_query(self, query: str, params: tuple = ()) -> Optional[int]:
         """Выполняет запрос и возвращает id последней вставленной записи для INSERT"""
-        self.cursor.execute(query, params)
-        self.connection.commit()
-        return self.cursor.lastrowid if query.strip().upper().startswith('INSERT') else None
+        _count_query()
+        handle = self._current_handle()
+        # Вне transaction() запрос уходит писателю и ждет commit своей пачки
+        if handle.writer and not handle.depth:
+            return handle.writer.submit(query, params).result()
+
+        with handle.lock:
+            cursor = handle.connection.execute(query, params)
+            # Внутри transaction() фиксация выполняется один раз в конце
+            committed = not handle.depth
+            if committed:
+                handle.connection.commit()
+        if committed:
+            handle.committed()
+        return cursor.lastrowid if query.strip().upper().startswith('INSERT') else None
 
     def fetch_all(self, query: str, params: tuple = ()) -> List[Tuple]:
-        self.cursor.execute(query, params)
-        return self.cursor.fetchall()
+        # Чтение идет через соединение потока без блокировки записи
+        _count_query()
+        return self._current_handle().connection.execute(query, params).fetchall()
 
     def fetch_one(self, query: str, params: tuple = ()) -> Optional[Tuple]:
-        self.cursor.execute(query, params)
-        return self.cursor.fetchone()
+        _count_query()
+        return self._current_handle().connection.execute(query, params).fetchone()
 
     def _initialize_db(self) -> None:
-        """Метод для инициализации базы данных. Должен быть переопределен в наследниках."""
-        self.create_training_table()
-
-    def create_training_table(self):
-        self.execute_query('''
-            CREATE TABLE IF NOT EXISTS schedule (
-                training_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date_time TEXT,
-                duration INTEGER,
-                kind TEXT,
-                location TEXT,
-                status TEXT,
-                max_participants INTEGER DEFAULT 10,
-                price INTEGER DEFAULT 0
-            )
-        ''')
-
-    def __del__(self):
-        if hasattr(self, 'cursor'):
-            self.cursor.close()
-        if hasattr(self, 'connection'):
-            self.connection.close() 
\ No newline at end of file
+        """Приводит схему к последней версии. Для актуальной БД это одно чтение PRAGMA user_version"""
+        apply_migrations(self._handle.connection, self.MIGRATIONS)
@@ -1,20 +1,25 @@
-from typing import List, Optional, Tuple
+import json
+from typing import Dict, List, Optional, Tuple
 from new_bot.database.base import BaseDB
+from new_bot.database.migrations import Migration
+
+def _create_channel_schema(conn) -> None:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS channels (
+            channel_id INTEGER PRIMARY KEY,
+            title TEXT,
+            added_date DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
 
 class ChannelDB(BaseDB):
+    MIGRATIONS = [
+        Migration(1, "Базовая схема групп", _create_channel_schema),
+    ]
+
     def __init__(self):
         super().__init__('channels.db')
 
-    def _initialize_db(self):
-        """Инициализирует базу данных для каналов"""
-        self.execute_query('''
-            CREATE TABLE IF NOT EXISTS channels (
-                channel_id INTEGER PRIMARY KEY,
-                title TEXT,
-                added_date DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
     def add_channel(self, channel_id: int, title: str) -> bool:
         """Добавляет новый канал"""
         try:
@@ -43,6 +48,14 @@ class ChannelDB(BaseDB):
             (channel_id,)
         )
 
+    def get_channel_titles(self, channel_ids: List[int]) -> Dict[int, str]:
+        """Получает названия нескольких каналов одним запросом"""
+        rows = self.fetch_all(
+            "SELECT channel_id, title FROM channels WHERE channel_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(channel_ids)),)
+        )
+        return {row[0]: row[1] for row in rows}
+
     def get_all_channels(self) -> List[Tuple[int, str]]:
         """Получает список всех каналов"""
         return self.fetch_all("SELECT channel_id, title FROM channels")
@@ -0,0 +1,256 @@
+import argparse
+import os
+import sqlite3
+from contextlib import closing
+from dataclasses import dataclass
+from typing import List, Optional
+from new_bot.database.migrations import (
+    Migration,
+    add_column_if_missing,
+    apply_migrations,
+    column_exists,
+    default_data_dir
+)
+from new_bot.database.storage import open_connection
+
+# Схема старых файлов trainer_{username}.db (по одному файлу на админа)
+def _create_legacy_schema(conn) -> None:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schedule (
+            training_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel_id INTEGER NOT NULL,
+            date_time TEXT,
+            duration INTEGER,
+            kind TEXT,
+            location TEXT,
+            status TEXT,
+            max_participants INTEGER DEFAULT 10,
+            price INTEGER DEFAULT 0,
+            topic_id INTEGER DEFAULT NULL,
+            FOREIGN KEY (channel_id) REFERENCES channels(channel_id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS participants (
+            username TEXT,
+            training_id INTEGER,
+            status TEXT DEFAULT 'ACTIVE',
+            paid INTEGER DEFAULT 0,
+            signup_time TIMESTAMP,
+            FOREIGN KEY (training_id) REFERENCES schedule(training_id)
+        )
+    ''')
+    # Таблица для статистики
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS statistics (
+            username TEXT,
+            training_id INTEGER,
+            action TEXT,  -- 'signup' или 'cancel'
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(training_id) REFERENCES schedule(training_id)
+        )
+    ''')
+    # Таблица для резерва
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reserve (
+            username TEXT,
+            training_id INTEGER,
+            position INTEGER,
+            status TEXT DEFAULT 'WAITING',
+            offer_timestamp DATETIME,  -- Время, когда было сделано предложение
+            FOREIGN KEY(training_id) REFERENCES schedule(training_id)
+        )
+    ''')
+    # Таблица для приглашений
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS invites (
+            username TEXT,
+            invited_by TEXT,
+            training_id INTEGER,
+            status TEXT DEFAULT 'PENDING',
+            invite_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(training_id) REFERENCES schedule(training_id)
+        )
+    ''')
+    # Таблица для хранения баланса автозаписей
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS auto_signups_balance (
+            username TEXT PRIMARY KEY,
+            balance INTEGER DEFAULT 1
+        )
+    ''')
+    # Таблица для хранения запросов на автозапись
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS auto_signup_requests (
+            username TEXT,
+            training_id INTEGER,
+            request_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (username, training_id),
+            FOREIGN KEY (training_id) REFERENCES schedule(training_id) ON DELETE CASCADE
+        )
+    ''')
+
+def _add_schedule_columns(conn) -> None:
+    add_column_if_missing(conn, 'schedule', 'topic_id', 'INTEGER DEFAULT NULL')
+    add_column_if_missing(conn, 'schedule', 'price', 'INTEGER DEFAULT 0')
+
+def _add_participants_signup_time(conn) -> None:
+    if not column_exists(conn, 'participants', 'signup_time'):
+        conn.execute('ALTER TABLE participants ADD COLUMN signup_time TIMESTAMP')
+        # Для существующих записей считаем временем записи момент миграции
+        conn.execute("UPDATE participants SET signup_time = datetime('now') WHERE signup_time IS NULL")
+
+LEGACY_TRAINER_MIGRATIONS = [
+    Migration(1, "Базовая схема тренировок", _create_legacy_schema),
+    Migration(2, "Колонки topic_id и price в schedule", _add_schedule_columns),
+    Migration(3, "Колонка signup_time в participants", _add_participants_signup_time),
+]
+
+STORE_FILE = 'trainers.db'
+
+@dataclass
+class ImportReport:
+    """Результат переноса одного файла trainer_*.db в общее хранилище"""
+    file: str
+    admin_username: str
+    trainings: int = 0
+    remapped: int = 0
+    skipped: bool = False
+    error: Optional[str] = None
+
+def is_legacy_trainer_file(file_name: str) -> bool:
+    return file_name.startswith('trainer_') and file_name.endswith('.db')
+
+def _import_file(store, file_path: str, admin_username: str) -> ImportReport:
+    report = ImportReport(file=os.path.basename(file_path), admin_username=admin_username)
+
+    store.execute("ATTACH DATABASE ? AS legacy", (file_path,))
+    try:
+        store.execute("BEGIN")
+        store.execute("CREATE TEMP TABLE id_map (old_id INTEGER PRIMARY KEY, new_id INTEGER)")
+
+        rows = store.execute('''
+            SELECT training_id, channel_id, date_time, duration, kind, location,
+                   status, max_participants, price, topic_id
+            FROM legacy.schedule ORDER BY training_id
+        ''').fetchall()
+        for row in rows:
+            old_id = row[0]
+            taken = store.execute("SELECT 1 FROM main.schedule WHERE training_id = ?", (old_id,)).fetchone()
+            # Сохраняем старый ID, чтобы кнопки в уже отправленных сообщениях продолжали работать
+            keep_id = not taken
+            cursor = store.execute('''
+                INSERT INTO main.schedule
+                (training_id, admin_username, channel_id, date_time, duration, kind, location,
+                 status, max_participants, price, topic_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (old_id if keep_id else None, admin_username) + tuple(row[1:]))
+            store.execute("INSERT INTO temp.id_map (old_id, new_id) VALUES (?, ?)", (old_id, cursor.lastrowid))
+            report.trainings += 1
+            if not keep_id:
+                report.remapped += 1
+
+        store.execute('''
+            INSERT OR IGNORE INTO main.participants (username, training_id, status, paid, signup_time)
+            SELECT p.username, m.new_id, p.status, p.paid, p.signup_time
+            FROM legacy.participants p JOIN temp.id_map m ON m.old_id = p.training_id
+            ORDER BY p.rowid
+        ''')
+        store.execute('''
+            INSERT INTO main.statistics (username, training_id, action, timestamp)
+            SELECT s.username, m.new_id, s.action, s.timestamp
+            FROM legacy.statistics s JOIN temp.id_map m ON m.old_id = s.training_id
+        ''')
+        store.execute('''
+            INSERT OR IGNORE INTO main.reserve (username, training_id, position, status, offer_timestamp)
+            SELECT r.username, m.new_id, r.position, r.status, r.offer_timestamp
+            FROM legacy.reserve r JOIN temp.id_map m ON m.old_id = r.training_id
+        ''')
+        store.execute('''
+            INSERT OR REPLACE INTO main.invites (username, invited_by, training_id, status, invite_timestamp)
+            SELECT i.username, i.invited_by, m.new_id, i.status, i.invite_timestamp
+            FROM legacy.invites i JOIN temp.id_map m ON m.old_id = i.training_id
+            ORDER BY i.invite_timestamp, i.rowid
+        ''')
+        store.execute('''
+            INSERT OR IGNORE INTO main.auto_signup_requests (username, training_id, request_timestamp)
+            SELECT a.username, m.new_id, a.request_timestamp
+            FROM legacy.auto_signup_requests a JOIN temp.id_map m ON m.old_id = a.training_id
+        ''')
+        # Баланс автозаписей пользователя хранился в его собственном файле
+        store.execute('''
+            INSERT OR IGNORE INTO main.auto_signups_balance (username, balance)
+            SELECT username, balance FROM legacy.auto_signups_balance WHERE username = ?
+        ''', (admin_username,))
+
+        store.execute(
+            "INSERT INTO main.legacy_imports (file_name, trainings) VALUES (?, ?)",
+            (report.file, report.trainings)
+        )
+        store.execute("DROP TABLE temp.id_map")
+        store.commit()
+    except Exception:
+        store.rollback()
+        raise
+    finally:
+        store.execute("DETACH DATABASE legacy")
+    return report
+
+def import_legacy_trainer_dbs(data_dir: Optional[str] = None, dry_run: bool = False) -> List[ImportReport]:
+    """Переносит данные из файлов trainer_*.db в общее хранилище trainers.db.
+
+    Каждый файл переносится один раз в отдельной транзакции, сами файлы не удаляются.
+    """
+    from new_bot.database.trainer import TrainingStore
+
+    data_dir = data_dir or default_data_dir()
+    if not os.path.isdir(data_dir):
+        return []
+
+    legacy_files = sorted(f for f in os.listdir(data_dir) if is_legacy_trainer_file(f))
+    if not legacy_files:
+        return []
+
+    reports = []
+    with closing(open_connection(os.path.join(data_dir, STORE_FILE))) as store:
+        apply_migrations(store, TrainingStore.MIGRATIONS)
+        imported = {row[0] for row in store.execute("SELECT file_name FROM legacy_imports")}
+
+        for file_name in legacy_files:
+            admin_username = file_name[len('trainer_'):-len('.db')]
+            if file_name in imported:
+                reports.append(ImportReport(file=file_name, admin_username=admin_username, skipped=True))
+                continue
+            if dry_run:
+                reports.append(ImportReport(file=file_name, admin_username=admin_username))
+                continue
+
+            file_path = os.path.join(data_dir, file_name)
+            try:
+                with closing(sqlite3.connect(file_path)) as legacy:
+                    apply_migrations(legacy, LEGACY_TRAINER_MIGRATIONS)
+                reports.append(_import_file(store, file_path, admin_username))
+            except Exception as e:
+                print(f"Ошибка переноса {file_name}: {e}")
+                reports.append(ImportReport(file=file_name, admin_username=admin_username, error=str(e)))
+    return reports
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос trainer_*.db в общее хранилище trainers.db")
+    parser.add_argument('--dry-run', action='store_true', help="только показать, какие файлы будут перенесены")
+    parser.add_argument('--data-dir', default=None, help="папка с файлами *.db")
+    args = parser.parse_args()
+
+    for report in import_legacy_trainer_dbs(args.data_dir, dry_run=args.dry_run):
+        if report.error:
+            status = f"ошибка: {report.error}"
+        elif report.skipped:
+            status = "уже перенесен"
+        elif args.dry_run:
+            status = "будет перенесен"
+        else:
+            status = f"перенесено тренировок: {report.trainings}, с новым ID: {report.remapped}"
+        print(f"{report.file} (@{report.admin_username}): {status}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import os
+import sqlite3
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+from new_bot.database.storage import open_connection
+
+@dataclass
+class Migration:
+    """Шаг миграции схемы. Шаги применяются по порядку, номер сохраняется в PRAGMA user_version"""
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Connection], None]
+
+@dataclass
+class MigrationReport:
+    """Результат проверки/применения миграций для одного файла БД"""
+    file: str
+    current_version: int
+    target_version: int
+    pending: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+def get_user_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+def add_column_if_missing(conn: sqlite3.Connection, table: str, column: str, definition: str) -> None:
+    """Идемпотентно добавляет колонку в таблицу"""
+    if not column_exists(conn, table, column):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def pending_migrations(conn: sqlite3.Connection, migrations: List[Migration]) -> List[Migration]:
+    current = get_user_version(conn)
+    return [m for m in sorted(migrations, key=lambda m: m.version) if m.version > current]
+
+def apply_migrations(conn: sqlite3.Connection, migrations: List[Migration]) -> List[Migration]:
+    """Применяет недостающие миграции, каждую в отдельной транзакции"""
+    applied = []
+    for migration in pending_migrations(conn, migrations):
+        conn.execute("BEGIN")
+        try:
+            migration.apply(conn)
+            conn.execute(f"PRAGMA user_version = {int(migration.version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(migration)
+    return applied
+
+def get_migrations_for_file(file_name: str) -> Optional[List[Migration]]:
+    """Определяет набор миграций по имени файла БД"""
+    from new_bot.database.admin import AdminDB
+    from new_bot.database.channel import ChannelDB
+    from new_bot.database.importer import LEGACY_TRAINER_MIGRATIONS, is_legacy_trainer_file
+    from new_bot.database.outbox import OutboxDB
+    from new_bot.database.trainer import TrainingStore
+
+    known: Dict[str, List[Migration]] = {
+        'admin.db': AdminDB.MIGRATIONS,
+        'channels.db': ChannelDB.MIGRATIONS,
+        'trainers.db': TrainingStore.MIGRATIONS,
+        'outbox.db': OutboxDB.MIGRATIONS,
+    }
+    if file_name in known:
+        return known[file_name]
+    if is_legacy_trainer_file(file_name):
+        return LEGACY_TRAINER_MIGRATIONS
+    return None
+
+def default_data_dir() -> str:
+    """Папка с файлами БД: BOT_DATA_DIR из окружения или new_bot/data"""
+    return os.environ.get('BOT_DATA_DIR') or os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+
+def migrate_all(data_dir: Optional[str] = None, dry_run: bool = False) -> List[MigrationReport]:
+    """Приводит все файлы data/*.db к последней версии схемы.
+
+    В режиме dry_run только сообщает, какие миграции будут применены.
+    """
+    data_dir = data_dir or default_data_dir()
+    if not os.path.isdir(data_dir):
+        return []
+
+    reports = []
+    for file_name in sorted(os.listdir(data_dir)):
+        migrations = get_migrations_for_file(file_name)
+        if migrations is None:
+            continue
+
+        target = max((m.version for m in migrations), default=0)
+        report = MigrationReport(file=file_name, current_version=0, target_version=target)
+        try:
+            with closing(open_connection(os.path.join(data_dir, file_name))) as conn:
+                report.current_version = get_user_version(conn)
+                pending = pending_migrations(conn, migrations)
+                report.pending = [f"{m.version}: {m.description}" for m in pending]
+                if not dry_run:
+                    apply_migrations(conn, migrations)
+        except Exception as e:
+            report.error = str(e)
+            print(f"Ошибка миграции {file_name}: {e}")
+        reports.append(report)
+    return reports
+
+def format_reports(reports: List[MigrationReport], dry_run: bool = False) -> str:
+    lines = []
+    for report in reports:
+        if report.error:
+            status = f"ошибка: {report.error}"
+        elif not report.pending:
+            status = "актуальна"
+        else:
+            status = "будут применены" if dry_run else "применены"
+        lines.append(f"{report.file}: v{report.current_version} -> v{report.target_version} ({status})")
+        for description in report.pending:
+            lines.append(f"    {description}")
+    return "\n".join(lines) if lines else "Файлы баз данных не найдены"
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграции схемы баз данных бота")
+    parser.add_argument('--dry-run', action='store_true', help="только показать, что будет применено")
+    parser.add_argument('--data-dir', default=None, help="папка с файлами *.db")
+    args = parser.parse_args()
+
+    reports = migrate_all(args.data_dir, dry_run=args.dry_run)
+    print(format_reports(reports, dry_run=args.dry_run))
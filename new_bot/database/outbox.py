@@ -0,0 +1,182 @@
+import json
+import time
+from typing import Iterable, List, Optional
+from new_bot.database.base import BaseDB
+from new_bot.database.migrations import Migration, add_column_if_missing
+from new_bot.types import Broadcast, OutboxMessage
+
+def _create_outbox_schema(conn) -> None:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            reply_markup TEXT,
+            parse_mode TEXT,
+            status TEXT NOT NULL DEFAULT 'PENDING',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            not_before REAL NOT NULL,
+            created_at REAL NOT NULL,
+            last_error TEXT
+        )
+    ''')
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (status, not_before, id)"
+    )
+
+def _create_broadcasts(conn) -> None:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            notify_chat_id INTEGER,
+            total INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            finished_at REAL
+        )
+    ''')
+    add_column_if_missing(conn, 'outbox', 'broadcast_id', 'INTEGER')
+    add_column_if_missing(conn, 'outbox', 'sent_at', 'REAL')
+    # Один получатель - одно сообщение рассылки, даже если ее поставили повторно
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_broadcast_chat
+        ON outbox (broadcast_id, chat_id) WHERE broadcast_id IS NOT NULL
+    ''')
+
+# Сколько хранить состояние доставки завершенных рассылок, секунды
+BROADCAST_RETENTION = 30 * 24 * 3600
+
+OUTBOX_COLUMNS = "id, chat_id, text, reply_markup, parse_mode, attempts, not_before, broadcast_id"
+
+def _markup_json(reply_markup) -> Optional[str]:
+    # Клавиатуры telebot сериализуются через to_json, строка считается готовым JSON
+    if reply_markup is None or isinstance(reply_markup, str):
+        return reply_markup
+    return reply_markup.to_json()
+
+class OutboxDB(BaseDB):
+    """Очередь исходящих сообщений (data/outbox.db), переживает перезапуск бота.
+
+    Отправленные одиночные сообщения удаляются. Сообщения рассылок остаются
+    со статусом SENT, чтобы после перезапуска продолжить рассылку без повторов.
+    Окончательно не доставленные остаются со статусом FAILED и текстом ошибки.
+    """
+
+    MIGRATIONS = [
+        Migration(1, "Очередь исходящих сообщений", _create_outbox_schema),
+        Migration(2, "Рассылки и состояние доставки получателям", _create_broadcasts),
+    ]
+
+    def __init__(self):
+        super().__init__('outbox.db')
+
+    def enqueue(self, chat_id: int, text: str, reply_markup=None, parse_mode: Optional[str] = None) -> int:
+        """Ставит сообщение в очередь и возвращает его id"""
+        now = time.time()
+        return self.execute_query(
+            "INSERT INTO outbox (chat_id, text, reply_markup, parse_mode, not_before, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (chat_id, text, _markup_json(reply_markup), parse_mode, now, now)
+        )
+
+    def create_broadcast(self, title: str, chat_ids: Iterable[int], text: str, reply_markup=None,
+                         parse_mode: Optional[str] = None, notify_chat_id: Optional[int] = None) -> int:
+        """Сохраняет рассылку и по сообщению на каждого получателя одной транзакцией"""
+        now = time.time()
+        markup = _markup_json(reply_markup)
+        with self.transaction():
+            broadcast_id = self.execute_query(
+                "INSERT INTO broadcasts (title, notify_chat_id, created_at) VALUES (?, ?, ?)",
+                (title, notify_chat_id, now)
+            )
+            self.connection.executemany('''
+                INSERT OR IGNORE INTO outbox
+                    (chat_id, text, reply_markup, parse_mode, not_before, created_at, broadcast_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(chat_id, text, markup, parse_mode, now, now, broadcast_id) for chat_id in chat_ids])
+            self.execute_query(
+                "UPDATE broadcasts SET total = (SELECT COUNT(*) FROM outbox WHERE broadcast_id = ?) WHERE id = ?",
+                (broadcast_id, broadcast_id)
+            )
+        return broadcast_id
+
+    def get_pending(self, now: float, limit: int = 100, exclude: Iterable[int] = ()) -> List[OutboxMessage]:
+        """Сообщения, которые пора отправить, в порядке постановки в очередь.
+        exclude - id сообщений, которые уже отправляются"""
+        rows = self.fetch_all(f'''
+            SELECT {OUTBOX_COLUMNS} FROM outbox
+            WHERE status = 'PENDING' AND not_before <= ?
+              AND id NOT IN (SELECT value FROM json_each(?))
+            ORDER BY not_before, id
+            LIMIT ?
+        ''', (now, json.dumps(list(exclude)), limit))
+        return [OutboxMessage(*row) for row in rows]
+
+    def next_pending_at(self, exclude: Iterable[int] = ()) -> Optional[float]:
+        """Когда станет доступно ближайшее отложенное сообщение (None - очередь пуста)"""
+        result = self.fetch_one(
+            "SELECT MIN(not_before) FROM outbox WHERE status = 'PENDING' AND id NOT IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(exclude)),)
+        )
+        return result[0] if result else None
+
+    def mark_sent(self, message_ids: List[int]) -> None:
+        """Одиночные сообщения удаляет, сообщения рассылок помечает доставленными"""
+        if message_ids:
+            ids = json.dumps(message_ids)
+            with self.transaction():
+                self.execute_query(
+                    "DELETE FROM outbox WHERE broadcast_id IS NULL AND id IN (SELECT value FROM json_each(?))",
+                    (ids,)
+                )
+                self.execute_query(
+                    "UPDATE outbox SET status = 'SENT', sent_at = ? WHERE id IN (SELECT value FROM json_each(?))",
+                    (time.time(), ids)
+                )
+
+    def postpone(self, message_id: int, not_before: float, error: Optional[str] = None,
+                 count_attempt: bool = True) -> None:
+        """Откладывает отправку. count_attempt=False - задержка из-за лимитов, а не ошибка"""
+        self.execute_query(
+            "UPDATE outbox SET not_before = ?, attempts = attempts + ?, last_error = COALESCE(?, last_error) WHERE id = ?",
+            (not_before, int(count_attempt), error, message_id)
+        )
+
+    def mark_failed(self, message_id: int, error: str) -> None:
+        self.execute_query(
+            "UPDATE outbox SET status = 'FAILED', attempts = attempts + 1, last_error = ? WHERE id = ?",
+            (error, message_id)
+        )
+
+    def finish_broadcasts(self) -> List[Broadcast]:
+        """Помечает завершенными рассылки без ожидающих сообщений и возвращает их итоги"""
+        now = time.time()
+        # Сначала только читаем: без завершенных рассылок транзакция записи не нужна
+        rows = self.fetch_all('''
+            SELECT b.id, b.title, b.notify_chat_id, b.total,
+                   COUNT(CASE WHEN o.status = 'SENT' THEN 1 END),
+                   COUNT(CASE WHEN o.status = 'FAILED' THEN 1 END),
+                   b.created_at, COALESCE(MAX(o.sent_at), ?)
+            FROM broadcasts b
+            LEFT JOIN outbox o ON o.broadcast_id = b.id
+            WHERE b.finished_at IS NULL
+            GROUP BY b.id
+            HAVING COUNT(CASE WHEN o.status = 'PENDING' THEN 1 END) = 0
+        ''', (now,))
+        if not rows:
+            return []
+        finished = [Broadcast(*row) for row in rows]
+        with self.transaction():
+            self.execute_query(
+                "UPDATE broadcasts SET finished_at = ? WHERE id IN (SELECT value FROM json_each(?))",
+                (now, json.dumps([b.id for b in finished]))
+            )
+            # Состояние доставки старых рассылок больше не нужно
+            self.execute_query('''
+                DELETE FROM outbox WHERE status = 'SENT' AND broadcast_id IN (
+                    SELECT id FROM broadcasts WHERE finished_at < ?
+                )
+            ''', (now - BROADCAST_RETENTION,))
+        return finished
+
+    def get_pending_count(self) -> int:
+        return self.fetch_one("SELECT COUNT(*) FROM outbox WHERE status = 'PENDING'")[0]
@@ -0,0 +1,52 @@
+import os
+import sqlite3
+from dataclasses import dataclass, replace
+from typing import Dict, Tuple
+
+@dataclass(frozen=True)
+class StorageSettings:
+    """Параметры SQLite, применяемые к каждому новому соединению"""
+    journal_mode: str = 'WAL'
+    busy_timeout_ms: int = 5000
+    synchronous: str = 'NORMAL'
+    cache_size_kb: int = 8192
+    mmap_size: int = 64 * 1024 * 1024
+    # Режим одного писателя: изменения выполняет отдельный поток пачками (см. writer.py)
+    write_queue: bool = False
+    write_batch_size: int = 100
+
+DEFAULT_SETTINGS = StorageSettings()
+
+def _config_settings() -> Tuple[Dict, Dict]:
+    """Читает необязательные DB_STORAGE и DB_STORAGE_OVERRIDES из new_bot.config"""
+    try:
+        from new_bot import config
+    except ImportError:
+        return {}, {}
+    return getattr(config, 'DB_STORAGE', {}), getattr(config, 'DB_STORAGE_OVERRIDES', {})
+
+def get_storage_settings(db_path: str) -> StorageSettings:
+    """Настройки для файла БД: значения по умолчанию, общие и затем пофайловые из config.
+
+    Пример в config.py:
+        DB_STORAGE = {'busy_timeout_ms': 10000, 'write_queue': True}
+        DB_STORAGE_OVERRIDES = {'trainers.db': {'mmap_size': 256 * 1024 * 1024}}
+    """
+    common, overrides = _config_settings()
+    settings = replace(DEFAULT_SETTINGS, **common)
+    return replace(settings, **overrides.get(os.path.basename(db_path), {}))
+
+def apply_storage_settings(conn: sqlite3.Connection, settings: StorageSettings) -> None:
+    conn.execute(f"PRAGMA busy_timeout = {int(settings.busy_timeout_ms)}")
+    conn.execute(f"PRAGMA journal_mode = {settings.journal_mode}")
+    conn.execute(f"PRAGMA synchronous = {settings.synchronous}")
+    # Отрицательное значение cache_size задает размер в килобайтах, а не в страницах
+    conn.execute(f"PRAGMA cache_size = {-int(settings.cache_size_kb)}")
+    conn.execute(f"PRAGMA mmap_size = {int(settings.mmap_size)}")
+
+def open_connection(db_path: str, **kwargs) -> sqlite3.Connection:
+    """Открывает соединение с файлом БД и применяет к нему настройки хранилища"""
+    settings = get_storage_settings(db_path)
+    conn = sqlite3.connect(db_path, timeout=settings.busy_timeout_ms / 1000, **kwargs)
+    apply_storage_settings(conn, settings)
+    return conn
@@ -1,165 +1,556 @@
+import json
 import os
+import time
+from new_bot.database.admin import AdminDB
 from new_bot.database.base import BaseDB
-from typing import List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 from datetime import datetime, timedelta
-from new_bot.types import Training
+from new_bot.types import Roster, RosterEntry, ScheduledJob, SignupResult, Training
+from new_bot.database.migrations import Migration, add_column_if_missing
 
-class TrainerDB(BaseDB):
-    def __init__(self, admin_username: str):
-        db_path = f'trainer_{admin_username}.db'
-        super().__init__(db_path)
+def _create_store_schema(conn) -> None:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schedule (
+            training_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_username TEXT NOT NULL,
+            channel_id INTEGER NOT NULL,
+            date_time TEXT,
+            duration INTEGER,
+            kind TEXT,
+            location TEXT,
+            status TEXT,
+            max_participants INTEGER DEFAULT 10,
+            price INTEGER DEFAULT 0,
+            topic_id INTEGER DEFAULT NULL,
+            FOREIGN KEY (channel_id) REFERENCES channels(channel_id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS participants (
+            username TEXT,
+            training_id INTEGER,
+            status TEXT DEFAULT 'ACTIVE',
+            paid INTEGER DEFAULT 0,
+            signup_time TIMESTAMP,
+            FOREIGN KEY (training_id) REFERENCES schedule(training_id)
+        )
+    ''')
+    # Таблица для статистики
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS statistics (
+            username TEXT,
+            training_id INTEGER,
+            action TEXT,  -- 'signup' или 'cancel'
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(training_id) REFERENCES schedule(training_id)
+        )
+    ''')
+    # Таблица для резерва
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reserve (
+            username TEXT,
+            training_id INTEGER,
+            position INTEGER,
+            status TEXT DEFAULT 'WAITING',
+            offer_timestamp DATETIME,  -- Время, когда было сделано предложение
+            FOREIGN KEY(training_id) REFERENCES schedule(training_id)
+        )
+    ''')
+    # Таблица для приглашений
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS invites (
+            username TEXT,
+            invited_by TEXT,
+            training_id INTEGER,
+            status TEXT DEFAULT 'PENDING',
+            invite_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(training_id) REFERENCES schedule(training_id)
+        )
+    ''')
+    # Баланс автозаписей - общий для пользователя, не зависит от тренера
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS auto_signups_balance (
+            username TEXT PRIMARY KEY,
+            balance INTEGER DEFAULT 1
+        )
+    ''')
+    # Таблица для хранения запросов на автозапись
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS auto_signup_requests (
+            username TEXT,
+            training_id INTEGER,
+            request_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (username, training_id),
+            FOREIGN KEY (training_id) REFERENCES schedule(training_id) ON DELETE CASCADE
+        )
+    ''')
+    # Файлы trainer_*.db, уже перенесенные в общее хранилище
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS legacy_imports (
+            file_name TEXT PRIMARY KEY,
+            trainings INTEGER,
+            imported_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
 
-    def _initialize_db(self):
-        # Создаем основные таблицы
-        self.execute_query('''
-            CREATE TABLE IF NOT EXISTS schedule (
-                training_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                channel_id INTEGER NOT NULL,
-                date_time TEXT,
-                duration INTEGER,
-                kind TEXT,
-                location TEXT,
-                status TEXT,
-                max_participants INTEGER DEFAULT 10,
-                price INTEGER DEFAULT 0,
-                topic_id INTEGER DEFAULT NULL,
-                FOREIGN KEY (channel_id) REFERENCES channels(channel_id)
-            )
-        ''')
+def _create_store_indexes(conn) -> None:
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_schedule_admin ON schedule (admin_username, channel_id, date_time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_schedule_channel ON schedule (channel_id, date_time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_participants_username ON participants (username, training_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_participants_training ON participants (training_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reserve_username ON reserve (username, training_id)")
+
+def _dedupe_and_constrain(conn) -> None:
+    # Участники: оставляем первую запись пары, сохраняя наибольший статус оплаты
+    conn.execute('''
+        UPDATE participants SET paid = (
+            SELECT MAX(d.paid) FROM participants d
+            WHERE d.username = participants.username AND d.training_id = participants.training_id
+        )
+    ''')
+    conn.execute('''
+        DELETE FROM participants WHERE rowid NOT IN (
+            SELECT MIN(rowid) FROM participants GROUP BY username, training_id
+        )
+    ''')
+    # Резерв: оставляем первую запись и перенумеровываем позиции без пропусков
+    conn.execute('''
+        DELETE FROM reserve WHERE rowid NOT IN (
+            SELECT MIN(rowid) FROM reserve GROUP BY username, training_id
+        )
+    ''')
+    conn.execute('''
+        UPDATE reserve SET position = (
+            SELECT r.rn FROM (
+                SELECT rowid AS id, ROW_NUMBER() OVER (
+                    PARTITION BY training_id ORDER BY position, rowid
+                ) AS rn
+                FROM reserve
+            ) r WHERE r.id = reserve.rowid
+        )
+    ''')
+    # Приглашения: актуальна только последняя запись пары
+    conn.execute('''
+        DELETE FROM invites WHERE rowid NOT IN (
+            SELECT rowid FROM (
+                SELECT rowid, ROW_NUMBER() OVER (
+                    PARTITION BY username, training_id ORDER BY invite_timestamp DESC, rowid DESC
+                ) AS rn
+                FROM invites
+            ) WHERE rn = 1
+        )
+    ''')
+
+    # Уникальные индексы заменяют обычные индексы по (username, training_id)
+    conn.execute("DROP INDEX IF EXISTS idx_participants_username")
+    conn.execute("DROP INDEX IF EXISTS idx_reserve_username")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_participants_user_training ON participants (username, training_id)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_reserve_user_training ON reserve (username, training_id)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_invites_user_training ON invites (username, training_id)")
+
+    # Покрывающие индексы для выборок планировщиков и очереди резерва
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_participants_status_signup ON participants (status, signup_time, username, training_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_invites_status_timestamp ON invites (status, invite_timestamp, username, training_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_invites_invited_by ON invites (invited_by, training_id, status, invite_timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reserve_training_position ON reserve (training_id, position, status, username)")
+
+# Время на ответ на приглашение и на принятие места из резерва, секунды
+INVITE_TTL = 2 * 3600
+OFFER_TTL = 2 * 3600
+
+def _create_scheduled_jobs(conn) -> None:
+    # Одно задание на (вид, тренировка, пользователь): повторная постановка переносит срок
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            training_id INTEGER NOT NULL,
+            username TEXT NOT NULL DEFAULT '',
+            due_at REAL NOT NULL,
+            payload TEXT NOT NULL DEFAULT '{}',
+            UNIQUE (kind, training_id, username)
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_due ON scheduled_jobs (due_at)")
+
+    # Задания для уже существующих приглашений, предложений, оплат и напоминаний
+    conn.execute('''
+        INSERT OR IGNORE INTO scheduled_jobs (kind, training_id, username, due_at)
+        SELECT ?, training_id, username, CAST(strftime('%s', invite_timestamp) AS INTEGER) + ?
+        FROM invites WHERE status = 'PENDING'
+    ''', (ScheduledJob.INVITE_EXPIRY, INVITE_TTL))
+    conn.execute('''
+        INSERT OR IGNORE INTO scheduled_jobs (kind, training_id, username, due_at)
+        SELECT ?, training_id, username, CAST(strftime('%s', signup_time) AS INTEGER) + ?
+        FROM participants WHERE status = 'RESERVE_PENDING'
+    ''', (ScheduledJob.OFFER_EXPIRY, OFFER_TTL))
+    # Сроки оплаты зависят от настроек админа - планировщик рассчитает их при первой обработке
+    conn.execute('''
+        INSERT OR IGNORE INTO scheduled_jobs (kind, training_id, username, due_at)
+        SELECT ?, p.training_id, p.username, CAST(strftime('%s', 'now') AS INTEGER)
+        FROM participants p
+        JOIN schedule s ON s.training_id = p.training_id
+        WHERE s.status = 'OPEN' AND p.status = 'ACTIVE' AND p.paid != 2
+    ''', (ScheduledJob.PAYMENT,))
+    for kind, offset in (('reminder_24h', 24 * 3600), ('reminder_1h', 3600)):
+        conn.execute(_REMINDER_JOBS_SQL, (kind, offset, None, None, offset))
+
+# Напоминания для открытых тренировок (или одной, если задан training_id), срок которых еще не наступил.
+# date_time хранится в локальном времени сервера, модификатор 'utc' переводит его в unix-время
+_REMINDER_JOBS_SQL = '''
+    INSERT INTO scheduled_jobs (kind, training_id, username, due_at, payload)
+    SELECT ?, training_id, '', CAST(strftime('%s', date_time, 'utc') AS INTEGER) - ?,
+           json_object('date_time', date_time)
+    FROM schedule
+    WHERE status = 'OPEN' AND (? IS NULL OR training_id = ?)
+    AND CAST(strftime('%s', date_time, 'utc') AS INTEGER) - ? > CAST(strftime('%s', 'now') AS INTEGER)
+    ON CONFLICT (kind, training_id, username) DO UPDATE SET
+        due_at = excluded.due_at, payload = excluded.payload
+'''
+
+def _create_reminder_ledger(conn) -> None:
+    # Кому и какое напоминание уже отправлено. date_time входит в ключ:
+    # после переноса тренировки напоминание отправляется заново
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reminders_sent (
+            training_id INTEGER NOT NULL,
+            username TEXT NOT NULL,
+            offset_minutes INTEGER NOT NULL,
+            date_time TEXT NOT NULL,
+            sent_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (training_id, username, offset_minutes, date_time)
+        )
+    ''')
+    # Виды заданий напоминаний теперь содержат смещение в минутах
+    conn.execute("UPDATE OR REPLACE scheduled_jobs SET kind = ? WHERE kind = 'reminder_24h'", (ScheduledJob.reminder_kind(24 * 60),))
+    conn.execute("UPDATE OR REPLACE scheduled_jobs SET kind = ? WHERE kind = 'reminder_1h'", (ScheduledJob.reminder_kind(60),))
+
+def _add_list_message_id(conn) -> None:
+    # Закрепленное сообщение со списком участников в теме тренировки
+    add_column_if_missing(conn, 'schedule', 'list_message_id', 'INTEGER DEFAULT NULL')
+
+TRAINING_COLUMNS = '''
+    s.training_id, s.channel_id, s.date_time, s.duration, s.kind, s.location,
+    s.status, s.max_participants, s.price
+'''
+
+def _training_from_row(row) -> Training:
+    """Создает Training из строки с колонками TRAINING_COLUMNS"""
+    return Training(
+        id=row[0],
+        channel_id=row[1],
+        date_time=datetime.strptime(row[2], '%Y-%m-%d %H:%M'),
+        duration=row[3],
+        kind=row[4],
+        location=row[5],
+        status=row[6],
+        max_participants=row[7],
+        price=row[8]
+    )
+
+class TrainingStore(BaseDB):
+    """Общее хранилище тренировок всех тренеров (data/trainers.db)"""
+
+    MIGRATIONS = [
+        Migration(1, "Общая схема тренировок", _create_store_schema),
+        Migration(2, "Индексы по тренеру, группе и пользователю", _create_store_indexes),
+        Migration(3, "Удаление дублей и уникальные индексы участников, резерва и приглашений", _dedupe_and_constrain),
+        Migration(4, "Таблица отложенных заданий планировщика", _create_scheduled_jobs),
+        Migration(5, "Журнал отправленных напоминаний", _create_reminder_ledger),
+        Migration(6, "Колонка list_message_id в schedule", _add_list_message_id),
+    ]
+
+    def __init__(self):
+        super().__init__('trainers.db')
+
+    def get_training_admin(self, training_id: int) -> Optional[str]:
+        """Получает username админа, создавшего тренировку"""
+        result = self.fetch_one(
+            "SELECT admin_username FROM schedule WHERE training_id = ?",
+            (training_id,)
+        )
+        return result[0] if result else None
+
+    def get_channel_schedule(self, channel_id: int, status: Optional[str] = None) -> List[Tuple[Training, str, int]]:
+        """Получает тренировки группы всех тренеров: (тренировка, админ, число участников)"""
+        rows = self.fetch_all(f'''
+            SELECT {TRAINING_COLUMNS}, s.admin_username,
+                   (SELECT COUNT(*) FROM participants p WHERE p.training_id = s.training_id)
+            FROM schedule s
+            WHERE s.channel_id = ? AND (? IS NULL OR s.status = ?)
+            ORDER BY s.date_time
+        ''', (channel_id, status, status))
+        return [(_training_from_row(row), row[9], row[10]) for row in rows]
+
+    def get_auto_signup_schedule(self, username: str, channel_id: Optional[int] = None,
+                                 status: Optional[str] = None) -> List[Tuple[Training, str, int, bool]]:
+        """Тренировки с автозаписями одним запросом: (тренировка, админ, число автозаписей,
+        есть ли автозапись у пользователя). channel_id=None - все группы"""
+        rows = self.fetch_all(f'''
+            SELECT {TRAINING_COLUMNS}, s.admin_username,
+                   COUNT(a.username), COALESCE(MAX(a.username = ?), 0)
+            FROM schedule s
+            LEFT JOIN auto_signup_requests a ON a.training_id = s.training_id
+            WHERE (? IS NULL OR s.channel_id = ?) AND (? IS NULL OR s.status = ?)
+            GROUP BY s.training_id
+            ORDER BY s.date_time
+        ''', (username, channel_id, channel_id, status, status))
+        return [(_training_from_row(row), row[9], row[10], bool(row[11])) for row in rows]
+
+    def get_channels_with_open_trainings(self) -> List[int]:
+        """Получает ID групп, в которых есть тренировки с открытой записью"""
+        rows = self.fetch_all("SELECT DISTINCT channel_id FROM schedule WHERE status = 'OPEN'")
+        return [row[0] for row in rows]
+
+    def get_user_trainings(self, username: str) -> List[Tuple[Training, str, int]]:
+        """Получает тренировки, на которые записан пользователь: (тренировка, админ, статус оплаты)"""
+        rows = self.fetch_all(f'''
+            SELECT {TRAINING_COLUMNS}, s.admin_username, p.paid
+            FROM participants p
+            JOIN schedule s ON s.training_id = p.training_id
+            WHERE p.username = ?
+            ORDER BY s.date_time
+        ''', (username,))
+        return [(_training_from_row(row), row[9], row[10]) for row in rows]
+
+    def get_user_reserve_trainings(self, username: str) -> List[Tuple[Training, str, int, str]]:
+        """Получает тренировки, где пользователь в резерве: (тренировка, админ, позиция, статус)"""
+        rows = self.fetch_all(f'''
+            SELECT {TRAINING_COLUMNS}, s.admin_username, r.position, r.status
+            FROM reserve r
+            JOIN schedule s ON s.training_id = r.training_id
+            WHERE r.username = ?
+            ORDER BY s.date_time
+        ''', (username,))
+        return [(_training_from_row(row), row[9], row[10], row[11]) for row in rows]
+
+    def get_auto_signups_balance(self, username: str) -> int:
+        """Получает баланс автозаписей пользователя"""
+        result = self.fetch_one('''
+            SELECT balance FROM auto_signups_balance 
+            WHERE username = ?
+        ''', (username,))
         
-        # Проверяем существующие колонки
-        columns = self.fetch_all("PRAGMA table_info(schedule)")
-        column_names = [column[1] for column in columns]
+        if not result:
+            # Если записи нет, создаем с начальным балансом 1
+            self.execute_query('''
+                INSERT INTO auto_signups_balance (username, balance)
+                VALUES (?, 1)
+            ''', (username,))
+            return 1
         
-        # Добавляем колонку topic_id, если её нет
-        if 'topic_id' not in column_names:
-            self.execute_query('ALTER TABLE schedule ADD COLUMN topic_id INTEGER DEFAULT NULL')
+        return dict(result)['balance']
+
+    def add_auto_signups(self, username: str, amount: int) -> bool:
+        """Добавляет автозаписи пользователю"""
+        try:
+            with self.transaction():
+                current_balance = self.get_auto_signups_balance(username)
+                self.execute_query('''
+                    UPDATE auto_signups_balance 
+                    SET balance = ? 
+                    WHERE username = ?
+                ''', (current_balance + amount, username))
+            return True
+        except Exception as e:
+            print(f"Error adding auto signups: {e}")
+            return False
+
+    def decrease_auto_signups(self, username: str) -> bool:
+        """Уменьшает количество автозаписей пользователя на 1"""
+        try:
+            with self.transaction():
+                current_balance = self.get_auto_signups_balance(username)
+                if current_balance <= 0:
+                    return False
             
-        # Добавляем колонку price, если её нет
-        if 'price' not in column_names:
-            self.execute_query('ALTER TABLE schedule ADD COLUMN price INTEGER DEFAULT 0')
+                self.execute_query('''
+                    UPDATE auto_signups_balance 
+                    SET balance = ? 
+                    WHERE username = ?
+                ''', (current_balance - 1, username))
+            return True
+        except Exception as e:
+            print(f"Error decreasing auto signups: {e}")
+            return False
 
+    def schedule_job(self, kind: str, due_at: float, training_id: int,
+                     username: str = '', payload: Optional[Dict] = None) -> None:
+        """Ставит отложенное задание. Повторная постановка переносит срок существующего"""
         self.execute_query('''
-            CREATE TABLE IF NOT EXISTS participants (
-                username TEXT,
-                training_id INTEGER,
-                status TEXT DEFAULT 'ACTIVE',
-                paid INTEGER DEFAULT 0,
-                signup_time TIMESTAMP,
-                FOREIGN KEY (training_id) REFERENCES schedule(training_id)
-            )
-        ''')
-        # Добавим таблицу для статистики
-        self.execute_query('''
-            CREATE TABLE IF NOT EXISTS statistics (
-                username TEXT,
-                training_id INTEGER,
-                action TEXT,  -- 'signup' или 'cancel'
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(training_id) REFERENCES schedule(training_id)
-            )
-        ''')
+            INSERT INTO scheduled_jobs (kind, training_id, username, due_at, payload)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (kind, training_id, username) DO UPDATE SET
+                due_at = excluded.due_at, payload = excluded.payload
+        ''', (kind, training_id, username, due_at, json.dumps(payload or {})))
 
-        # Добавляем таблицу для резерва
+    def cancel_jobs(self, training_id: int, username: Optional[str] = None, kind: Optional[str] = None) -> None:
+        """Удаляет задания тренировки (всех пользователей или одного, всех видов или одного)"""
         self.execute_query('''
-            CREATE TABLE IF NOT EXISTS reserve (
-                username TEXT,
-                training_id INTEGER,
-                position INTEGER,
-                status TEXT DEFAULT 'WAITING',
-                offer_timestamp DATETIME,  -- Время, когда было сделано предложение
-                FOREIGN KEY(training_id) REFERENCES schedule(training_id)
-            )
-        ''')
+            DELETE FROM scheduled_jobs
+            WHERE training_id = ? AND (? IS NULL OR username = ?) AND (? IS NULL OR kind = ?)
+        ''', (training_id, username, username, kind, kind))
 
-        # Добавляем таблицу для приглашений
-        self.execute_query('''
-            CREATE TABLE IF NOT EXISTS invites (
-                username TEXT,
-                invited_by TEXT,
-                training_id INTEGER,
-                status TEXT DEFAULT 'PENDING',
-                invite_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(training_id) REFERENCES schedule(training_id)
+    def schedule_reminders(self, training_id: int, offsets: List[int]) -> None:
+        """Пересоздает напоминания тренировки по ее текущим времени и статусу.
+
+        offsets - за сколько минут до начала напоминать.
+        """
+        with self.transaction():
+            self.execute_query(
+                "DELETE FROM scheduled_jobs WHERE training_id = ? AND kind LIKE ?",
+                (training_id, f"{ScheduledJob.REMINDER}:%")
             )
-        ''')
+            for minutes in offsets:
+                self.execute_query(
+                    _REMINDER_JOBS_SQL,
+                    (ScheduledJob.reminder_kind(minutes), minutes * 60, training_id, training_id, minutes * 60)
+                )
 
-        # Таблица для хранения баланса автозаписей
+    def mark_reminders_sent(self, training_id: int, offset_minutes: int, date_time: str) -> List[str]:
+        """Отмечает напоминание в журнале и возвращает участников, которым его еще не отправляли"""
+        with self.transaction():
+            rows = self.fetch_all('''
+                SELECT p.username
+                FROM participants p
+                WHERE p.training_id = ? AND p.status = 'ACTIVE'
+                AND NOT EXISTS (
+                    SELECT 1 FROM reminders_sent r
+                    WHERE r.training_id = p.training_id AND r.username = p.username
+                    AND r.offset_minutes = ? AND r.date_time = ?
+                )
+                ORDER BY p.rowid
+            ''', (training_id, offset_minutes, date_time))
+            usernames = [row[0] for row in rows]
+            for username in usernames:
+                self.execute_query('''
+                    INSERT INTO reminders_sent (training_id, username, offset_minutes, date_time)
+                    VALUES (?, ?, ?, ?)
+                ''', (training_id, username, offset_minutes, date_time))
+            return usernames
+
+    def schedule_payment_checks(self, admin_username: str) -> None:
+        """Ставит проверку оплаты всем неоплатившим участникам открытых тренировок админа"""
         self.execute_query('''
-            CREATE TABLE IF NOT EXISTS auto_signups_balance (
-                username TEXT PRIMARY KEY,
-                balance INTEGER DEFAULT 1
+            INSERT INTO scheduled_jobs (kind, training_id, username, due_at)
+            SELECT ?, p.training_id, p.username, ?
+            FROM participants p
+            JOIN schedule s ON s.training_id = p.training_id
+            WHERE s.admin_username = ? AND s.status = 'OPEN'
+            AND p.status = 'ACTIVE' AND p.paid != 2
+            ON CONFLICT (kind, training_id, username) DO UPDATE SET due_at = excluded.due_at
+        ''', (ScheduledJob.PAYMENT, time.time(), admin_username))
+
+    def next_job_due(self, exclude: Iterable[int] = ()) -> Optional[float]:
+        """Время ближайшего задания (unix-время) или None. exclude - id заданий, уже взятых в работу"""
+        result = self.fetch_one(
+            "SELECT MIN(due_at) FROM scheduled_jobs WHERE job_id NOT IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(exclude)),)
+        )
+        return result[0] if result else None
+
+    def get_due_jobs(self, now: float, limit: int = 100, exclude: Iterable[int] = ()) -> List[ScheduledJob]:
+        """Задания, срок которых наступил, в порядке срока"""
+        rows = self.fetch_all('''
+            SELECT j.job_id, j.kind, j.due_at, j.training_id, j.username, j.payload, s.admin_username
+            FROM scheduled_jobs j
+            LEFT JOIN schedule s ON s.training_id = j.training_id
+            WHERE j.due_at <= ? AND j.job_id NOT IN (SELECT value FROM json_each(?))
+            ORDER BY j.due_at
+            LIMIT ?
+        ''', (now, json.dumps(list(exclude)), limit))
+        return [
+            ScheduledJob(id=row[0], kind=row[1], due_at=row[2], training_id=row[3],
+                         username=row[4], payload=json.loads(row[5] or '{}'), admin_username=row[6])
+            for row in rows
+        ]
+
+    def claim_job(self, job: ScheduledJob) -> bool:
+        """Удаляет задание перед выполнением. False - задание уже выполнено или перенесено.
+
+        Вызывается в той же транзакции, что и изменения по заданию, поэтому
+        после сбоя задание либо выполнено целиком, либо останется в таблице.
+        """
+        with self.transaction():
+            if not self.fetch_one(
+                "SELECT 1 FROM scheduled_jobs WHERE job_id = ? AND due_at = ?",
+                (job.id, job.due_at)
+            ):
+                return False
+            self.execute_query("DELETE FROM scheduled_jobs WHERE job_id = ?", (job.id,))
+            return True
+
+    def claim_jobs(self, jobs: List[ScheduledJob]) -> List[ScheduledJob]:
+        """Удаляет пачку заданий и возвращает те, что еще не были выполнены или перенесены"""
+        with self.transaction():
+            rows = self.fetch_all(
+                "SELECT job_id, due_at FROM scheduled_jobs WHERE job_id IN (SELECT value FROM json_each(?))",
+                (json.dumps([job.id for job in jobs]),)
             )
-        ''')
-        
-        # Таблица для хранения запросов на автозапись
-        self.execute_query('''
-            CREATE TABLE IF NOT EXISTS auto_signup_requests (
-                username TEXT,
-                training_id INTEGER,
-                request_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                PRIMARY KEY (username, training_id),
-                FOREIGN KEY (training_id) REFERENCES schedule(training_id) ON DELETE CASCADE
+            current = {row[0]: row[1] for row in rows}
+            claimed = [job for job in jobs if current.get(job.id) == job.due_at]
+            self.execute_query(
+                "DELETE FROM scheduled_jobs WHERE job_id IN (SELECT value FROM json_each(?))",
+                (json.dumps([job.id for job in claimed]),)
             )
-        ''')
+            return claimed
 
-        # Проверяем существующие колонки в participants
-        columns = self.fetch_all("PRAGMA table_info(participants)")
-        column_names = [column[1] for column in columns]
-        
-        if 'signup_time' not in column_names:
-            # Создаем новую таблицу с нужной структурой
-            self.execute_query('''
-                CREATE TABLE IF NOT EXISTS participants_new (
-                    username TEXT,
-                    training_id INTEGER,
-                    status TEXT DEFAULT 'ACTIVE',
-                    paid INTEGER DEFAULT 0,
-                    signup_time TIMESTAMP,
-                    FOREIGN KEY (training_id) REFERENCES schedule(training_id)
-                )
-            ''')
-            
-            # Копируем данные из старой таблицы
-            self.execute_query('''
-                INSERT INTO participants_new (username, training_id, status, paid)
-                SELECT username, training_id, status, paid FROM participants
-            ''')
-            
-            # Обновляем время записи для существующих записей
-            self.execute_query('''
-                UPDATE participants_new 
-                SET signup_time = datetime('now') 
-                WHERE signup_time IS NULL
-            ''')
-            
-            # Удаляем старую таблицу и переименовываем новую
-            self.execute_query('DROP TABLE participants')
-            self.execute_query('ALTER TABLE participants_new RENAME TO participants')
-        else:
-            # Если колонка уже существует, просто создаем таблицу если её нет
-            self.execute_query('''
-                CREATE TABLE IF NOT EXISTS participants (
-                    username TEXT,
-                    training_id INTEGER,
-                    status TEXT DEFAULT 'ACTIVE',
-                    paid INTEGER DEFAULT 0,
-                    signup_time TIMESTAMP,
-                    FOREIGN KEY (training_id) REFERENCES schedule(training_id)
-                )
-            ''')
+    def get_unpaid_for_jobs(self, job_ids: List[int]) -> List[Tuple[int, Training, str, str, Optional[str]]]:
+        """Неоплатившие участники открытых тренировок по заданиям оплаты.
+
+        Возвращает (id задания, тренировка, админ, участник, время записи).
+        Задания, по которым участник оплатил или ушел, в выборку не попадают.
+        """
+        rows = self.fetch_all(f'''
+            SELECT {TRAINING_COLUMNS}, s.admin_username, p.username, p.signup_time, j.job_id
+            FROM scheduled_jobs j
+            JOIN participants p ON p.username = j.username AND p.training_id = j.training_id
+            JOIN schedule s ON s.training_id = j.training_id
+            WHERE j.job_id IN (SELECT value FROM json_each(?))
+            AND s.status = 'OPEN' AND p.status = 'ACTIVE' AND p.paid != 2
+        ''', (json.dumps(list(job_ids)),))
+        return [(row[12], _training_from_row(row), row[9], row[10], row[11]) for row in rows]
+
+    def retry_job(self, job: ScheduledJob, due_at: float) -> None:
+        """Откладывает задание, которое не удалось выполнить"""
+        self.execute_query(
+            "UPDATE scheduled_jobs SET due_at = ? WHERE job_id = ? AND due_at = ?",
+            (due_at, job.id, job.due_at)
+        )
+
+class TrainerDB(TrainingStore):
+    """Тренировки одного тренера в общем хранилище"""
+
+    def __init__(self, admin_username: str):
+        self.admin_username = admin_username
+        super().__init__()
+
+    def get_reminder_offsets(self) -> List[int]:
+        """За сколько минут до тренировки напоминать участникам (настройка админа)"""
+        return AdminDB().get_reminder_offsets(self.admin_username)
+
+    def reschedule_reminders(self) -> None:
+        """Пересоздает напоминания всех открытых тренировок тренера (после смены настройки)"""
+        offsets = self.get_reminder_offsets()
+        with self.transaction():
+            for row in self.fetch_all(
+                "SELECT training_id FROM schedule WHERE admin_username = ? AND status = 'OPEN'",
+                (self.admin_username,)
+            ):
+                self.schedule_reminders(row[0], offsets)
 
     def add_training(self, channel_id: int, date_time: str, duration: int, kind: str, 
                     location: str, max_participants: int, status: str, price: int) -> int:
         """Добавляет новую тренировку"""
         try:
-            self.execute_query('''
-                INSERT INTO schedule 
-                (channel_id, date_time, duration, kind, location, max_participants, status, price)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (channel_id, date_time, duration, kind, location, max_participants, status, price))
-            
-            return self.cursor.lastrowid
+            with self.transaction():
+                training_id = self.execute_query('''
+                    INSERT INTO schedule 
+                    (admin_username, channel_id, date_time, duration, kind, location, max_participants, status, price)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (self.admin_username, channel_id, date_time, duration, kind, location, max_participants, status, price))
+                self.schedule_reminders(training_id, self.get_reminder_offsets())
+            return training_id
         except Exception as e:
             print(f"Error adding training: {e}")
             return 0
@@ -168,54 +559,86 @@ class TrainerDB(BaseDB):
                        kind: str, location: str, max_participants: int, 
                        price: int, status: str) -> None:
         """Обновляет существующую тренировку"""
-        self.execute_query('''
-            UPDATE schedule
-            SET date_time = ?, duration = ?, kind = ?, location = ?, 
-                max_participants = ?, price = ?, status = ?
-            WHERE training_id = ?
-        ''', (date_time, duration, kind, location, max_participants, price, status, training_id))
+        with self.transaction():
+            self.execute_query('''
+                UPDATE schedule
+                SET date_time = ?, duration = ?, kind = ?, location = ?, 
+                    max_participants = ?, price = ?, status = ?
+                WHERE training_id = ? AND admin_username = ?
+            ''', (date_time, duration, kind, location, max_participants, price, status, training_id, self.admin_username))
+            # Время могло измениться - переносим напоминания
+            self.schedule_reminders(training_id, self.get_reminder_offsets())
 
     def delete_training(self, training_id: int) -> bool:
         """Удаляет тренировку и все связанные записи"""
-        if self.fetch_all("SELECT 1 FROM schedule WHERE training_id = ?", (training_id,)) is None:
-            return False
+        with self.transaction():
+            if self.fetch_one(
+                "SELECT 1 FROM schedule WHERE training_id = ? AND admin_username = ?",
+                (training_id, self.admin_username)
+            ) is None:
+                return False
         
-        # Удаляем записи участников
-        self.execute_query(
-            "DELETE FROM participants WHERE training_id = ?", 
-            (training_id,)
-        )
+            # Удаляем записи участников
+            self.execute_query(
+                "DELETE FROM participants WHERE training_id = ?", 
+                (training_id,)
+            )
         
-        # Удаляем запросы на автозапись (без возврата баланса)
-        self.execute_query(
-            "DELETE FROM auto_signup_requests WHERE training_id = ?",
-            (training_id,)
-        )
+            # Удаляем запросы на автозапись (без возврата баланса)
+            self.execute_query(
+                "DELETE FROM auto_signup_requests WHERE training_id = ?",
+                (training_id,)
+            )
         
-        # Удаляем саму тренировку
-        self.execute_query(
-            "DELETE FROM schedule WHERE training_id = ?", 
-            (training_id,)
-        )
-        return True
+            # Удаляем отложенные задания
+            self.cancel_jobs(training_id)
+        
+            # Удаляем саму тренировку
+            self.execute_query(
+                "DELETE FROM schedule WHERE training_id = ? AND admin_username = ?", 
+                (training_id, self.admin_username)
+            )
+            return True
+
+    def signup(self, username: str, training_id: int, use_reserve: bool = True) -> SignupResult:
+        """Атомарно записывает на тренировку: проверка мест, вставка и резерв в одной транзакции"""
+        with self.transaction():
+            # Без резерва вызывающий код сам переносит участника из резерва в основной список
+            existing = self.fetch_one('''
+                SELECT NULL FROM participants WHERE username = ? AND training_id = ?
+                UNION ALL
+                SELECT position FROM reserve WHERE username = ? AND training_id = ? AND ?
+            ''', (username, training_id, username, training_id, use_reserve))
+            if existing:
+                return SignupResult(SignupResult.DUPLICATE, position=existing[0])
+
+            capacity = self.fetch_one('''
+                SELECT s.max_participants,
+                       (SELECT COUNT(*) FROM participants p WHERE p.training_id = s.training_id)
+                FROM schedule s WHERE s.training_id = ?
+            ''', (training_id,))
+            if not capacity:
+                return SignupResult(SignupResult.NOT_FOUND)
+
+            max_participants, current_count = capacity
+            if current_count < max_participants:
+                # Добавляем участника с московским временем (UTC+3)
+                self.execute_query('''
+                    INSERT INTO participants (username, training_id, signup_time) 
+                    VALUES (?, ?, datetime('now', '+3 hours'))
+                ''', (username, training_id))
+                # Срок оплаты рассчитает планировщик по настройкам админа
+                self.schedule_job(ScheduledJob.PAYMENT, time.time(), training_id, username)
+                return SignupResult(SignupResult.MAIN)
+
+            if not use_reserve:
+                return SignupResult(SignupResult.FULL)
+            return SignupResult(SignupResult.RESERVE, position=self.add_to_reserve(username, training_id))
 
     def add_participant(self, username: str, training_id: int) -> bool:
-        """Добавляет участника на тренировку"""
+        """Добавляет участника на тренировку, если есть свободные места"""
         try:
-            # Проверяем количество участников
-            current_count = len(self.get_participants_by_training_id(training_id))
-            training = self.get_training_details(training_id)
-            
-            if current_count >= training.max_participants:
-                return False
-            
-            # Добавляем участника с московским временем (UTC+3)
-            self.execute_query('''
-                INSERT OR IGNORE INTO participants 
-                (username, training_id, signup_time) 
-                VALUES (?, ?, datetime('now', '+3 hours'))
-            ''', (username, training_id))
-            return True
+            return self.signup(username, training_id, use_reserve=False).in_main_list
         except Exception as e:
             print(f"Error adding participant: {e}")
             return False
@@ -246,15 +669,48 @@ class TrainerDB(BaseDB):
             participants.append(dict(row)['username'])
         return participants
 
+    def get_rosters(self, training_ids: Iterable[int]) -> Dict[int, Roster]:
+        """Одним запросом получает участников (статус, оплата, ожидающее приглашение)
+        и резерв нескольких тренировок. Тренировки без записей получают пустой Roster"""
+        training_ids = list(training_ids)
+        ids = json.dumps(training_ids)
+        rows = self.fetch_all('''
+            SELECT p.training_id, 0 AS in_reserve, p.username, p.status, p.paid,
+                   i.username IS NOT NULL, NULL, p.rowid AS ord
+            FROM participants p
+            LEFT JOIN (
+                SELECT DISTINCT training_id, username FROM invites
+                WHERE training_id IN (SELECT value FROM json_each(?))
+                  AND status = 'PENDING'
+                  AND invite_timestamp > datetime('now', '-2 hour')
+            ) i ON i.training_id = p.training_id AND i.username = p.username
+            WHERE p.training_id IN (SELECT value FROM json_each(?))
+            UNION ALL
+            SELECT r.training_id, 1, r.username, r.status, 0, 0, r.position, r.position
+            FROM reserve r
+            WHERE r.training_id IN (SELECT value FROM json_each(?))
+            ORDER BY 1, 2, 8
+        ''', (ids, ids, ids))
+        rosters = {training_id: Roster() for training_id in training_ids}
+        for training_id, in_reserve, username, status, paid, invite_pending, position, _ in rows:
+            entry = RosterEntry(username, status, paid or 0, bool(invite_pending), position)
+            roster = rosters[training_id]
+            (roster.reserve if in_reserve else roster.participants).append(entry)
+        return rosters
+
+    def get_roster(self, training_id: int) -> Roster:
+        """Участники и резерв тренировки одним запросом"""
+        return self.get_rosters([training_id])[training_id]
+
     def get_trainings_for_channel(self, channel_id: int) -> List[Training]:
         """Получает список тренировок для конкретной группы"""
         rows = self.fetch_all('''
             SELECT training_id, channel_id, date_time, duration, kind, location, 
                    status, max_participants, price
             FROM schedule 
-            WHERE channel_id = ?
+            WHERE admin_username = ? AND channel_id = ?
             ORDER BY date_time
-        ''', (channel_id,))
+        ''', (self.admin_username, channel_id))
         
         return [
             Training(
@@ -275,8 +731,8 @@ class TrainerDB(BaseDB):
         result = self.fetch_one('''
             SELECT training_id, channel_id, date_time, duration, 
                    kind, location, max_participants, status, price
-            FROM schedule WHERE training_id = ?
-        ''', (training_id,))
+            FROM schedule WHERE training_id = ? AND admin_username = ?
+        ''', (training_id, self.admin_username))
         
         if result:
             return Training(
@@ -295,17 +751,22 @@ class TrainerDB(BaseDB):
     def get_training_ids(self) -> List[Tuple[int]]:
         """Получает список ID всех тренировок"""
         print("Вызван метод get_training_ids")  # Отладка
-        result = self.fetch_all("SELECT training_id FROM schedule")
+        result = self.fetch_all(
+            "SELECT training_id FROM schedule WHERE admin_username = ?",
+            (self.admin_username,)
+        )
         print(f"Найдено тренировок: {len(result)}")  # Отладка
         return result
     
     def set_training_open(self, training_id: int) -> bool:
         """Открывает запись на тренировку"""
         try:
-            self.execute_query(
-                "UPDATE schedule SET status = 'OPEN' WHERE training_id = ?",
-                (training_id,)
-            )
+            with self.transaction():
+                self.execute_query(
+                    "UPDATE schedule SET status = 'OPEN' WHERE training_id = ? AND admin_username = ?",
+                    (training_id, self.admin_username)
+                )
+                self.schedule_reminders(training_id, self.get_reminder_offsets())
             return True
         except Exception as e:
             print(f"Error setting training open: {e}")
@@ -320,11 +781,12 @@ class TrainerDB(BaseDB):
         }
         
         result = self.fetch_all('''
-            SELECT action, COUNT(*) 
-            FROM statistics 
-            WHERE username = ?
-            GROUP BY action
-        ''', (username,))
+            SELECT s.action, COUNT(*) 
+            FROM statistics s
+            JOIN schedule sch ON s.training_id = sch.training_id
+            WHERE s.username = ? AND sch.admin_username = ?
+            GROUP BY s.action
+        ''', (username, self.admin_username))
         
         for action, count in result:
             if action == 'signup':
@@ -337,10 +799,10 @@ class TrainerDB(BaseDB):
             SELECT s.action, s.timestamp, sch.kind, sch.date_time
             FROM statistics s
             JOIN schedule sch ON s.training_id = sch.training_id
-            WHERE s.username = ?
+            WHERE s.username = ? AND sch.admin_username = ?
             ORDER BY s.timestamp DESC
             LIMIT 5
-        ''', (username,))
+        ''', (username, self.admin_username))
         
         stats['recent_activities'] = recent
         return stats 
@@ -348,34 +810,57 @@ class TrainerDB(BaseDB):
     def update_topic_id(self, training_id: int, topic_id: int) -> None:
         """Обновляет ID темы для тренировки"""
         self.execute_query(
-            "UPDATE schedule SET topic_id = ? WHERE training_id = ?",
-            (topic_id, training_id)
+            "UPDATE schedule SET topic_id = ? WHERE training_id = ? AND admin_username = ?",
+            (topic_id, training_id, self.admin_username)
         )
 
     def get_topic_id(self, training_id: int) -> Optional[int]:
         """Получает ID темы для тренировки"""
         result = self.fetch_one(
-            "SELECT topic_id FROM schedule WHERE training_id = ?",
-            (training_id,)
+            "SELECT topic_id FROM schedule WHERE training_id = ? AND admin_username = ?",
+            (training_id, self.admin_username)
         )
         return result[0] if result else None 
 
+    def get_list_message_id(self, training_id: int) -> Optional[int]:
+        """Получает ID закрепленного сообщения со списком участников"""
+        result = self.fetch_one(
+            "SELECT list_message_id FROM schedule WHERE training_id = ? AND admin_username = ?",
+            (training_id, self.admin_username)
+        )
+        return result[0] if result else None
+
+    def set_list_message_id(self, training_id: int, message_id: Optional[int]) -> None:
+        """Сохраняет ID закрепленного сообщения со списком участников"""
+        self.execute_query(
+            "UPDATE schedule SET list_message_id = ? WHERE training_id = ? AND admin_username = ?",
+            (message_id, training_id, self.admin_username)
+        )
+
     def add_to_reserve(self, username: str, training_id: int) -> int:
         """Добавляет участника в резерв и возвращает его позицию"""
         
-        # Получаем максимальную позицию в резерве
-        max_pos = self.fetch_one('''
-            SELECT MAX(position) FROM reserve WHERE training_id = ?
-        ''', (training_id,))
+        with self.transaction():
+            # Пара (username, training_id) уникальна - повторно не добавляем
+            existing = self.fetch_one('''
+                SELECT position FROM reserve WHERE username = ? AND training_id = ?
+            ''', (username, training_id))
+            if existing:
+                return existing[0]
+        
+            # Получаем максимальную позицию в резерве
+            max_pos = self.fetch_one('''
+                SELECT MAX(position) FROM reserve WHERE training_id = ?
+            ''', (training_id,))
         
-        position = 1 if not max_pos[0] else max_pos[0] + 1
+            position = 1 if not max_pos[0] else max_pos[0] + 1
         
-        self.execute_query('''
-            INSERT INTO reserve (username, training_id, position)
-            VALUES (?, ?, ?)
-        ''', (username, training_id, position))
+            self.execute_query('''
+                INSERT INTO reserve (username, training_id, position)
+                VALUES (?, ?, ?)
+            ''', (username, training_id, position))
         
-        return position
+            return position
 
     def get_reserve_list(self, training_id: int) -> List[Tuple[str, int, str]]:
         """Получает список резерва с позициями и статусами"""
@@ -396,46 +881,48 @@ class TrainerDB(BaseDB):
 
     def remove_from_reserve(self, username: str, training_id: int) -> None:
         """Удаляет участника из резерва"""
-        position = self.fetch_one('''
-            SELECT position FROM reserve 
-            WHERE username = ? AND training_id = ?
-        ''', (username, training_id,))
-        
-        if position:
-            # Удаляем участника
-            self.execute_query('''
-                DELETE FROM reserve 
+        with self.transaction():
+            position = self.fetch_one('''
+                SELECT position FROM reserve 
                 WHERE username = ? AND training_id = ?
             ''', (username, training_id,))
+        
+            if position:
+                # Удаляем участника
+                self.execute_query('''
+                    DELETE FROM reserve 
+                    WHERE username = ? AND training_id = ?
+                ''', (username, training_id,))
             
-            # Сдвигаем позиции оставшихся участников
-            self.execute_query('''
-                UPDATE reserve 
-                SET position = position - 1 
-                WHERE training_id = ? AND position > ?
-            ''', (training_id, position[0]))
+                # Сдвигаем позиции оставшихся участников
+                self.execute_query('''
+                    UPDATE reserve 
+                    SET position = position - 1 
+                    WHERE training_id = ? AND position > ?
+                ''', (training_id, position[0]))
 
     def offer_spot_to_next_in_reserve(self, training_id: int) -> Optional[str]:
         """Предлагает место следующему в резерве"""
         try:
-            # Получаем следующего в очереди
-            next_in_line = self.fetch_one('''
-                SELECT username FROM reserve 
-                WHERE training_id = ? AND status = 'WAITING'
-                ORDER BY position ASC LIMIT 1
-            ''', (training_id,))
+            with self.transaction():
+                # Получаем следующего в очереди
+                next_in_line = self.fetch_one('''
+                    SELECT username FROM reserve 
+                    WHERE training_id = ? AND status = 'WAITING'
+                    ORDER BY position ASC LIMIT 1
+                ''', (training_id,))
             
-            if next_in_line:
-                username = next_in_line[0]
-                # Обновляем статус и время предложения
-                self.execute_query('''
-                    UPDATE reserve 
-                    SET status = 'OFFERED', offer_timestamp = datetime('now')
-                    WHERE username = ? AND training_id = ?
-                ''', (username, training_id))
-                return username
+                if next_in_line:
+                    username = next_in_line[0]
+                    # Обновляем статус и время предложения
+                    self.execute_query('''
+                        UPDATE reserve 
+                        SET status = 'OFFERED', offer_timestamp = datetime('now')
+                        WHERE username = ? AND training_id = ?
+                    ''', (username, training_id))
+                    return username
             
-            return None
+                return None
         except Exception as e:
             print(f"Error offering spot to reserve: {e}")
             return None
@@ -445,13 +932,16 @@ class TrainerDB(BaseDB):
         self.debug_participant_info(username, training_id)  # Перед изменениями
         
         try:
-            self.execute_query('''
-                UPDATE participants 
-                SET status = 'ACTIVE' 
-                WHERE username = ? AND training_id = ? AND status = 'RESERVE_PENDING'
-            ''', (username, training_id))
+            with self.transaction():
+                self.execute_query('''
+                    UPDATE participants 
+                    SET status = 'ACTIVE' 
+                    WHERE username = ? AND training_id = ? AND status = 'RESERVE_PENDING'
+                ''', (username, training_id))
             
-            self.update_signup_time(username, training_id)
+                self.update_signup_time(username, training_id)
+                self.cancel_jobs(training_id, username, ScheduledJob.OFFER_EXPIRY)
+                self.schedule_job(ScheduledJob.PAYMENT, time.time(), training_id, username)
             self.debug_participant_info(username, training_id)  # После изменений
             return True
         except Exception as e:
@@ -512,10 +1002,17 @@ class TrainerDB(BaseDB):
     def add_invite(self, username: str, invited_by: str, training_id: int) -> bool:
         """Добавляет приглашение"""
         try:
-            self.execute_query('''
-                INSERT INTO invites (username, invited_by, training_id)
-                VALUES (?, ?, ?)
-            ''', (username, invited_by, training_id))
+            with self.transaction():
+                # Повторное приглашение заменяет предыдущее
+                self.execute_query('''
+                    INSERT INTO invites (username, invited_by, training_id)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT (username, training_id) DO UPDATE SET
+                        invited_by = excluded.invited_by,
+                        status = 'PENDING',
+                        invite_timestamp = CURRENT_TIMESTAMP
+                ''', (username, invited_by, training_id))
+                self.schedule_job(ScheduledJob.INVITE_EXPIRY, time.time() + INVITE_TTL, training_id, username)
             return True
         except Exception as e:
             print(f"Ошибка добавления приглашения: {e}")
@@ -551,38 +1048,42 @@ class TrainerDB(BaseDB):
     def set_topic_id(self, training_id: int, topic_id: int) -> None:
         """Устанавливает ID темы для тренировки"""
         self.execute_query(
-            "UPDATE schedule SET topic_id = ? WHERE training_id = ?",
-            (topic_id, training_id)
+            "UPDATE schedule SET topic_id = ? WHERE training_id = ? AND admin_username = ?",
+            (topic_id, training_id, self.admin_username)
         ) 
 
     def set_training_closed(self, training_id: int) -> None:
         """Закрывает запись на тренировку и очищает список участников"""
-        # Получаем список участников до очистки
-        participants = self.get_participants_by_training_id(training_id)
+        with self.transaction():
+            # Получаем список участников до очистки
+            participants = self.get_participants_by_training_id(training_id)
         
-        # Очищаем список участников
-        self.execute_query(
-            "DELETE FROM participants WHERE training_id = ?",
-            (training_id,)
-        )
+            # Очищаем список участников
+            self.execute_query(
+                "DELETE FROM participants WHERE training_id = ?",
+                (training_id,)
+            )
         
-        # Очищаем резервный список
-        self.execute_query(
-            "DELETE FROM reserve WHERE training_id = ?",
-            (training_id,)
-        )
+            # Очищаем резервный список
+            self.execute_query(
+                "DELETE FROM reserve WHERE training_id = ?",
+                (training_id,)
+            )
         
-        # Очищаем запросы на автозапись (без возврата баланса)
-        self.execute_query(
-            "DELETE FROM auto_signup_requests WHERE training_id = ?",
-            (training_id,)
-        )
+            # Очищаем запросы на автозапись (без возврата баланса)
+            self.execute_query(
+                "DELETE FROM auto_signup_requests WHERE training_id = ?",
+                (training_id,)
+            )
         
-        # Закрываем запись
-        self.execute_query(
-            "UPDATE schedule SET status = 'CLOSED' WHERE training_id = ?",
-            (training_id,)
-        ) 
+            # Отложенные задания закрытой тренировки больше не нужны
+            self.cancel_jobs(training_id)
+        
+            # Закрываем запись
+            self.execute_query(
+                "UPDATE schedule SET status = 'CLOSED' WHERE training_id = ? AND admin_username = ?",
+                (training_id, self.admin_username)
+            )
 
     def get_participant_status(self, username: str, training_id: int) -> str:
         """Получает статус участника"""
@@ -626,54 +1127,6 @@ class TrainerDB(BaseDB):
         print(f"Reserve list: {[dict(row) for row in reserve]}")
         print("===========================\n") 
 
-    def get_auto_signups_balance(self, username: str) -> int:
-        """Получает баланс автозаписей пользователя"""
-        result = self.fetch_one('''
-            SELECT balance FROM auto_signups_balance 
-            WHERE username = ?
-        ''', (username,))
-        
-        if not result:
-            # Если записи нет, создаем с начальным балансом 1
-            self.execute_query('''
-                INSERT INTO auto_signups_balance (username, balance)
-                VALUES (?, 1)
-            ''', (username,))
-            return 1
-        
-        return dict(result)['balance']
-
-    def add_auto_signups(self, username: str, amount: int) -> bool:
-        """Добавляет автозаписи пользователю"""
-        try:
-            current_balance = self.get_auto_signups_balance(username)
-            self.execute_query('''
-                UPDATE auto_signups_balance 
-                SET balance = ? 
-                WHERE username = ?
-            ''', (current_balance + amount, username))
-            return True
-        except Exception as e:
-            print(f"Error adding auto signups: {e}")
-            return False
-
-    def decrease_auto_signups(self, username: str) -> bool:
-        """Уменьшает количество автозаписей пользователя на 1"""
-        try:
-            current_balance = self.get_auto_signups_balance(username)
-            if current_balance <= 0:
-                return False
-            
-            self.execute_query('''
-                UPDATE auto_signups_balance 
-                SET balance = ? 
-                WHERE username = ?
-            ''', (current_balance - 1, username))
-            return True
-        except Exception as e:
-            print(f"Error decreasing auto signups: {e}")
-            return False
-
     def get_available_auto_signup_slots(self, training_id: int) -> int:
         """Возвращает количество доступных слотов для автозаписи"""
         training = self.get_training_details(training_id)
@@ -695,18 +1148,19 @@ class TrainerDB(BaseDB):
     def add_auto_signup_request(self, username: str, training_id: int) -> bool:
         """Добавляет запрос на автозапись"""
         try:
-            # Проверяем баланс
-            if self.get_auto_signups_balance(username) <= 0:
-                return False
+            with self.transaction():
+                # Проверяем баланс
+                if self.get_auto_signups_balance(username) <= 0:
+                    return False
             
-            # Проверяем доступные слоты
-            if self.get_available_auto_signup_slots(training_id) <= 0:
-                return False
+                # Проверяем доступные слоты
+                if self.get_available_auto_signup_slots(training_id) <= 0:
+                    return False
             
-            self.execute_query('''
-                INSERT INTO auto_signup_requests (username, training_id)
-                VALUES (?, ?)
-            ''', (username, training_id))
+                self.execute_query('''
+                    INSERT INTO auto_signup_requests (username, training_id)
+                    VALUES (?, ?)
+                ''', (username, training_id))
             return True
         except Exception as e:
             print(f"Error adding auto signup request: {e}")
@@ -724,6 +1178,13 @@ class TrainerDB(BaseDB):
             print(f"Error removing auto signup request: {e}")
             return False
 
+    def clear_auto_signup_requests(self, training_id: int) -> None:
+        """Удаляет все запросы на автозапись на тренировку (после открытия записи)"""
+        self.execute_query(
+            "DELETE FROM auto_signup_requests WHERE training_id = ?",
+            (training_id,)
+        )
+
     def get_auto_signup_requests(self, training_id: int) -> List[str]:
         """Получает список пользователей, запросивших автозапись на тренировку"""
         result = self.fetch_all('''
@@ -742,8 +1203,8 @@ class TrainerDB(BaseDB):
                    s.location, s.status, s.max_participants, s.price
             FROM schedule s
             JOIN auto_signup_requests asr ON s.training_id = asr.training_id
-            WHERE asr.username = ?
-        ''', (username,))
+            WHERE asr.username = ? AND s.admin_username = ?
+        ''', (username, self.admin_username))
         
         trainings = []
         for row in result:
@@ -793,8 +1254,9 @@ class TrainerDB(BaseDB):
                 SELECT training_id, channel_id, date_time, duration, kind, 
                        location, status, max_participants, price
                 FROM schedule
+                WHERE admin_username = ?
                 ORDER BY date_time
-            ''')
+            ''', (self.admin_username,))
             
             trainings = []
             for row in rows:
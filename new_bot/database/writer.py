@@ -0,0 +1,97 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+# Элемент очереди: (future, запрос, параметры)
+WriteTask = Tuple[Future, str, tuple]
+
+class WriteQueue:
+    """Поток-писатель для одного файла БД.
+
+    Запросы на изменение ставятся в очередь и выполняются пачками: одна
+    транзакция и один commit на пачку. Каждый запрос выполняется в своем
+    SAVEPOINT, поэтому ошибка в одном запросе не откатывает остальные.
+    """
+
+    def __init__(self, handle, max_batch: int = 100):
+        self.handle = handle
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Optional[WriteTask]]" = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"db-writer-{os.path.basename(handle.db_path)}",
+            daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, query: str, params: tuple = ()) -> Future:
+        """Ставит запрос в очередь. Future вернет id вставленной записи для INSERT"""
+        future = Future()
+        self._queue.put((future, query, params))
+        return future
+
+    def stop(self) -> None:
+        """Выполняет уже поставленные запросы и останавливает поток"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            task = self._queue.get()
+            if task is None:
+                return
+            batch = [task]
+            stopping = False
+            while len(batch) < self.max_batch:
+                try:
+                    task = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if task is None:
+                    stopping = True
+                    break
+                batch.append(task)
+            self._commit_batch(batch)
+            if stopping:
+                return
+
+    def _commit_batch(self, batch: List[WriteTask]) -> None:
+        results = []
+        # Общая блокировка записи: пачки не пересекаются с transaction() других потоков
+        with self.handle.lock:
+            conn = self.handle.connection
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for future, query, params in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    conn.execute("SAVEPOINT write_task")
+                    try:
+                        cursor = conn.execute(query, params)
+                        lastrowid = cursor.lastrowid if query.strip().upper().startswith('INSERT') else None
+                        results.append((future, lastrowid, None))
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO write_task")
+                        results.append((future, None, e))
+                    conn.execute("RELEASE write_task")
+                conn.commit()
+            except Exception as e:
+                print(f"Ошибка записи пачки в {self.handle.db_path}: {e}")
+                if conn.in_transaction:
+                    conn.rollback()
+                for future, _, _ in batch:
+                    if future.running() or future.set_running_or_notify_cancel():
+                        future.set_exception(e)
+                return
+
+        self.handle.committed()
+
+        # Результаты отдаем только после commit, чтобы вызывающий сразу видел свои изменения
+        for future, lastrowid, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(lastrowid)
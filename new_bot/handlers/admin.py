@@ -3,8 +3,10 @@ from typing import Optional, Dict
 from telebot.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from new_bot.config import SUPERADMIN_USERNAME
 from new_bot.database.admin import AdminDB
-from new_bot.database.trainer import TrainerDB
+from new_bot.database.base import close_all_handles
+from new_bot.database.trainer import TrainerDB, TrainingStore
 from new_bot.database.channel import ChannelDB
+from new_bot.database.outbox import OutboxDB
 from new_bot.utils.keyboards import (
     get_admin_menu_keyboard,
     get_trainings_keyboard,
@@ -16,7 +18,8 @@ from new_bot.utils.validators import (
     ValidationError
 )
 from datetime import datetime, timedelta
-from new_bot.utils.forum_manager import ForumManager
+from new_bot.utils.forum_manager import ForumManager, participant_mark
+from new_bot.utils.templates import render_card
 from new_bot.handlers.stats import show_user_statistics  # Обновляем импорт
 from new_bot.utils.reserve import offer_spot_to_reserve
 import re
@@ -26,15 +29,13 @@ training_creation_data: Dict[int, TrainingData] = {}
 
 admin_db = AdminDB()
 channel_db = ChannelDB()
+training_store = TrainingStore()
+outbox_db = OutboxDB()
 admin_selection = {}
 
 def find_training_admin(training_id: int) -> Optional[str]:
     """Находит админа, создавшего тренировку"""
-    for admin in admin_db.get_all_admins():
-        trainer_db = TrainerDB(admin[0])
-        if trainer_db.get_training_details(training_id):
-            return admin[0]
-    return None
+    return training_store.get_training_admin(training_id)
 
 import re
 
@@ -180,6 +181,9 @@ def register_admin_handlers(bot: BotType) -> None:
         # Путь к директории с базами данных
         data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
         
+        # Закрываем общие соединения, чтобы при следующем обращении файлы создались заново
+        close_all_handles()
+        
         # Удаляем все файлы баз данных тренировок
         for file in os.listdir(data_dir):
             if file.endswith(".db"):
@@ -370,17 +374,15 @@ def register_admin_handlers(bot: BotType) -> None:
                     # Перемещаем последних участников в резерв
                     participants_to_reserve = current_participants[-overflow:]
                     for username in participants_to_reserve:
-                        trainer_db.remove_participant(username, training_id)
-                        position = trainer_db.add_to_reserve(username, training_id)
+                        with trainer_db.transaction():
+                            trainer_db.remove_participant(username, training_id)
+                            position = trainer_db.add_to_reserve(username, training_id)
                         
                         # Отправляем уведомление
                         if user_id := admin_db.get_user_id(username):
                             notification = (
                                 "⚠️ Вы перемещены в резерв из-за уменьшения количества мест:\n\n"
-                                f"👥 Группа: {group[1]}\n"
-                                f"📅 Дата: {current_training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                                f"🏋️‍♂️ Тип: {current_training.kind}\n"
-                                f"📍 Место: {current_training.location}\n"
+                                f"{render_card(current_training, group=group[1])}\n"
                                 f"📋 Ваша позиция в резерве: {position}"
                             )
                             try:
@@ -405,10 +407,7 @@ def register_admin_handlers(bot: BotType) -> None:
                             if user_id := admin_db.get_user_id(username):
                                 notification = (
                                     "✅ Вы перемещены из резерва в основной список:\n\n"
-                                    f"👥 Группа: {group[1]}\n"
-                                    f"📅 Дата: {current_training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                                    f"🏋️‍♂️ Тип: {current_training.kind}\n"
-                                    f"📍 Место: {current_training.location}"
+                                    + render_card(current_training, group=group[1])
                                 )
                                 try:
                                     bot.send_message(user_id, notification)
@@ -421,8 +420,7 @@ def register_admin_handlers(bot: BotType) -> None:
                 training = trainer_db.get_training_details(training_id)
                 forum_manager.send_training_update(training, topic_id, "edit")
                 # Обновляем список участников
-                participants = trainer_db.get_participants_by_training_id(training_id)
-                forum_manager.update_participants_list(training, participants, topic_id, trainer_db)
+                forum_manager.update_participants_list(training, topic_id, trainer_db)
             
             # Отправляем уведомление всем участникам
             notification = (
@@ -605,14 +603,9 @@ def register_admin_handlers(bot: BotType) -> None:
             # Затем удаляем тренировку из базы данных
             print("Deleting training from database...")
             if trainer_db.delete_training(training_id):
+                forum_manager.forget_participants_list(training_id)
                 # Отправляем уведомления участникам
-                notification = (
-                    "❌ Тренировка отменена:\n\n"
-                    f"👥 Группа: {group[1]}\n"
-                    f"📅 Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                    f"🏋️‍♂️ Тип: {training.kind}\n"
-                    f"📍 Место: {training.location}"
-                )
+                notification = f"❌ Тренировка отменена:\n\n{render_card(training, group=group[1])}"
                 
                 for username in participants:
                     if user_id := admin_db.get_user_id(username):
@@ -701,23 +694,14 @@ def register_admin_handlers(bot: BotType) -> None:
             if topic_id:
                 forum_manager.send_training_update(training, topic_id, "open")
                 # Обновляем список участников
-                participants = trainer_db.get_participants_by_training_id(training_id)
-                forum_manager.update_participants_list(training, participants, topic_id, trainer_db)
+                forum_manager.update_participants_list(training, topic_id, trainer_db)
             
             # Получаем реквизиты для оплаты
             payment_details = admin_db.get_payment_details(username)
             
-            # Отправляем уведомления всем пользователям
-            users = admin_db.get_all_users()
             notification = (
                 f"🟢 Открыта запись на тренировку!\n\n"
-                f"👥 Группа: {group[1]}\n"
-                f"📅 Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                f"🏋️‍♂️ Тип: {training.kind}\n"
-                f"⏱ Длительность: {training.duration} минут\n"
-                f"📍 Место: {training.location}\n"
-                f"💰 Стоимость: {training.price}₽\n"
-                f"👥 Максимум участников: {training.max_participants}\n"
+                f"{render_card(training, 'full', group=group[1])}\n"
                 f"\n💳 Реквизиты для оплаты:\n{payment_details}"
             )
             
@@ -730,18 +714,16 @@ def register_admin_handlers(bot: BotType) -> None:
             # Отправляем уведомления всем пользователям, кроме тех, кто уже записан через автозапись
             auto_signup_users = trainer_db.get_auto_signup_requests(training_id)
             bot.delete_message(call.message.chat.id, call.message.message_id)
-            for user in users:
-                user_info = admin_db.get_user_info(user[0])
-                try:
-                    if user_info and user_info.username not in auto_signup_users and not user_info.is_admin:
-                        bot.send_message(user[0], notification, reply_markup=markup)
-                except Exception as e:
-                    print(f"Ошибка отправки уведомления пользователю {user[1]}: {e}")
+            recipients = admin_db.get_broadcast_audience(auto_signup_users)
+            trainer_db.clear_auto_signup_requests(training.id)
 
-                if user_info.username in auto_signup_users:
-                    trainer_db.remove_auto_signup_request(user_info.username, training.id)
+            # Рассылку выполняет очередь отправки с учетом лимитов Telegram, итог придет админу
+            outbox_db.create_broadcast(
+                f"открыта запись на {training.date_time.strftime('%d.%m.%Y %H:%M')}",
+                recipients, notification, reply_markup=markup, notify_chat_id=call.from_user.id
+            )
             
-            bot.send_message(call.from_user.id, "✅ Запись открыта")
+            bot.send_message(call.from_user.id, f"✅ Запись открыта, уведомление получат {len(recipients)} чел.")
             
         except Exception as e:
             print(f"Error in open_training: {e}")
@@ -786,20 +768,20 @@ def register_admin_handlers(bot: BotType) -> None:
             'kind_stats': {}   # Для анализа популярных видов тренировок
         }
         
+        # Участники, оплаты и резерв всех тренировок одним запросом
+        rosters = trainer_db.get_rosters(training.id for training in trainings)
         for training in trainings:
-            participants = trainer_db.get_participants_by_training_id(training.id)
-            reserve = trainer_db.get_reserve_list(training.id)
+            roster = rosters[training.id]
+            participants = roster.participants
             
             # Основная статистика
             stats['total_participants'] += len(participants)
-            stats['total_in_reserve'] += len(reserve)
+            stats['total_in_reserve'] += len(roster.reserve)
             if training.status == 'OPEN':
                 stats['active_trainings'] += 1
             
             # Подсчет выручки (только для подтвержденных оплат)
-            confirmed_payments = sum(1 for p in participants 
-                                   if trainer_db.get_payment_status(p, training.id) == 2)
-            stats['total_revenue'] += confirmed_payments * training.price
+            stats['total_revenue'] += roster.paid_count * training.price
             
             # Анализ времени
             hour = training.date_time.strftime('%H:00')
@@ -869,13 +851,7 @@ def register_admin_handlers(bot: BotType) -> None:
             if trainer_db.confirm_payment(username, training_id):
                 # Отправляем уведомление пользователю
                 if user_id := admin_db.get_user_id(username):
-                    notification = (
-                        "✅ Оплата подтверждена!\n\n"
-                        f"👥 Группа: {group[1]}\n"
-                        f"📅 Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                        f"🏋️‍♂️ Тип: {training.kind}\n"
-                        f"📍 Место: {training.location}"
-                    )
+                    notification = f"✅ Оплата подтверждена!\n\n{render_card(training, group=group[1])}"
                     try:
                         bot.send_message(user_id, notification)
                     except Exception as e:
@@ -883,8 +859,7 @@ def register_admin_handlers(bot: BotType) -> None:
                 
                 # Обновляем список в форуме
                 if topic_id := trainer_db.get_topic_id(training_id):
-                    participants = trainer_db.get_participants_by_training_id(training_id)
-                    forum_manager.update_participants_list(training, participants, topic_id, trainer_db)
+                    forum_manager.update_participants_list(training, topic_id, trainer_db)
                 
                 bot.answer_callback_query(call.id, "✅ Оплата подтверждена")
                 bot.delete_message(call.message.chat.id, call.message.message_id)
@@ -958,8 +933,7 @@ def register_admin_handlers(bot: BotType) -> None:
                 forum_manager.send_training_announcement(training, message.from_user.username, topic_id)
                 
                 # Обновляем список участников
-                participants = trainer_db.get_participants_by_training_id(training_id)
-                forum_manager.update_participants_list(training, participants, topic_id, trainer_db)
+                forum_manager.update_participants_list(training, topic_id, trainer_db)
             
             bot.reply_to(
                 message,
@@ -979,10 +953,10 @@ def register_admin_handlers(bot: BotType) -> None:
         # Находим тестовую тренировку
         test_trainings = trainer_db.fetch_all('''
             SELECT training_id FROM schedule 
-            WHERE kind = 'Тестовая' 
+            WHERE kind = 'Тестовая' AND admin_username = ?
             ORDER BY date_time DESC 
             LIMIT 1
-        ''')
+        ''', (trainer_db.admin_username,))
         
         if not test_trainings:
             bot.reply_to(message, "❌ Тестовая тренировка не найдена")
@@ -1002,8 +976,7 @@ def register_admin_handlers(bot: BotType) -> None:
             # Обновляем список в форуме
             if topic_id := trainer_db.get_topic_id(training_id):
                 training = trainer_db.get_training_details(training_id)
-                updated_participants = trainer_db.get_participants_by_training_id(training_id)
-                forum_manager.update_participants_list(training, updated_participants, topic_id, trainer_db)
+                forum_manager.update_participants_list(training, topic_id, trainer_db)
             
             bot.reply_to(message, f"✅ Тестовый участник @{test_participants[-1]} удален")
         else:
@@ -1020,10 +993,10 @@ def register_admin_handlers(bot: BotType) -> None:
         # Находим тестовую тренировку
         test_trainings = trainer_db.fetch_all('''
             SELECT training_id FROM schedule 
-            WHERE kind = 'Тестовая' 
+            WHERE kind = 'Тестовая' AND admin_username = ?
             ORDER BY date_time DESC 
             LIMIT 1
-        ''')
+        ''', (trainer_db.admin_username,))
         
         if not test_trainings:
             bot.reply_to(message, "❌ Тестовая тренировка не найдена")
@@ -1052,8 +1025,7 @@ def register_admin_handlers(bot: BotType) -> None:
         # Обновляем список в форуме
         if topic_id := trainer_db.get_topic_id(training_id):
             training = trainer_db.get_training_details(training_id)
-            updated_participants = trainer_db.get_participants_by_training_id(training_id)
-            forum_manager.update_participants_list(training, updated_participants, topic_id, trainer_db)
+            forum_manager.update_participants_list(training, topic_id, trainer_db)
         
         bot.reply_to(message, f"✅ Добавлен тестовый участник @{new_test_user}")
 
@@ -1124,8 +1096,7 @@ def register_admin_handlers(bot: BotType) -> None:
             # Обновляем список участников в форуме
             if topic_id := trainer_db.get_topic_id(training_id):
                 training = trainer_db.get_training_details(training_id)
-                participants = trainer_db.get_participants_by_training_id(training_id)
-                forum_manager.update_participants_list(training, participants, topic_id, trainer_db)
+                forum_manager.update_participants_list(training, topic_id, trainer_db)
 
     @bot.callback_query_handler(func=lambda call: call.data == "set_invite_limit")
     def set_invite_limit_handler(call: CallbackQuery):
@@ -1262,17 +1233,17 @@ def register_admin_handlers(bot: BotType) -> None:
             bot.answer_callback_query(call.id, "Группа не найдена")
             return
         
-        # Получаем список участников
-        participants = trainer_db.get_participants_by_training_id(training_id)
-        if not participants:
+        # Получаем список участников с отметками оплаты и подтверждения
+        roster = trainer_db.get_roster(training_id)
+        if not roster.participants:
             bot.send_message(call.message.chat.id, "На этой тренировке нет участников")
             return
         
         markup = InlineKeyboardMarkup()
-        for username in participants:
+        for entry in roster.participants:
             markup.add(InlineKeyboardButton(
-                f"❌ @{username}",
-                callback_data=f"remove_participant_{training_id}_${username}$"
+                f"❌ @{entry.username} {participant_mark(entry)}".rstrip(),
+                callback_data=f"remove_participant_{training_id}_${entry.username}$"
             ))
         
         bot.send_message(
@@ -1354,21 +1325,19 @@ def register_admin_handlers(bot: BotType) -> None:
             
             # Закрываем запись (это также очистит списки участников)
             trainer_db.set_training_closed(training_id)
+            forum_manager.forget_participants_list(training_id)
             
             # Отправляем уведомление в форум
             topic_id = trainer_db.get_topic_id(training_id)
             if topic_id:
                 forum_manager.send_training_update(training, topic_id, "close")
                 # Обновляем список участников (теперь пустой) в форуме
-                forum_manager.update_participants_list(training, [], topic_id, trainer_db)
+                forum_manager.update_participants_list(training, topic_id, trainer_db)
             
             # Отправляем уведомления бывшим участникам
             notification = (
                 "🔒 Запись на тренировку закрыта:\n\n"
-                f"👥 Группа: {group[1]}\n"
-                f"📅 Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                f"🏋️‍♂️ Тип: {training.kind}\n"
-                f"📍 Место: {training.location}\n\n"
+                f"{render_card(training, group=group[1])}\n\n"
                 "Список участников очищен. При открытии записи вам нужно будет записаться заново."
             )
             
@@ -1414,10 +1383,7 @@ def register_admin_handlers(bot: BotType) -> None:
             if user_id := admin_db.get_user_id(username):
                 notification = (
                     "❌ Вы были удалены с тренировки:\n\n"
-                    f"👥 Группа: {group[1]}\n"
-                    f"📅 Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                    f"🏋️‍♂️ Тип: {training.kind}\n"
-                    f"📍 Место: {training.location}\n\n"
+                    f"{render_card(training, group=group[1])}\n\n"
                     f"Причина: {reason}"
                 )
                 try:
@@ -1429,8 +1395,7 @@ def register_admin_handlers(bot: BotType) -> None:
             
             # Обновляем список в форуме
             if topic_id := trainer_db.get_topic_id(training_id):
-                participants = trainer_db.get_participants_by_training_id(training_id)
-                forum_manager.update_participants_list(training, participants, topic_id, trainer_db)
+                forum_manager.update_participants_list(training, topic_id, trainer_db)
         else:
             bot.reply_to(message, "❌ Не удалось удалить участника")
 
@@ -1456,10 +1421,8 @@ def register_admin_handlers(bot: BotType) -> None:
             bot.reply_to(message, "❌ Количество должно быть числом")
             return
             
-        # Создаем TrainerDB для пользователя, которому начисляем автозаписи
-        user_db = TrainerDB(username)
-        if user_db.add_auto_signups(username, amount):
-            new_balance = user_db.get_auto_signups_balance(username)
+        if training_store.add_auto_signups(username, amount):
+            new_balance = training_store.get_auto_signups_balance(username)
             bot.reply_to(
                 message, 
                 f"✅ Пользователю @{username} начислено {amount} автозаписей\n"
@@ -1538,14 +1501,7 @@ def register_admin_handlers(bot: BotType) -> None:
                 
                 # Отправляем уведомление пользователю
                 if user_id := admin_db.get_user_id(username):
-                    notification = (
-                        "✅ Сработала автозапись!\n\n"
-                        f"👥 Группа: {group[1]}\n"
-                        f"📅 Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                        f"🏋️‍♂️ Тип: {training.kind}\n"
-                        f"📍 Место: {training.location}\n"
-                        f"💰 Стоимость: {training.price}₽"
-                    )
+                    notification = f"✅ Сработала автозапись!\n\n{render_card(training, 'priced', group=group[1])}"
                     if admin_db.get_payment_time_limit(username) > 0:
                         notification += f"\n💰 Оплата тренировки в течение {admin_db.get_payment_time_limit(username) / 60} часов"
                     try:
@@ -1582,10 +1538,7 @@ def register_admin_handlers(bot: BotType) -> None:
                 if user_id := admin_db.get_user_id(username):
                     notification = (
                         "❌ Оплата не подтверждена!\n\n"
-                        f"👥 Группа: {group[1]}\n"
-                        f"📅 Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                        f"🏋️‍♂️ Тип: {training.kind}\n"
-                        f"📍 Место: {training.location}\n\n"
+                        f"{render_card(training, group=group[1])}\n\n"
                         "Пожалуйста, проверьте правильность оплаты и отправьте новый скриншот"
                     )
                     try:
@@ -1595,8 +1548,7 @@ def register_admin_handlers(bot: BotType) -> None:
                 
                 # Обновляем список в форуме
                 if topic_id := trainer_db.get_topic_id(training_id):
-                    participants = trainer_db.get_participants_by_training_id(training_id)
-                    forum_manager.update_participants_list(training, participants, topic_id, trainer_db)
+                    forum_manager.update_participants_list(training, topic_id, trainer_db)
                 
                 bot.answer_callback_query(call.id, "❌ Оплата отклонена")
                 bot.delete_message(call.message.chat.id, call.message.message_id)
@@ -1645,6 +1597,9 @@ def register_admin_handlers(bot: BotType) -> None:
             minutes = int(hours * 60)
             
             if admin_db.set_payment_time_limit(message.from_user.username, minutes):
+                # Пересчитываем сроки оплаты уже записавшихся участников
+                if minutes > 0:
+                    training_store.schedule_payment_checks(message.from_user.username)
                 status = "отключена" if minutes == 0 else f"установлена на {hours} часов"
                 bot.reply_to(
                     message,
@@ -1655,6 +1610,48 @@ def register_admin_handlers(bot: BotType) -> None:
         except ValueError:
             bot.reply_to(message, "❌ Введите корректное число")
 
+    @bot.callback_query_handler(func=lambda call: call.data == "set_reminders")
+    def set_reminders_handler(call: CallbackQuery):
+        """Обработчик настройки напоминаний о тренировках"""
+        username = call.from_user.username
+
+        if not admin_db.get_admin_channel(username):
+            bot.answer_callback_query(
+                call.id,
+                "❌ Вы не являетесь администратором ни одной группы",
+                show_alert=True
+            )
+            return
+
+        current = ", ".join(f"{minutes / 60:g}" for minutes in admin_db.get_reminder_offsets(username))
+        msg = bot.send_message(
+            call.message.chat.id,
+            f"Сейчас участникам напоминается за: {current or 'не напоминать'} ч.\n\n"
+            "Введите, за сколько часов до тренировки напоминать, через запятую "
+            "(например: 24, 1). 0 - не напоминать:"
+        )
+        bot.register_next_step_handler(msg, process_reminder_offsets)
+
+    def process_reminder_offsets(message: Message):
+        """Обрабатывает введенные интервалы напоминаний"""
+        try:
+            hours = [float(value) for value in message.text.replace(" ", "").split(",") if value]
+            if not hours or any(value < 0 for value in hours):
+                bot.reply_to(message, "❌ Введите неотрицательные числа через запятую")
+                return
+
+            # Храним в минутах, от дальнего напоминания к ближнему
+            offsets = sorted({int(value * 60) for value in hours} - {0}, reverse=True)
+            username = message.from_user.username
+            if admin_db.set_reminder_offsets(username, offsets):
+                TrainerDB(username).reschedule_reminders()
+                status = "отключены" if not offsets else "за " + ", ".join(f"{m / 60:g}" for m in offsets) + " ч."
+                bot.reply_to(message, f"✅ Напоминания о тренировках {status}")
+            else:
+                bot.reply_to(message, "❌ Ошибка при сохранении настроек")
+        except ValueError:
+            bot.reply_to(message, "❌ Введите числа через запятую")
+
     @bot.callback_query_handler(func=lambda call: call.data == "request_admin")
     def request_admin_handler(call: CallbackQuery):
         """Обработчик запроса прав администратора"""
@@ -1,10 +1,11 @@
 from telebot.types import Message
 from new_bot.database.admin import AdminDB
-from new_bot.database.trainer import TrainerDB
+from new_bot.database.trainer import TrainingStore
 from new_bot.database.channel import ChannelDB
 
 admin_db = AdminDB()
 channel_db = ChannelDB()
+training_store = TrainingStore()
 
 def show_user_statistics(message: Message, bot):
     """Показывает статистику пользователя"""
@@ -28,40 +29,30 @@ def show_user_statistics(message: Message, bot):
         'auto_signups_balance': 0
     }
     
-    # Создаем TrainerDB для работы с балансом пользователя
-    user_db = TrainerDB(username)
-    stats['auto_signups_balance'] = user_db.get_auto_signups_balance(username)
+    stats['auto_signups_balance'] = training_store.get_auto_signups_balance(username)
+    group_titles = dict(groups)
     
-    for group in groups:
-        group_id, group_title = group
-        admins = admin_db.get_channel_admins(group_id)
-        group_trainings = 0
+    # Записи пользователя у всех тренеров одним запросом
+    for training, _, paid in training_store.get_user_trainings(username):
+        group_title = group_titles.get(training.channel_id)
+        if group_title is None:
+            continue
+        stats['total_trainings'] += 1
+        if training.status == 'OPEN':
+            stats['active_trainings'] += 1
         
-        for admin in admins:
-            trainer_db = TrainerDB(admin)
-            trainings = trainer_db.get_trainings_for_channel(group_id)
-            
-            for training in trainings:
-                if trainer_db.is_participant(username, training.id):
-                    stats['total_trainings'] += 1
-                    group_trainings += 1
-                    if training.status == 'OPEN':
-                        stats['active_trainings'] += 1
-                    
-                    # Подсчет потраченных денег
-                    if trainer_db.get_payment_status(username, training.id) == 2:
-                        stats['total_spent'] += training.price
-                    
-                    # Статистика по видам тренировок
-                    stats['kind_stats'][training.kind] = stats['kind_stats'].get(training.kind, 0) + 1
-                
-                # Проверяем резерв
-                reserve = trainer_db.get_reserve_list(training.id)
-                if any(r[0] == username for r in reserve):
-                    stats['reserve_count'] += 1
+        # Подсчет потраченных денег
+        if paid == 2:
+            stats['total_spent'] += training.price
         
-        if group_trainings > 0:
-            stats['group_stats'][group_title] = group_trainings
+        # Статистика по группам и видам тренировок
+        stats['group_stats'][group_title] = stats['group_stats'].get(group_title, 0) + 1
+        stats['kind_stats'][training.kind] = stats['kind_stats'].get(training.kind, 0) + 1
+    
+    stats['reserve_count'] = sum(
+        1 for training, _, _, _ in training_store.get_user_reserve_trainings(username)
+        if training.channel_id in group_titles
+    )
     
     # Определяем любимую группу и вид тренировок
     if stats['group_stats']:
@@ -1,26 +1,24 @@
 from datetime import datetime
 from telebot.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, Message
 from new_bot.database.admin import AdminDB
-from new_bot.database.trainer import TrainerDB
+from new_bot.database.trainer import TrainerDB, TrainingStore
 from new_bot.database.channel import ChannelDB
-from new_bot.types import Training, BotType
+from new_bot.types import SignupResult, BotType
 from typing import Optional
 from new_bot.utils.forum_manager import ForumManager
 from new_bot.utils.reserve import offer_spot_to_reserve
+from new_bot.utils.templates import render_card
 
 import re
 
 # Создаем экземпляры баз данных
 admin_db = AdminDB()
 channel_db = ChannelDB()
+training_store = TrainingStore()
 
 def find_training_admin(training_id: int) -> Optional[str]:
     """Находит админа, создавшего тренировку"""
-    for admin in admin_db.get_all_admins():
-        trainer_db = TrainerDB(admin[0])
-        if trainer_db.get_training_details(training_id):
-            return admin[0]
-    return None
+    return training_store.get_training_admin(training_id)
 
 def split_with_username(s: str) -> list:
     pattern = re.compile(r'(\$[^$]*\$)|([^_]+)')
@@ -36,6 +34,10 @@ def split_with_username(s: str) -> list:
 
     return [part for part in parts if part]
 
+def auto_signup_available(training, requests: int, has_request: bool) -> bool:
+    """Можно ли добавить автозапись: под автозаписи отведена половина мест"""
+    return not has_request and training.max_participants // 2 - requests > 0
+
 # Глобальные обработчики для отмены записи
 def cancel_training_handler(call: CallbackQuery, bot: BotType, forum_manager: ForumManager):
     """Обработчик отмены записи на тренировку"""
@@ -69,8 +71,7 @@ def cancel_training_handler(call: CallbackQuery, bot: BotType, forum_manager: Fo
             # Обновляем список в теме
             if topic_id := trainer_db.get_topic_id(training_id):
                 training = trainer_db.get_training_details(training_id)
-                participants = trainer_db.get_participants_by_training_id(training_id)
-                forum_manager.update_participants_list(training, participants, topic_id, trainer_db)
+                forum_manager.update_participants_list(training, topic_id, trainer_db)
         else:
             bot.send_message(call.message.chat.id, "❌ Не удалось отменить запись")
             
@@ -115,9 +116,7 @@ def register_user_handlers(bot: BotType) -> None:
             
             if trainer_db.add_invite(friend_username, admin_username, training_id):
                 # Сразу добавляем в список/резерв только если пользователь существует
-                is_main_list = trainer_db.add_participant(friend_username, training_id)
-                if not is_main_list:
-                    position = trainer_db.add_to_reserve(friend_username, training_id)
+                trainer_db.signup(friend_username, training_id)
                 
                 # Отправляем приглашение
                 markup = InlineKeyboardMarkup()
@@ -128,10 +127,7 @@ def register_user_handlers(bot: BotType) -> None:
                 
                 notification = (
                     f"🎟 @{admin_username} приглашает вас на тренировку!\n\n"
-                    f"👥 Группа: {group[1]}\n"
-                    f"📅 Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                    f"🏋️‍♂️ Тип: {training.kind}\n"
-                    f"📍 Место: {training.location}\n\n"
+                    f"{render_card(training, group=group[1])}\n\n"
                     "У вас есть 2 часа, чтобы принять приглашение"
                 )
                 
@@ -143,8 +139,7 @@ def register_user_handlers(bot: BotType) -> None:
             # Обновляем список в форуме
             if topic_id := trainer_db.get_topic_id(training_id):
                 training = trainer_db.get_training_details(training_id)
-                participants = trainer_db.get_participants_by_training_id(training_id)
-                forum_manager.update_participants_list(training, participants, topic_id, trainer_db)
+                forum_manager.update_participants_list(training, topic_id, trainer_db)
         
         # Формируем итоговое сообщение
         result_message = []
@@ -189,14 +184,8 @@ def register_user_handlers(bot: BotType) -> None:
             bot.answer_callback_query(call.id, "Группа не найдена")
             return
 
-        # Получаем список администраторов группы
-        admins = admin_db.get_channel_admins(group_id)
-        
-        all_trainings = []
-        for admin in admins:
-            trainer_db = TrainerDB(admin)
-            trainings = trainer_db.get_trainings_for_channel(group_id)
-            all_trainings.extend(trainings)
+        # Тренировки всех тренеров группы одним запросом, уже отсортированы по дате
+        all_trainings = training_store.get_channel_schedule(group_id)
 
         if not all_trainings:
             bot.send_message(
@@ -205,18 +194,15 @@ def register_user_handlers(bot: BotType) -> None:
             )
             return
 
-        # Сортируем тренировки по дате
-        all_trainings.sort(key=lambda x: x.date_time)
-        
         message = f"Расписание тренировок группы {group[1]}:\n\n"
-        for training in all_trainings:
+        for training, _, participants_count in all_trainings:
             message += (
                 f"📅 {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
                 f"🏋️‍♂️ {training.kind}\n"
                 f"⏱ {training.duration} минут\n"
                 f"📍 {training.location}\n"
                 f"💰 {training.price}₽\n"
-                f"👥 Участники: {len(trainer_db.get_participants_by_training_id(training.id))}/{training.max_participants}\n"
+                f"👥 Участники: {participants_count}/{training.max_participants}\n"
                 f"📝 Статус: {'Открыта' if training.status == 'OPEN' else 'Закрыта'}\n"
                 "➖➖➖➖➖➖➖➖➖➖\n"
             )
@@ -232,18 +218,10 @@ def register_user_handlers(bot: BotType) -> None:
             return
 
         markup = InlineKeyboardMarkup()
+        open_groups = set(training_store.get_channels_with_open_trainings())
         for group_id, title in groups:
-            # Проверяем, есть ли открытые тренировки в группе
-            has_open_trainings = False
-            admins = admin_db.get_channel_admins(group_id)
-            for admin in admins:
-                trainer_db = TrainerDB(admin)
-                trainings = trainer_db.get_trainings_for_channel(group_id)
-                if any(t.status == "OPEN" for t in trainings):
-                    has_open_trainings = True
-                    break
-
-            if has_open_trainings:
+            # Показываем только группы с открытыми тренировками
+            if group_id in open_groups:
                 markup.add(InlineKeyboardButton(
                     title,
                     callback_data=f"signup_group_{group_id}"
@@ -271,15 +249,7 @@ def register_user_handlers(bot: BotType) -> None:
             return
         
         # Получаем список открытых тренировок для группы
-        open_trainings = []
-        admins = admin_db.get_channel_admins(group_id)
-        
-        for admin in admins:
-            trainer_db = TrainerDB(admin)
-            trainings = trainer_db.get_trainings_for_channel(group_id)
-            for training in trainings:
-                if training.status == "OPEN":
-                    open_trainings.append((training, admin))
+        open_trainings = training_store.get_channel_schedule(group_id, status="OPEN")
         
         if not open_trainings:
             bot.send_message(
@@ -290,12 +260,11 @@ def register_user_handlers(bot: BotType) -> None:
         
         # Создаем клавиатуру с тренировками
         markup = InlineKeyboardMarkup()
-        for training, admin in open_trainings:
-            participants = trainer_db.get_participants_by_training_id(training.id)
+        for training, admin, participants_count in open_trainings:
             button_text = (
                 f"{training.date_time.strftime('%d.%m %H:%M')} | "
                 f"{training.kind} | "
-                f"{len(participants)}/{training.max_participants}"
+                f"{participants_count}/{training.max_participants}"
             )
             markup.add(InlineKeyboardButton(
                 button_text,
@@ -324,42 +293,33 @@ def register_user_handlers(bot: BotType) -> None:
         )
         
         trainer_db = TrainerDB(admin_username)
+        training = trainer_db.get_training_details(training_id)
 
-        if trainer_db.get_training_details(training_id).status == "CLOSED":
+        if training and training.status == "CLOSED":
             bot.send_message(call.message.chat.id, "❌ Эта тренировка не доступна для записи")
             return
 
-        if trainer_db.add_participant(username, training_id):
+        # Проверка мест, запись и резерв выполняются одной транзакцией
+        result = trainer_db.signup(username, training_id)
+
+        if result.status == SignupResult.MAIN:
             bot.send_message(call.message.chat.id, "✅ Вы успешно записались на тренировку!")
             if admin_db.get_payment_time_limit(admin_username) > 0:
                 bot.send_message(call.message.chat.id, f"💰 Оплатите тренировку в течение {int(admin_db.get_payment_time_limit(admin_username) / 60)} часов, чтобы подтвердить запись")
-            
-            # Обновляем список участников в теме
+        elif result.status == SignupResult.RESERVE:
+            bot.send_message(call.message.chat.id, f"ℹ️ Вы добавлены в резерв на позицию {result.position}")
+        elif result.status == SignupResult.NOT_FOUND:
+            bot.send_message(call.message.chat.id, "❌ Тренировка не найдена")
+        elif result.position is not None:
+            bot.send_message(call.message.chat.id, f"❌ Вы уже в резерве на позиции {result.position}")
+        else:
+            bot.send_message(call.message.chat.id, "❌ Вы уже записаны на эту тренировку!")
+
+        # Обновляем список участников в теме
+        if result.status in (SignupResult.MAIN, SignupResult.RESERVE):
             if topic_id := trainer_db.get_topic_id(training_id):
                 training = trainer_db.get_training_details(training_id)
-                participants = trainer_db.get_participants_by_training_id(training_id)
-                forum_manager.update_participants_list(training, participants, topic_id, trainer_db)
-        else:
-            # Проверяем, записан ли уже пользователь
-            existing = trainer_db.fetch_one('''
-                SELECT 1 FROM participants 
-                WHERE username = ? AND training_id = ?
-            ''', (username, training_id))
-            
-            if existing:
-                message = "❌ Вы уже записаны на эту тренировку!"
-            else:
-                # Добавляем в резерв
-                position = trainer_db.add_to_reserve(username, training_id)
-                message = f"ℹ️ Вы добавлены в резерв на позицию {position}"
-                
-                # Обновляем список в теме
-                if topic_id := trainer_db.get_topic_id(training_id):
-                    training = trainer_db.get_training_details(training_id)
-                    participants = trainer_db.get_participants_by_training_id(training_id)
-                    forum_manager.update_participants_list(training, participants, topic_id, trainer_db)
-                
-            bot.send_message(call.message.chat.id, message)
+                forum_manager.update_participants_list(training, topic_id, trainer_db)
         
         # Удаляем сообщение с кнопкой
         bot.delete_message(call.message.chat.id, call.message.message_id)
@@ -379,39 +339,18 @@ def register_user_handlers(bot: BotType) -> None:
     def show_user_trainings(call: CallbackQuery):
         username = call.from_user.username
         
-        # Получаем все группы
-        groups = channel_db.get_all_channels()
-        all_trainings = []
-        all_reserve_trainings = []
-        
-        for group in groups:
-            group_id, group_title = group
-            admins = admin_db.get_channel_admins(group_id)
-            
-            for admin in admins:
-                trainer_db = TrainerDB(admin)
-                
-                # Основные записи
-                trainings = trainer_db.get_trainings_for_channel(group_id)
-                for training in trainings:
-                    if trainer_db.is_participant(username, training.id):
-                        all_trainings.append((group_title, admin, training))
-                
-                # Записи в резерве
-                reserve = trainer_db.fetch_all('''
-                    SELECT s.training_id, s.date_time, s.duration, 
-                    s.kind, s.location, s.status, s.max_participants, 
-                    r.position, r.status
-                    FROM schedule s
-                    JOIN reserve r ON s.training_id = r.training_id
-                    WHERE r.username = ? AND s.channel_id = ?
-                ''', (username, group_id))
-                
-                for r in reserve:
-                    training = Training.from_db_row(r[1:7])
-                    training.id = r[0]
-                    training.channel_id = group_id
-                    all_reserve_trainings.append((group_title, admin, training, r[7], r[8]))
+        # Записи пользователя по всем тренерам - по одному запросу на основной список и резерв
+        group_titles = dict(channel_db.get_all_channels())
+        all_trainings = [
+            (group_titles[training.channel_id], admin, training)
+            for training, admin, _ in training_store.get_user_trainings(username)
+            if training.channel_id in group_titles
+        ]
+        all_reserve_trainings = [
+            (group_titles[training.channel_id], admin, training, position, status)
+            for training, admin, position, status in training_store.get_user_reserve_trainings(username)
+            if training.channel_id in group_titles
+        ]
         
         if not all_trainings and not all_reserve_trainings:
             bot.send_message(call.message.chat.id, "У вас нет активных записей на тренировки")
@@ -430,6 +369,7 @@ def register_user_handlers(bot: BotType) -> None:
                     f"👤 Тренер: @{admin_username}"
                 )
 
+                trainer_db = TrainerDB(admin_username)
                 signup_time = trainer_db.get_signup_time(username, training.id)
                 time_passed = (datetime.now() - signup_time).total_seconds() / 60
                 time_remaining = admin_db.get_payment_time_limit(admin_username) - time_passed
@@ -437,8 +377,6 @@ def register_user_handlers(bot: BotType) -> None:
                 if admin_db.get_payment_time_limit(admin_username) > 0 and trainer_db.get_payment_status(username, training.id) == 0:
                     message += f"\n💰 Оплата тренировки в течение {int(time_remaining)} минут"
                 
-                                
-                trainer_db = TrainerDB(admin_username)
                 row_buttons = []
                 
                 # Проверяем статус оплаты
@@ -500,18 +438,10 @@ def register_user_handlers(bot: BotType) -> None:
             return
 
         markup = InlineKeyboardMarkup()
+        open_groups = set(training_store.get_channels_with_open_trainings())
         for group_id, title in groups:
-            # Проверяем, есть ли открытые тренировки в группе
-            has_open_trainings = False
-            admins = admin_db.get_channel_admins(group_id)
-            for admin in admins:
-                trainer_db = TrainerDB(admin)
-                trainings = trainer_db.get_trainings_for_channel(group_id)
-                if any(t.status == "OPEN" for t in trainings):
-                    has_open_trainings = True
-                    break
-
-            if has_open_trainings:
+            # Показываем только группы с открытыми тренировками
+            if group_id in open_groups:
                 markup.add(InlineKeyboardButton(
                     title,
                     callback_data=f"invite_group_{group_id}"
@@ -538,17 +468,8 @@ def register_user_handlers(bot: BotType) -> None:
             bot.answer_callback_query(call.id, "Группа не найдена")
             return
 
-        # Получаем список открытых тренировок
-        admins = admin_db.get_channel_admins(group_id)
-        open_trainings = []
-        
-        for admin in admins:
-            trainer_db = TrainerDB(admin)
-            trainings = trainer_db.get_trainings_for_channel(group_id)
-            for training in trainings:
-                if training.status == "OPEN":
-                    # Добавляем информацию об админе к тренировке
-                    open_trainings.append((training, admin))
+        # Получаем список открытых тренировок вместе с их админами
+        open_trainings = training_store.get_channel_schedule(group_id, status="OPEN")
 
         if not open_trainings:
             bot.send_message(
@@ -559,7 +480,7 @@ def register_user_handlers(bot: BotType) -> None:
 
         # Создаем клавиатуру с тренировками
         markup = InlineKeyboardMarkup()
-        for training, admin in open_trainings:
+        for training, admin, _ in open_trainings:
             button_text = (
                 f"{training.date_time.strftime('%d.%m.%Y %H:%M')} | "
                 f"{training.kind} | {training.location}"
@@ -640,21 +561,21 @@ def register_user_handlers(bot: BotType) -> None:
             if admin_db.get_payment_time_limit(admin_username) > 0:
                 bot.send_message(call.message.chat.id, f"💰 Оплатите тренировку в течение {int(admin_db.get_payment_time_limit(admin_username) / 60)} часов, чтобы подтвердить запись")
         else:
-            # Обновляем статус приглашения на DECLINED
-            trainer_db.execute_query(
-                "UPDATE invites SET status = 'DECLINED' WHERE username = ? AND training_id = ?",
-                (username, training_id)
-            )
-            # Удаляем из списка/резерва при отказе
-            trainer_db.remove_participant(username, training_id)
-            trainer_db.remove_from_reserve(username, training_id)
+            with trainer_db.transaction():
+                # Обновляем статус приглашения на DECLINED
+                trainer_db.execute_query(
+                    "UPDATE invites SET status = 'DECLINED' WHERE username = ? AND training_id = ?",
+                    (username, training_id)
+                )
+                # Удаляем из списка/резерва при отказе
+                trainer_db.remove_participant(username, training_id)
+                trainer_db.remove_from_reserve(username, training_id)
             bot.send_message(call.message.chat.id, "Вы отказались от приглашения")
         
         # Обновляем список в форуме
         if topic_id := trainer_db.get_topic_id(training_id):
             training = trainer_db.get_training_details(training_id)
-            participants = trainer_db.get_participants_by_training_id(training_id)
-            forum_manager.update_participants_list(training, participants, topic_id, trainer_db)
+            forum_manager.update_participants_list(training, topic_id, trainer_db)
         
         bot.delete_message(call.message.chat.id, call.message.message_id)
         # Отвечаем на callback query, чтобы убрать состояние загрузки
@@ -668,27 +589,22 @@ def register_user_handlers(bot: BotType) -> None:
             bot.answer_callback_query(call.id, "Не удалось определить ваш username")
             return
         
-        # Создаем TrainerDB для работы с балансом пользователя
-        user_db = TrainerDB(username)
-        balance = user_db.get_auto_signups_balance(username)
+        balance = training_store.get_auto_signups_balance(username)
         
         # Получаем текущие автозаписи пользователя по всем группам
         message_text = f"🎫 Ваш баланс автозаписей: {balance}\n\nТекущие автозаписи:\n"
         
-        # Получаем все группы
+        # Получаем все группы и тренировки всех групп с автозаписями одним запросом
         groups = channel_db.get_all_channels()
-        current_auto_signups = []
-        
-        for group in groups:
-            group_id, group_title = group
-            admins = admin_db.get_channel_admins(group_id)
-            
-            for admin in admins:
-                trainer_db = TrainerDB(admin)
-                trainings = trainer_db.get_trainings_for_channel(group_id)
-                for training in trainings:
-                    if trainer_db.has_auto_signup_request(username, training.id):
-                        current_auto_signups.append((group_title, training))
+        schedule = {}
+        for training, _, requests, has_request in training_store.get_auto_signup_schedule(username):
+            schedule.setdefault(training.channel_id, []).append((training, requests, has_request))
+        current_auto_signups = [
+            (group_title, training)
+            for group_id, group_title in groups
+            for training, _, has_request in schedule.get(group_id, [])
+            if has_request
+        ]
         
         if current_auto_signups:
             for group_title, training in current_auto_signups:
@@ -705,18 +621,10 @@ def register_user_handlers(bot: BotType) -> None:
         markup = InlineKeyboardMarkup()
         for group_id, title in groups:
             # Проверяем наличие закрытых тренировок с доступными слотами для автозаписи
-            has_available_trainings = False
-            admins = admin_db.get_channel_admins(group_id)
-            
-            for admin in admins:
-                trainer_db = TrainerDB(admin)
-                trainings = trainer_db.get_trainings_for_channel(group_id)
-                for training in trainings:
-                    if (training.status == "CLOSED" and 
-                        trainer_db.get_available_auto_signup_slots(training.id) > 0 and
-                        not trainer_db.has_auto_signup_request(username, training.id)):
-                        has_available_trainings = True
-                        break
+            has_available_trainings = any(
+                training.status == "CLOSED" and auto_signup_available(training, requests, has_request)
+                for training, requests, has_request in schedule.get(group_id, [])
+            )
             if has_available_trainings:
                 markup.add(InlineKeyboardButton(
                     title,
@@ -752,17 +660,12 @@ def register_user_handlers(bot: BotType) -> None:
             return
         
         # Получаем список тренировок для автозаписи
-        available_trainings = []
-        admins = admin_db.get_channel_admins(group_id)
-        
-        for admin in admins:
-            trainer_db = TrainerDB(admin)
-            trainings = trainer_db.get_trainings_for_channel(group_id)
-            for training in trainings:
-                if (training.status == "CLOSED" and 
-                    trainer_db.get_available_auto_signup_slots(training.id) > 0 and
-                    not trainer_db.has_auto_signup_request(username, training.id)):
-                    available_trainings.append((training, admin))
+        available_trainings = [
+            (training, admin, requests)
+            for training, admin, requests, has_request
+            in training_store.get_auto_signup_schedule(username, group_id, status="CLOSED")
+            if auto_signup_available(training, requests, has_request)
+        ]
         
         if not available_trainings:
             bot.send_message(
@@ -779,8 +682,7 @@ def register_user_handlers(bot: BotType) -> None:
         )
         
         # Отправляем информацию о каждой тренировке отдельным сообщением
-        for training, admin in available_trainings:
-            current_requests = len(trainer_db.get_auto_signup_requests(training.id))
+        for training, admin, current_requests in available_trainings:
             available_slots = training.max_participants // 2
             
             # Создаем клавиатуру для конкретной тренировки
@@ -834,8 +736,7 @@ def register_user_handlers(bot: BotType) -> None:
             return
         
         # Проверяем баланс пользователя
-        user_db = TrainerDB(username)
-        if user_db.get_auto_signups_balance(username) <= 0:
+        if training_store.get_auto_signups_balance(username) <= 0:
             bot.send_message(call.message.chat.id, "У вас нет доступных автозаписей\n🎫 Для пополнения баланса напишите @motirevskiy")
             return
         
@@ -847,8 +748,7 @@ def register_user_handlers(bot: BotType) -> None:
         # Добавляем запрос
         if trainer_db.add_auto_signup_request(username, training_id):
             bot.answer_callback_query(call.id, "✅ Автозапись успешно добавлена", show_alert=True)
-            user_db = TrainerDB(username)
-            user_db.decrease_auto_signups(username)
+            training_store.decrease_auto_signups(username)
             show_auto_signup_info(call)
         else:
             bot.answer_callback_query(call.id, "Не удалось добавить автозапись", show_alert=True)
@@ -883,8 +783,7 @@ def register_user_handlers(bot: BotType) -> None:
         # Обновляем список в форуме
         if topic_id := trainer_db.get_topic_id(training_id):
             training = trainer_db.get_training_details(training_id)
-            participants = trainer_db.get_participants_by_training_id(training_id)
-            forum_manager.update_participants_list(training, participants, topic_id, trainer_db)
+            forum_manager.update_participants_list(training, topic_id, trainer_db)
         
         # Отправляем сообщение и удаляем исходное сообщение с кнопками
         bot.answer_callback_query(call.id)
@@ -0,0 +1,189 @@
+import signal
+import threading
+import time
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+import telebot
+from new_bot.handlers import (
+    register_admin_handlers,
+    register_user_handlers,
+    register_common_handlers
+)
+from new_bot.database.base import close_all_handles
+from new_bot.utils.scheduler import EventScheduler
+from new_bot.utils.metrics import start_metrics_server
+from new_bot.utils.webhook import WebhookServer
+from new_bot.utils.outbox import OutboundDispatcher
+from new_bot.utils.forum_manager import participant_lists
+
+class BotRuntime:
+    """Единственный владелец бота, планировщика и сервера метрик.
+
+    Бот, обработчики и потоки планировщика создаются один раз. Обновления
+    приходят через long polling или, если задан webhook_url, через локальный
+    webhook-сервер. С use_asyncio бот работает поверх AsyncTeleBot, а
+    обработчики регистрируются те же самые. При падении polling перезапускается с экспоненциальной
+    задержкой, а по SIGINT/SIGTERM все компоненты останавливаются через свои
+    stop() и соединения с БД закрываются.
+    """
+    MIN_BACKOFF = 1         # первая пауза перед перезапуском polling, секунды
+    MAX_BACKOFF = 300       # верхняя граница паузы
+    STABLE_POLLING = 600    # после стольких секунд без ошибок пауза сбрасывается
+
+    def __init__(self, token: str, num_threads: int = 8, scheduler_shards: int = 0,
+                 shard_capacity: int = 100, metrics_port: Optional[int] = None,
+                 webhook_url: Optional[str] = None, webhook_listen: Tuple[str, int] = ('127.0.0.1', 8443),
+                 webhook_secret: Optional[str] = None, webhook_queue_size: int = 100,
+                 use_asyncio: bool = False):
+        self.token = token
+        self.num_threads = num_threads
+        self.scheduler_shards = scheduler_shards
+        self.shard_capacity = shard_capacity
+        self.metrics_port = metrics_port
+        self.webhook_url = webhook_url
+        self.webhook_listen = webhook_listen
+        self.webhook_secret = webhook_secret
+        self.webhook_queue_size = webhook_queue_size
+        self.use_asyncio = use_asyncio
+        self.bot = None
+        self.scheduler = None
+        self.outbox = None
+        self.metrics_server = None
+        self.webhook_server = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Создает бота и запускает фоновые компоненты (один раз за время жизни процесса)"""
+        with self._lock:
+            if self.bot is not None:
+                return
+            if self.use_asyncio:
+                # telebot.async_telebot требует aiohttp, поэтому импортируем только в этом режиме
+                from new_bot.utils.async_bot import AsyncBotAdapter
+                self.bot = AsyncBotAdapter(self.token, workers=self.num_threads)
+            elif self.webhook_url:
+                # Обработчики выполняются в пуле webhook-сервера, свой пул бота не нужен
+                self.bot = telebot.TeleBot(self.token, threaded=False)
+            else:
+                self.bot = telebot.TeleBot(self.token, num_threads=self.num_threads)
+
+            # Регистрация всех обработчиков
+            register_common_handlers(self.bot)
+            register_admin_handlers(self.bot)
+            register_user_handlers(self.bot)
+
+            # Планировщик фоновых событий (оплаты, резерв, приглашения, напоминания)
+            self.scheduler = EventScheduler(self.bot, self.scheduler_shards, self.shard_capacity)
+            self.scheduler.start()
+
+            # Очередь исходящих сообщений (рассылки) с учетом лимитов Telegram
+            self.outbox = OutboundDispatcher(self.bot)
+            self.outbox.start()
+
+            if self.metrics_port:
+                self.metrics_server = start_metrics_server(self.metrics_port)
+
+            if self.webhook_url:
+                host, port = self.webhook_listen
+                self.webhook_server = WebhookServer(
+                    self.bot, host, port,
+                    path=urlparse(self.webhook_url).path or '/',
+                    secret_token=self.webhook_secret,
+                    workers=self.num_threads,
+                    queue_size=self.webhook_queue_size
+                )
+                self.webhook_server.start()
+
+    def run(self):
+        """Запускает прием обновлений под наблюдением и блокируется до остановки"""
+        self._install_signal_handlers()
+        self.start()
+        try:
+            if self.webhook_server is not None:
+                self._serve_webhook()
+            else:
+                self._poll()
+        finally:
+            self.shutdown()
+
+    def _poll(self):
+        backoff = self.MIN_BACKOFF
+        while not self._stopping.is_set():
+            started = time.monotonic()
+            try:
+                # Пока установлен webhook, getUpdates отвечает ошибкой 409
+                self.bot.remove_webhook()
+                print("Бот запущен...")
+                self.bot.infinity_polling(timeout=60, long_polling_timeout=60)
+                if self._stopping.is_set():
+                    break
+                print("Polling завершился без запроса остановки")
+            except Exception as e:
+                print(f"Произошла ошибка: {e}")
+
+            # Долгая стабильная работа - начинаем отсчет пауз заново
+            if time.monotonic() - started >= self.STABLE_POLLING:
+                backoff = self.MIN_BACKOFF
+            print(f"Попытка перезапуска через {backoff} сек...")
+            if self._stopping.wait(backoff):
+                break
+            backoff = min(backoff * 2, self.MAX_BACKOFF)
+
+    def _serve_webhook(self):
+        backoff = self.MIN_BACKOFF
+        while not self._stopping.is_set():
+            try:
+                self.bot.set_webhook(url=self.webhook_url, secret_token=self.webhook_secret)
+                print("Бот запущен в режиме webhook...")
+                break
+            except Exception as e:
+                print(f"Не удалось установить webhook: {e}")
+            print(f"Повторная попытка через {backoff} сек...")
+            if self._stopping.wait(backoff):
+                return
+            backoff = min(backoff * 2, self.MAX_BACKOFF)
+        # Обновления принимает сервер, здесь только ждем сигнала остановки
+        self._stopping.wait()
+
+    def stop(self):
+        """Просит run() завершиться; безопасно вызывать из обработчика сигнала"""
+        self._stopping.set()
+        if self.bot is not None:
+            self.bot.stop_polling()
+
+    def shutdown(self):
+        """Останавливает и дожидается всех компонентов, затем закрывает БД"""
+        self._stopping.set()
+        with self._lock:
+            if self.webhook_server is not None:
+                self.webhook_server.stop()
+                self.webhook_server = None
+            # Сначала источники исходящих сообщений, пока бот еще может их отправить
+            if self.scheduler is not None:
+                self.scheduler.stop()
+                self.scheduler = None
+            if self.outbox is not None:
+                self.outbox.stop()
+                self.outbox = None
+            # Ожидающие обновления списков участников публикуем до остановки бота
+            participant_lists.stop()
+            if self.bot is not None:
+                self.bot.stop_bot()
+            if self.metrics_server is not None:
+                self.metrics_server.shutdown()
+                self.metrics_server.server_close()
+                self.metrics_server = None
+            close_all_handles()
+        print("Бот остановлен")
+
+    def _install_signal_handlers(self):
+        # Сигналы можно перехватывать только в главном потоке
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self._on_signal)
+
+    def _on_signal(self, signum, frame):
+        print(f"Получен сигнал {signal.Signals(signum).name}, останавливаем бота...")
+        self.stop()
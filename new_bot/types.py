@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional, List, Dict, Union
 from telebot.types import Message, CallbackQuery
@@ -42,6 +42,105 @@ class Training:
             max_participants=int(max_participants),
         )
 
+@dataclass
+class SignupResult:
+    """Итог записи на тренировку"""
+    MAIN = 'MAIN'            # записан в основной список
+    RESERVE = 'RESERVE'      # мест нет, добавлен в резерв
+    DUPLICATE = 'DUPLICATE'  # уже записан (в основной список или резерв)
+    FULL = 'FULL'            # мест нет, резерв не использовался
+    NOT_FOUND = 'NOT_FOUND'  # тренировка не найдена
+
+    status: str
+    position: Optional[int] = None  # позиция в резерве
+
+    @property
+    def in_main_list(self) -> bool:
+        return self.status == self.MAIN or (self.status == self.DUPLICATE and self.position is None)
+
+@dataclass
+class ScheduledJob:
+    """Отложенное задание планировщика (таблица scheduled_jobs)"""
+    INVITE_EXPIRY = 'invite_expiry'  # истекло время ответа на приглашение
+    OFFER_EXPIRY = 'offer_expiry'    # истекло время на принятие места из резерва
+    PAYMENT = 'payment'              # предупреждение или перенос в резерв за неоплату
+    REMINDER = 'reminder'            # напоминание о тренировке, вид 'reminder:<минут до начала>'
+
+    id: int
+    kind: str
+    due_at: float  # unix-время срабатывания
+    training_id: int
+    username: str = ''  # пусто для заданий уровня тренировки
+    payload: Dict = field(default_factory=dict)
+    admin_username: Optional[str] = None  # тренер тренировки, для распределения по шардам
+
+    @staticmethod
+    def reminder_kind(offset_minutes: int) -> str:
+        return f"{ScheduledJob.REMINDER}:{offset_minutes}"
+
+    @property
+    def reminder_offset(self) -> Optional[int]:
+        """За сколько минут до тренировки напоминание (None - не напоминание)"""
+        prefix, _, minutes = self.kind.partition(':')
+        return int(minutes) if prefix == self.REMINDER and minutes.isdigit() else None
+
+@dataclass
+class OutboxMessage:
+    """Исходящее сообщение в очереди отправки (таблица outbox)"""
+    id: int
+    chat_id: int
+    text: str
+    reply_markup: Optional[str] = None  # клавиатура в JSON
+    parse_mode: Optional[str] = None
+    attempts: int = 0
+    not_before: float = 0  # unix-время, раньше которого не отправлять
+    broadcast_id: Optional[int] = None  # рассылка, к которой относится сообщение
+
+@dataclass
+class RosterEntry:
+    """Участник или резервист тренировки со статусами для отображения списка"""
+    username: str
+    status: str                     # ACTIVE/RESERVE_PENDING у участника, WAITING/OFFERED/DECLINED в резерве
+    paid: int = 0                   # 0 - не оплачено, 1 - ожидает подтверждения, 2 - подтверждено
+    invite_pending: bool = False    # есть неотвеченное приглашение моложе 2 часов
+    reserve_position: Optional[int] = None
+
+@dataclass
+class Roster:
+    """Основной список и резерв тренировки"""
+    participants: List[RosterEntry] = field(default_factory=list)
+    reserve: List[RosterEntry] = field(default_factory=list)
+
+    @property
+    def usernames(self) -> List[str]:
+        return [entry.username for entry in self.participants]
+
+    @property
+    def paid_count(self) -> int:
+        """Сколько участников с подтвержденной оплатой"""
+        return sum(1 for entry in self.participants if entry.paid == 2)
+
+@dataclass
+class Broadcast:
+    """Итог рассылки: сколько получателей, доставлено и не доставлено"""
+    id: int
+    title: str
+    notify_chat_id: Optional[int]  # кому отправить сводку по завершении
+    total: int
+    sent: int
+    failed: int
+    created_at: float
+    finished_at: float
+
+    @property
+    def duration(self) -> float:
+        return max(self.finished_at - self.created_at, 0)
+
+    @property
+    def throughput(self) -> float:
+        """Доставлено сообщений в секунду"""
+        return self.sent / self.duration if self.duration else float(self.sent)
+
 @dataclass
 class User:
     id: int
@@ -0,0 +1,133 @@
+import asyncio
+import inspect
+import threading
+from concurrent.futures import CancelledError
+from typing import Callable, Dict, List, Tuple
+from telebot import asyncio_helper, util
+from telebot.async_telebot import AsyncTeleBot
+from new_bot.database.aio import AsyncDB
+
+# Ожидание закрытия HTTP-сессии при остановке, секунды
+CLOSE_TIMEOUT = 10
+
+class AsyncBotAdapter:
+    """Синхронный фасад над AsyncTeleBot для существующих обработчиков.
+
+    Прием обновлений и все запросы к Telegram API идут через один event loop
+    в отдельном потоке. Обработчики регистрируются теми же register_*_handlers,
+    что и для TeleBot, и выполняются в ограниченном пуле AsyncDB: синхронный
+    код с SQLite не блокирует loop, а вызовы bot.send_message и т.п. из
+    обработчиков и планировщика передаются в loop и ждут результата.
+
+    Обработчик занимает поток пула целиком, включая ожидание ответов Telegram,
+    поэтому одновременно выполняется не больше workers обработчиков - как у
+    TeleBot(num_threads). Остальные обновления ждут в очереди пула, не создавая
+    потоков. Больший параллелизм потребует переписать обработчики на async.
+    """
+
+    def __init__(self, token: str, workers: int = 8):
+        self.async_bot = AsyncTeleBot(token)
+        self.db = AsyncDB(workers)
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="bot-event-loop", daemon=True)
+        self._thread.start()
+        self._polling = None
+        # Обработчики следующего шага по chat_id, как register_next_step_handler в TeleBot
+        self._next_steps: Dict[int, List[Tuple[Callable, tuple, dict]]] = {}
+        self._next_steps_lock = threading.Lock()
+        # Регистрируется первым: сообщение с ожидающим шагом не попадает в обычные обработчики
+        self.async_bot.message_handler(
+            func=self._has_next_step, content_types=util.content_type_media
+        )(self._run_next_step)
+
+    def message_handler(self, **filters):
+        return self._register(self.async_bot.message_handler, filters)
+
+    def callback_query_handler(self, func=None, **filters):
+        return self._register(self.async_bot.callback_query_handler, dict(filters, func=func))
+
+    def _register(self, register, filters):
+        def decorator(handler):
+            async def run(update):
+                try:
+                    await self.db.run(handler, update)
+                except Exception as e:
+                    print(f"Ошибка в обработчике {handler.__name__}: {e}")
+            register(**filters)(run)
+            return handler
+        return decorator
+
+    def register_next_step_handler(self, message, callback, *args, **kwargs):
+        with self._next_steps_lock:
+            self._next_steps.setdefault(message.chat.id, []).append((callback, args, kwargs))
+
+    def _has_next_step(self, message) -> bool:
+        with self._next_steps_lock:
+            return message.chat.id in self._next_steps
+
+    async def _run_next_step(self, message):
+        with self._next_steps_lock:
+            steps = self._next_steps.pop(message.chat.id, [])
+        for callback, args, kwargs in steps:
+            try:
+                await self.db.run(callback, message, *args, **kwargs)
+            except Exception as e:
+                print(f"Ошибка в обработчике шага {callback.__name__}: {e}")
+
+    def infinity_polling(self, timeout: int = 20, long_polling_timeout: int = 20, **kwargs):
+        """Блокирует вызывающий поток, пока идет асинхронный polling"""
+        self._polling = asyncio.run_coroutine_threadsafe(
+            self.async_bot.infinity_polling(
+                timeout=long_polling_timeout, request_timeout=timeout + long_polling_timeout, **kwargs
+            ),
+            self.loop
+        )
+        try:
+            self._polling.result()
+        except CancelledError:
+            pass
+        finally:
+            self._polling = None
+
+    def stop_polling(self):
+        # У AsyncTeleBot нет stop_polling: сбрасываем флаг цикла и отменяем текущий long polling
+        if self._thread.is_alive():
+            self.loop.call_soon_threadsafe(setattr, self.async_bot, '_polling', False)
+        polling = self._polling
+        if polling is not None:
+            polling.cancel()
+
+    def stop_bot(self):
+        """Останавливает polling, дожидается обработчиков и закрывает loop"""
+        self.stop_polling()
+        self.db.shutdown()
+        if self._thread.is_alive():
+            try:
+                asyncio.run_coroutine_threadsafe(self._finish(), self.loop).result(CLOSE_TIMEOUT)
+            except Exception as e:
+                print(f"Ошибка закрытия сессии бота: {e}")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+        self.loop.close()
+
+    async def _finish(self):
+        # Дожидаемся отмененного polling и оставшихся задач, чтобы loop закрылся без висящих корутин
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Сессия aiohttp создается при первом запросе к API
+        if asyncio_helper.session_manager.session is not None:
+            await self.async_bot.close_session()
+
+    def __getattr__(self, name):
+        # Методы Telegram API: корутину выполняем в loop и ждем результат в текущем потоке
+        attr = getattr(self.async_bot, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            if threading.current_thread() is self._thread:
+                raise RuntimeError(f"bot.{name} нельзя вызывать синхронно из event loop")
+            return asyncio.run_coroutine_threadsafe(attr(*args, **kwargs), self.loop).result()
+        return call
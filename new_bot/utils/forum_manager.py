@@ -1,7 +1,37 @@
-from typing import List
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from telebot.apihelper import ApiTelegramException
 from telebot.types import Message
-from new_bot.types import Training
+from new_bot.types import Roster, RosterEntry, Training
 from new_bot.database.trainer import TrainerDB
+from new_bot.utils.metrics import metrics
+from new_bot.utils.templates import render_card
+
+# Окно объединения обновлений списка участников одной тренировки, секунды
+LIST_DEBOUNCE = 2.0
+# Сколько последних опубликованных списков помнить, чтобы не редактировать одинаковые
+PUBLISHED_CACHE_SIZE = 1000
+
+# Отметки резервистов по статусу
+RESERVE_MARKS = {
+    'WAITING': "",
+    'OFFERED': "⏳",
+    'DECLINED': ""
+}
+
+def participant_mark(entry: RosterEntry) -> str:
+    """Отметка участника в списке"""
+    if entry.status == 'RESERVE_PENDING':
+        return "⏳"  # Ожидается подтверждение из резерва
+    if entry.invite_pending:
+        return "⏳"  # Ожидается подтверждение приглашения
+    if entry.status == 'ACTIVE' and entry.paid == 2:
+        return "✅"  # Активный и оплачено
+    return ""  # Не оплачено и другие случаи
 
 class ForumManager:
     def __init__(self, bot):
@@ -26,12 +56,7 @@ class ForumManager:
         """Отправляет объявление о тренировке в тему"""
         message = (
             f"🆕 Новая тренировка от @{admin_username}!\n\n"
-            f"📅 Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-            f"🏋️‍♂️ Тип: {training.kind}\n"
-            f"⏱ Длительность: {training.duration} минут\n"
-            f"📍 Место: {training.location}\n"
-            f"💰 Стоимость: {training.price}₽\n"
-            f"👥 Максимум участников: {training.max_participants}\n"
+            f"{render_card(training, 'full')}\n"
             f"📝 Статус: {'Открыта' if training.status == 'OPEN' else 'Закрыта'}"
         )
         self.bot.send_message(
@@ -40,68 +65,61 @@ class ForumManager:
             message_thread_id=topic_id
         )
 
-    def update_participants_list(self, training: Training, participants: List[str], topic_id: int, trainer_db) -> None:
-        """Обновляет список участников в теме"""
+    def update_participants_list(self, training: Training, topic_id: int, trainer_db) -> None:
+        """Обновляет закрепленный список участников в теме.
+
+        Обновление откладывается на LIST_DEBOUNCE секунд: все изменения тренировки
+        за это время дают одну отрисовку по актуальным данным и одно редактирование.
+        """
+        participant_lists.request(self.bot, training, topic_id, trainer_db)
+
+    def forget_participants_list(self, training_id: int) -> None:
+        """Сбрасывает кэш и ожидающее обновление списка (тренировка закрыта или удалена)"""
+        participant_lists.forget(training_id)
+
+    def render_participants_list(self, training: Training, roster: Roster) -> str:
+        """Формирует текст списка участников и резерва"""
         message = (
             f"Список участников тренировки:\n"
             f"Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
             f"Тип: {training.kind}\n"
             f"Место: {training.location}\n\n"
-            f"Участники ({len(participants)}/{training.max_participants}):\n"
+            f"Участники ({len(roster.participants)}/{training.max_participants}):\n"
         )
         
-        for i, username in enumerate(participants, 1):
-            paid_status = trainer_db.get_payment_status(username, training.id)
-            participant_status = trainer_db.fetch_one('''
-                SELECT status FROM participants 
-                WHERE username = ? AND training_id = ?
-            ''', (username, training.id))[0]
-            
-            # Проверяем статус приглашения
-            invite = trainer_db.fetch_one('''
-                SELECT status FROM invites 
-                WHERE username = ? AND training_id = ? 
-                AND status = 'PENDING'
-                AND invite_timestamp > datetime('now', '-2 hour')
-                ORDER BY invite_timestamp DESC
-                LIMIT 1
-            ''', (username, training.id))
-            
-            # Определяем статус
-            if participant_status == 'RESERVE_PENDING':
-                status = "⏳"  # Ожидается подтверждение из резерва
-            elif invite:
-                status = "⏳"  # Ожидается подтверждение приглашения
-            elif participant_status == 'ACTIVE' and paid_status == 2:
-                status = "✅"  # Активный и оплачено
-            elif participant_status == 'ACTIVE' and paid_status != 2:
-                status = ""  # Активный, но не оплачено
-            else:
-                status = ""   # Другие случаи
-            
-            message += f"{i}. {status} @{username}\n"
+        for i, entry in enumerate(roster.participants, 1):
+            message += f"{i}. {participant_mark(entry)} @{entry.username}\n"
             
         # Добавляем список резерва
-        reserve_list = trainer_db.get_reserve_list(training.id)
-        if reserve_list:
+        if roster.reserve:
             message += "\n📋 Резерв:\n"
-            for username, position, status in reserve_list:
-                status_emoji = {
-                    'WAITING': "",
-                    'OFFERED': "⏳",
-                    'DECLINED': ""
-                }
-                message += f"{position}. {status_emoji[status]} @{username}\n"
+            for entry in roster.reserve:
+                message += f"{entry.reserve_position}. {RESERVE_MARKS.get(entry.status, '')} @{entry.username}\n"
         
-        # Отправляем сообщение в канал
+        return message
+
+    def publish_participants_list(self, training: Training, topic_id: int, text: str,
+                                  message_id: Optional[int]) -> Optional[int]:
+        """Редактирует закрепленный список или, если его нет, отправляет и закрепляет новый.
+        Возвращает ID сообщения со списком"""
+        if message_id:
+            try:
+                self.bot.edit_message_text(text, training.channel_id, message_id)
+                return message_id
+            except ApiTelegramException as e:
+                if 'message is not modified' in e.description:
+                    return message_id
+                if e.error_code != 400:
+                    raise
+                # Сообщение удалено или его нельзя редактировать - публикуем заново
+                print(f"Список участников тренировки {training.id} будет отправлен заново: {e.description}")
+
+        message = self.bot.send_message(training.channel_id, text, message_thread_id=topic_id)
         try:
-            self.bot.send_message(
-                training.channel_id,
-                message,
-                message_thread_id=topic_id
-            )
+            self.bot.pin_chat_message(training.channel_id, message.message_id, disable_notification=True)
         except Exception as e:
-            print(f"Ошибка при обновлении списка участников: {e}")
+            print(f"Ошибка при закреплении списка участников: {e}")
+        return message.message_id
 
     def send_training_update(self, training: Training, topic_id: int, update_type: str) -> None:
         """Отправляет уведомление об изменении тренировки"""
@@ -130,14 +148,7 @@ class ForumManager:
             else:  # edit
                 status_message = "📝 Тренировка была изменена:"
             
-            message = (
-                f"{status_message}\n\n"
-                f"📅 Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                f"🏋️‍♂️ Тип: {training.kind}\n"
-                f"⏱ Длительность: {training.duration} минут\n"
-                f"📍 Место: {training.location}\n"
-                f"👥 Максимум участников: {training.max_participants}"
-            )
+            message = f"{status_message}\n\n{render_card(training, 'details')}"
         
             self.bot.send_message(
                 training.channel_id,
@@ -145,4 +156,117 @@ class ForumManager:
                 message_thread_id=topic_id
             )
         except Exception as e:
-            print(f"Ошибка при отправке уведомления об изменении тренировки: {e}")
\ No newline at end of file
+            print(f"Ошибка при отправке уведомления об изменении тренировки: {e}")
+
+@dataclass
+class _PendingList:
+    bot: object
+    training: Training
+    topic_id: int
+    trainer_db: TrainerDB
+    due: float
+
+class ParticipantListUpdater:
+    """Отложенные обновления списков участников, по одному на тренировку.
+
+    Повторный запрос в пределах окна только заменяет данные ожидающего
+    обновления, поэтому пачка записей дает одну отрисовку. Отрисовка читает
+    актуальные данные из БД в момент выполнения.
+    """
+
+    def __init__(self, delay: float = LIST_DEBOUNCE):
+        self.delay = delay
+        self._pending: Dict[int, _PendingList] = {}
+        self._queue: List[tuple] = []  # (срок, training_id)
+        # training_id -> (ID сообщения, текст) последней публикации: одинаковый список не редактируем
+        self._published: OrderedDict[int, Tuple[int, str]] = OrderedDict()
+        self._published_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def request(self, bot, training: Training, topic_id: int, trainer_db: TrainerDB) -> None:
+        with self._cond:
+            if pending := self._pending.get(training.id):
+                pending.bot, pending.training, pending.topic_id, pending.trainer_db = bot, training, topic_id, trainer_db
+                metrics.inc('forum_list_coalesced_total')
+                return
+            due = time.monotonic() + self.delay
+            self._pending[training.id] = _PendingList(bot, training, topic_id, trainer_db, due)
+            heapq.heappush(self._queue, (due, training.id))
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="forum-list-updater", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def forget(self, training_id: int) -> None:
+        """Убирает тренировку из очереди и из кэша опубликованных списков"""
+        with self._cond:
+            self._pending.pop(training_id, None)
+        with self._published_lock:
+            self._published.pop(training_id, None)
+
+    def _remember(self, training_id: int, message_id: int, text: str) -> None:
+        with self._published_lock:
+            self._published[training_id] = (message_id, text)
+            self._published.move_to_end(training_id)
+            while len(self._published) > PUBLISHED_CACHE_SIZE:
+                self._published.popitem(last=False)
+
+    def flush(self) -> None:
+        """Сразу выполняет все ожидающие обновления"""
+        with self._cond:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            self._queue.clear()
+        for item in pending:
+            self._publish(item)
+
+    def stop(self) -> None:
+        """Останавливает поток, выполнив ожидающие обновления"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        if thread:
+            thread.join()
+        self.flush()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopping and (not self._queue or self._queue[0][0] > time.monotonic()):
+                    self._cond.wait(self._queue[0][0] - time.monotonic() if self._queue else None)
+                if self._stopping:
+                    return
+                _, training_id = heapq.heappop(self._queue)
+                item = self._pending.pop(training_id, None)
+            if item:
+                self._publish(item)
+
+    def _publish(self, item: _PendingList) -> None:
+        trainer_db = item.trainer_db
+        try:
+            with metrics.measure('forum_list_render'):
+                # Тренировку могли изменить или удалить за время ожидания
+                training = trainer_db.get_training_details(item.training.id)
+                if not training:
+                    self.forget(item.training.id)
+                    return
+                forum_manager = ForumManager(item.bot)
+                text = forum_manager.render_participants_list(training, trainer_db.get_roster(training.id))
+                message_id = trainer_db.get_list_message_id(training.id)
+                # Кэш верен только для того же сообщения: после переотправки списка публикуем заново
+                with self._published_lock:
+                    if message_id and self._published.get(training.id) == (message_id, text):
+                        return
+                new_message_id = forum_manager.publish_participants_list(training, item.topic_id, text, message_id)
+                if new_message_id != message_id:
+                    trainer_db.set_list_message_id(training.id, new_message_id)
+                self._remember(training.id, new_message_id, text)
+        except Exception as e:
+            print(f"Ошибка при обновлении списка участников: {e}")
+
+# Общая очередь обновлений для всех экземпляров ForumManager
+participant_lists = ParticipantListUpdater()
@@ -0,0 +1,137 @@
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from new_bot.database.base import queries_in_thread
+
+# Границы корзин гистограмм, секунды (для числа запросов - штуки)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, math.inf)
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> Dict:
+        cumulative, total = {}, 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            cumulative['+Inf' if bound == math.inf else f'{bound:g}'] = total
+        return {'count': self.count, 'sum': self.sum, 'max': self.max, 'buckets': cumulative}
+
+class Metrics:
+    """Счетчики и гистограммы в памяти процесса. Метрика задается именем и видом (kind)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, str], float] = {}
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+
+    def inc(self, name: str, kind: str = '', value: float = 1) -> None:
+        with self._lock:
+            self._counters[(name, kind)] = self._counters.get((name, kind), 0) + value
+
+    def observe(self, name: str, value: float, kind: str = '') -> None:
+        with self._lock:
+            histogram = self._histograms.get((name, kind))
+            if histogram is None:
+                histogram = self._histograms[(name, kind)] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def measure(self, prefix: str, kind: str = '', items: int = 1):
+        """Замеряет блок: длительность, число запросов к БД, обработанные элементы и исключения"""
+        started = time.perf_counter()
+        queries = queries_in_thread()
+        try:
+            yield
+        except Exception:
+            self.inc(f'{prefix}_errors_total', kind)
+            raise
+        finally:
+            self.observe(f'{prefix}_seconds', time.perf_counter() - started, kind)
+            self.observe(f'{prefix}_db_queries', queries_in_thread() - queries, kind)
+            self.inc(f'{prefix}_items_total', kind, items)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'counters': {f'{name}{{{kind}}}': value for (name, kind), value in sorted(self._counters.items())},
+                'histograms': {f'{name}{{{kind}}}': h.snapshot() for (name, kind), h in sorted(self._histograms.items())},
+            }
+
+    def format_prometheus(self) -> str:
+        """Текстовый формат Prometheus"""
+        lines = []
+        with self._lock:
+            for (name, kind), value in sorted(self._counters.items()):
+                lines.append(f'{name}{{kind="{kind}"}} {value:g}')
+            for (name, kind), h in sorted(self._histograms.items()):
+                for bound, count in h.snapshot()['buckets'].items():
+                    lines.append(f'{name}_bucket{{kind="{kind}",le="{bound}"}} {count}')
+                lines.append(f'{name}_sum{{kind="{kind}"}} {h.sum:g}')
+                lines.append(f'{name}_count{{kind="{kind}"}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+    def format_summary(self) -> str:
+        """Краткая сводка для лога: по строке на гистограмму"""
+        lines = []
+        with self._lock:
+            for (name, kind), h in sorted(self._histograms.items()):
+                if h.count:
+                    errors = self._counters.get((name.rsplit('_', 1)[0] + '_errors_total', kind), 0)
+                    lines.append(
+                        f"{name}[{kind}]: n={h.count} avg={h.sum / h.count:.3f} max={h.max:.3f}"
+                        + (f" errors={errors:g}" if errors and name.endswith('_seconds') else "")
+                    )
+        return "\n".join(lines)
+
+# Общий реестр метрик процесса
+metrics = Metrics()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body, content_type = metrics.format_prometheus(), 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body, content_type = json.dumps(metrics.snapshot(), ensure_ascii=False), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port: int, host: str = '127.0.0.1') -> Optional[ThreadingHTTPServer]:
+    """Запускает HTTP-эндпоинт /metrics и /metrics.json в фоновом потоке"""
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        print(f"Не удалось запустить сервер метрик на {host}:{port}: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Метрики доступны на http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,237 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Set
+from telebot.apihelper import ApiTelegramException
+from new_bot.database.base import add_write_listener, remove_write_listener
+from new_bot.database.outbox import OutboxDB
+from new_bot.types import Broadcast, OutboxMessage
+from new_bot.utils.metrics import metrics
+
+# Общий лимит Telegram для бота - около 30 сообщений в секунду
+GLOBAL_RATE = 30
+# Минимальный интервал между сообщениями в один чат: личный чат и группа (20 в минуту)
+PRIVATE_CHAT_INTERVAL = 1.0
+GROUP_CHAT_INTERVAL = 3.0
+
+# Коды ответа, при которых повтор бесполезен: бот заблокирован, чат не найден и т.п.
+PERMANENT_ERRORS = (400, 403)
+
+def format_broadcast_summary(broadcast: Broadcast) -> str:
+    lines = [
+        f"📣 Рассылка завершена: {broadcast.title}\n",
+        f"✅ Доставлено: {broadcast.sent} из {broadcast.total}",
+    ]
+    if broadcast.failed:
+        lines.append(f"❌ Не доставлено: {broadcast.failed}")
+    lines.append(f"⏱ Время: {broadcast.duration:.0f} сек ({broadcast.throughput:.1f} сообщ./сек)")
+    return "\n".join(lines)
+
+class OutboundDispatcher:
+    """Отправляет сообщения из очереди outbox с учетом лимитов Telegram.
+
+    Вызывающий код только ставит сообщение или рассылку в очередь (OutboxDB)
+    и сразу возвращается. Поток-диспетчер держит общий темп GLOBAL_RATE и
+    интервал между сообщениями в один чат, а сами запросы к Telegram идут в
+    пуле из workers потоков, чтобы задержка сети не ограничивала темп. При
+    ответе 429 отправка приостанавливается на retry_after.
+
+    Сообщение помечается отправленным сразу после ответа Telegram, поэтому
+    после перезапуска рассылка продолжается с неотправленных получателей;
+    повтор возможен только для запросов, прерванных в момент отправки.
+    По завершении рассылки ее итог уходит в notify_chat_id.
+    """
+    BATCH_SIZE = 100
+    MAX_SLEEP = 60         # максимальный сон при пустой очереди, секунды
+    RETRY_DELAY = 30       # первая пауза после сетевой ошибки, дальше удваивается
+    MAX_ATTEMPTS = 5
+
+    def __init__(self, bot, rate: float = GLOBAL_RATE, workers: int = 4):
+        self.bot = bot
+        self.db = OutboxDB()
+        self.interval = 1 / rate
+        self.is_running = False
+        self.thread: Optional[threading.Thread] = None
+        self._workers = workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(workers)
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        # id сообщений, которые сейчас отправляются
+        self._in_flight: Set[int] = set()
+        # Доставленные сообщения, которые не удалось отметить в БД: повторяем только отметку
+        self._unrecorded: Set[int] = set()
+        # chat_id -> время, раньше которого в этот чат не пишем
+        self._chat_ready: Dict[int, float] = {}
+        # Были доставлены или отклонены сообщения рассылок - пора проверить их итоги.
+        # При старте True, чтобы закрыть рассылки, завершившиеся до перезапуска
+        self._broadcasts_changed = True
+
+    def start(self):
+        if not self.is_running:
+            self.is_running = True
+            add_write_listener(self._on_write)
+            self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="outbox-sender")
+            self.thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Останавливает отправку, дожидаясь начатых запросов. Остальное остается в очереди"""
+        self.is_running = False
+        remove_write_listener(self._on_write)
+        self._wakeup.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        if self._pool:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def _on_write(self, db_path: str) -> None:
+        if db_path == self.db.db_path:
+            self._wakeup.set()
+
+    def _run(self):
+        while self.is_running:
+            self._wakeup.clear()
+            try:
+                self._record_unrecorded()
+                delay = self._dispatch_pending()
+                if self._broadcasts_changed:
+                    self._broadcasts_changed = False
+                    self._finish_broadcasts()
+            except Exception as e:
+                print(f"Ошибка в очереди отправки: {e}")
+                delay = self.RETRY_DELAY
+            if self._unrecorded:
+                delay = min(delay, self.RETRY_DELAY)
+            if delay > 0:
+                self._wakeup.wait(delay)
+
+    def _dispatch_pending(self) -> float:
+        """Передает в пул пачку наступивших сообщений и возвращает, сколько можно спать"""
+        now = time.time()
+        if now < self._paused_until:
+            return self._paused_until - now
+
+        with self._lock:
+            in_flight = list(self._in_flight | self._unrecorded)
+        batch = self.db.get_pending(now, self.BATCH_SIZE, in_flight)
+        if not batch:
+            next_at = self.db.next_pending_at(in_flight)
+            return self.MAX_SLEEP if next_at is None else min(max(next_at - now, 0), self.MAX_SLEEP)
+
+        for message in batch:
+            if not self.is_running or time.time() < self._paused_until:
+                break
+            self._dispatch(message)
+        return 0
+
+    def _dispatch(self, message: OutboxMessage) -> None:
+        now = time.time()
+        with self._lock:
+            ready = self._chat_ready.get(message.chat_id, 0)
+        if ready > now:
+            # В этот чат писали недавно - откладываем, не занимая общий темп
+            self.db.postpone(message.id, ready, count_attempt=False)
+            return
+
+        # Общий темп: не чаще одного сообщения в interval секунд
+        if self._next_slot > now:
+            time.sleep(self._next_slot - now)
+            now = self._next_slot
+        self._next_slot = now + self.interval
+
+        self._slots.acquire()
+        interval = GROUP_CHAT_INTERVAL if message.chat_id < 0 else PRIVATE_CHAT_INTERVAL
+        with self._lock:
+            self._in_flight.add(message.id)
+            self._chat_ready[message.chat_id] = now + interval
+            if len(self._chat_ready) > 10000:
+                self._chat_ready = {chat: at for chat, at in self._chat_ready.items() if at > now}
+        self._pool.submit(self._deliver, message)
+
+    def _deliver(self, message: OutboxMessage) -> None:
+        try:
+            try:
+                self.bot.send_message(
+                    message.chat_id, message.text,
+                    reply_markup=message.reply_markup, parse_mode=message.parse_mode
+                )
+            except ApiTelegramException as e:
+                self._handle_api_error(message, e)
+                return
+            except Exception as e:
+                self._retry(message, str(e))
+                return
+            metrics.inc('outbox_sent_total')
+            self._record_sent(message)
+        except Exception as e:
+            # Ошибка БД при учете неудачной отправки: сообщение осталось PENDING и будет отправлено позже
+            print(f"Ошибка учета сообщения {message.id} в очереди отправки: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(message.id)
+            self._slots.release()
+
+    def _record_sent(self, message: OutboxMessage) -> None:
+        """Отмечает доставку. Ошибка БД здесь не должна приводить к повторной отправке"""
+        try:
+            self.db.mark_sent([message.id])
+        except Exception as e:
+            print(f"Сообщение {message.id} доставлено, но не отмечено в очереди: {e}")
+            with self._lock:
+                self._unrecorded.add(message.id)
+            # Диспетчер мог уже уснуть на MAX_SLEEP - пусть повторит отметку через RETRY_DELAY
+            self._wakeup.set()
+            return
+        self._settled(message)
+
+    def _record_unrecorded(self) -> None:
+        """Повторяет отметку доставленных сообщений, не записанных из-за ошибки БД"""
+        with self._lock:
+            message_ids = list(self._unrecorded)
+        if not message_ids:
+            return
+        self.db.mark_sent(message_ids)
+        with self._lock:
+            self._unrecorded.difference_update(message_ids)
+        self._broadcasts_changed = True
+
+    def _handle_api_error(self, message: OutboxMessage, error: ApiTelegramException) -> None:
+        if error.error_code == 429:
+            # Flood control: Telegram говорит, сколько ждать; останавливаем всю отправку
+            retry_after = (error.result_json or {}).get('parameters', {}).get('retry_after', 1)
+            self._paused_until = max(self._paused_until, time.time() + retry_after)
+            self.db.postpone(message.id, self._paused_until, error.description, count_attempt=False)
+            metrics.inc('outbox_throttled_total')
+            print(f"Telegram ограничил отправку, пауза {retry_after} сек")
+        elif error.error_code in PERMANENT_ERRORS:
+            self.db.mark_failed(message.id, error.description)
+            metrics.inc('outbox_failed_total')
+            self._settled(message)
+        else:
+            self._retry(message, error.description)
+
+    def _retry(self, message: OutboxMessage, error: str) -> None:
+        if message.attempts + 1 >= self.MAX_ATTEMPTS:
+            print(f"Не удалось отправить сообщение в чат {message.chat_id}: {error}")
+            self.db.mark_failed(message.id, error)
+            metrics.inc('outbox_failed_total')
+            self._settled(message)
+        else:
+            self.db.postpone(message.id, time.time() + self.RETRY_DELAY * 2 ** message.attempts, error)
+
+    def _settled(self, message: OutboxMessage) -> None:
+        """Отмечает окончательный исход сообщения рассылки и будит диспетчер для подведения итогов"""
+        if message.broadcast_id is not None:
+            self._broadcasts_changed = True
+            self._wakeup.set()
+
+    def _finish_broadcasts(self) -> None:
+        for broadcast in self.db.finish_broadcasts():
+            print(f"Рассылка {broadcast.id} завершена: {broadcast.sent}/{broadcast.total}, ошибок {broadcast.failed}")
+            if broadcast.notify_chat_id:
+                self.db.enqueue(broadcast.notify_chat_id, format_broadcast_summary(broadcast))
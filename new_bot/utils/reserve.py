@@ -1,7 +1,10 @@
+import time
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
-from new_bot.database.trainer import TrainerDB
+from new_bot.database.trainer import OFFER_TTL, TrainerDB
 from new_bot.database.admin import AdminDB
 from new_bot.database.channel import ChannelDB
+from new_bot.types import ScheduledJob
+from new_bot.utils.templates import render_card
 
 admin_db = AdminDB()
 channel_db = ChannelDB()
@@ -24,11 +27,13 @@ def offer_spot_to_reserve(training_id: int, admin_username: str, bot):
                 return
             
             # Удаляем из резерва и добавляем в основной список
-            trainer_db.remove_from_reserve(next_username, training_id)
-            trainer_db.execute_query('''
-                INSERT INTO participants (username, training_id, status, signup_time)
-                VALUES (?, ?, 'RESERVE_PENDING', datetime('now'))
-            ''', (next_username, training_id))
+            with trainer_db.transaction():
+                trainer_db.remove_from_reserve(next_username, training_id)
+                trainer_db.execute_query('''
+                    INSERT OR IGNORE INTO participants (username, training_id, status, signup_time)
+                    VALUES (?, ?, 'RESERVE_PENDING', datetime('now'))
+                ''', (next_username, training_id))
+                trainer_db.schedule_job(ScheduledJob.OFFER_EXPIRY, time.time() + OFFER_TTL, training_id, next_username)
             
             markup = InlineKeyboardMarkup()
             markup.row(
@@ -38,10 +43,7 @@ def offer_spot_to_reserve(training_id: int, admin_username: str, bot):
             
             notification = (
                 "🎉 Освободилось место на тренировке!\n\n"
-                f"👥 Группа: {group[1]}\n"
-                f"📅 Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                f"🏋️‍♂️ Тип: {training.kind}\n"
-                f"📍 Место: {training.location}\n\n"
+                f"{render_card(training, group=group[1])}\n\n"
                 "У вас есть 2 часа, чтобы подтвердить участие"
             )
             try:
@@ -51,16 +53,17 @@ def offer_spot_to_reserve(training_id: int, admin_username: str, bot):
                 # if topic_id := trainer_db.get_topic_id(training_id):
                 #     from new_bot.utils.forum_manager import ForumManager
                 #     forum_manager = ForumManager(bot)
-                #     participants = trainer_db.get_participants_by_training_id(training_id)
-                #     forum_manager.update_participants_list(training, participants, topic_id, trainer_db)
+                #     forum_manager.update_participants_list(training, topic_id, trainer_db)
                 
                 return True
             except Exception as e:
                 print(f"Error notifying reserve user {next_username}: {e}")
                 # В случае ошибки отправки возвращаем в резерв
-                trainer_db.execute_query(
-                    "DELETE FROM participants WHERE username = ? AND training_id = ?",
-                    (next_username, training_id)
-                )
-                trainer_db.add_to_reserve(next_username, training_id)
+                with trainer_db.transaction():
+                    trainer_db.execute_query(
+                        "DELETE FROM participants WHERE username = ? AND training_id = ?",
+                        (next_username, training_id)
+                    )
+                    trainer_db.cancel_jobs(training_id, next_username, ScheduledJob.OFFER_EXPIRY)
+                    trainer_db.add_to_reserve(next_username, training_id)
     return False 
\ No newline at end of file
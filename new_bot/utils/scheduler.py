@@ -1,413 +1,465 @@
 import threading
 import time
 from datetime import datetime, timedelta
-from typing import Dict
-from new_bot.database.trainer import TrainerDB
+from collections import defaultdict
+from typing import List
+from new_bot.database.trainer import OFFER_TTL, INVITE_TTL, TrainerDB, TrainingStore
 from new_bot.database.admin import AdminDB
 from new_bot.database.channel import ChannelDB
+from new_bot.database.base import add_write_listener, remove_write_listener
+from new_bot.types import ScheduledJob
 from telebot import TeleBot
 from new_bot.utils.reserve import offer_spot_to_reserve
+from new_bot.utils.sharding import SchedulerShard, ShardHealth, shard_for
+from new_bot.utils.metrics import metrics
+from new_bot.utils.templates import render_card
 
-class InvitationScheduler:
-    def __init__(self, bot: TeleBot):
+# Формат, в котором хранится время записи участника
+DB_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Предупреждение об оплате отправляется за час до переноса в резерв
+PAYMENT_WARNING_BEFORE = timedelta(hours=1)
+
+def _plural(n: int, one: str, few: str, many: str) -> str:
+    if n % 10 == 1 and n % 100 != 11:
+        return one
+    if 2 <= n % 10 <= 4 and not 12 <= n % 100 <= 14:
+        return few
+    return many
+
+def reminder_title(offset_minutes: int) -> str:
+    """Заголовок напоминания за offset_minutes минут до тренировки"""
+    if offset_minutes % 60 == 0:
+        hours = offset_minutes // 60
+        interval = f"{hours} {_plural(hours, 'час', 'часа', 'часов')}"
+    else:
+        interval = f"{offset_minutes} {_plural(offset_minutes, 'минуту', 'минуты', 'минут')}"
+    return f"⏰ Напоминание о тренировке через {interval}:"
+
+class EventScheduler:
+    """Единый планировщик фоновых событий бота.
+
+    Сроки хранятся в таблице scheduled_jobs (их ставят запись, приглашение,
+    предложение места и открытие тренировки). Планировщик спит до ближайшего
+    срока, забирает наступившие задания одним запросом по индексу due_at и
+    выполняет каждое в одной транзакции с удалением задания, поэтому после
+    перезапуска продолжает с того же места без повторов.
+
+    При shards > 0 задания выполняются пулом потоков, разбитым по админам:
+    медленный админ задерживает только свой шард.
+    """
+
+    # Страховочный пересчет (например, если БД меняет другой процесс)
+    MAX_SLEEP = 900
+    # Пауза перед повтором задания, которое не удалось выполнить
+    RETRY_DELAY = 60
+    # Сколько заданий забирать за один запрос
+    BATCH_SIZE = 100
+    # Опрос при переполненных шардах: задания ждут в таблице, пока шард не освободится
+    SATURATED_POLL = 1
+    # Как часто печатать состояние шардов
+    HEALTH_LOG_INTERVAL = 300
+    # Пачка, выполняющаяся дольше, считается зависшей и попадает в лог сразу
+    SLOW_SHARD_SECONDS = 60
+    # Как часто печатать сводку метрик (0 - не печатать)
+    METRICS_LOG_INTERVAL = 300
+
+    def __init__(self, bot: TeleBot, shards: int = 0, shard_capacity: int = 100):
         self.bot = bot
         self.admin_db = AdminDB()
+        self.channel_db = ChannelDB()
+        self.store = TrainingStore()
         self.is_running = False
         self.thread = None
-        
+        self._wakeup = threading.Event()
+        self._handlers = {
+            ScheduledJob.INVITE_EXPIRY: self._process_expired_invite,
+            ScheduledJob.OFFER_EXPIRY: self._process_expired_offer,
+            ScheduledJob.REMINDER: self._process_reminder,
+        }
+        # Задания, которые обрабатываются пачкой: handler(jobs)
+        self._batch_handlers = {
+            ScheduledJob.PAYMENT: self._process_payments,
+        }
+        self.shards = [
+            SchedulerShard(index, self._run_jobs, shard_capacity, self.wake)
+            for index in range(shards)
+        ]
+        self._health_logged_at = time.time()
+        self._metrics_logged_at = time.time()
+
     def start(self):
         """Запускает планировщик в отдельном потоке"""
         if not self.is_running:
             self.is_running = True
-            self.thread = threading.Thread(target=self._run)
+            add_write_listener(self._on_write)
+            for shard in self.shards:
+                shard.start()
+            self.thread = threading.Thread(target=self._run, name="event-scheduler")
             self.thread.daemon = True  # Поток будет завершен вместе с основной программой
             self.thread.start()
-            
+
     def stop(self):
         """Останавливает планировщик"""
         self.is_running = False
+        remove_write_listener(self._on_write)
+        self._wakeup.set()
         if self.thread:
             self.thread.join()
-            
+        for shard in self.shards:
+            shard.stop()
+
+    def health(self) -> List[ShardHealth]:
+        """Состояние шардов (пусто, если задания выполняются в основном потоке)"""
+        return [shard.health() for shard in self.shards]
+
+    def wake(self):
+        """Будит планировщик для пересчета ближайшего срока"""
+        self._wakeup.set()
+
+    def _on_write(self, db_path: str) -> None:
+        # Задания хранятся только в trainers.db, остальные файлы сроков не меняют
+        if db_path == self.store.db_path:
+            self.wake()
+
     def _run(self):
-        """Основной цикл проверки приглашений"""
+        """Основной цикл: выполнить наступившие задания и уснуть до ближайшего"""
         while self.is_running:
+            self._wakeup.clear()
             try:
-                self._check_expired_invites()
+                with metrics.measure('scheduler_tick'):
+                    if self.shards:
+                        delay = self._dispatch_due_jobs()
+                        self._log_health()
+                    else:
+                        self._process_due_jobs()
+                        delay = self._next_delay()
             except Exception as e:
-                print(f"Error in invitation scheduler: {e}")
-            time.sleep(10)  # Проверяем каждую минуту
-            
-    def _check_expired_invites(self):
-        """Проверяет и обрабатывает просроченные приглашения"""
-        admins = self.admin_db.get_all_admins()
-        
-        for admin in admins:
-            admin_username = admin[0]
-            trainer_db = TrainerDB(admin_username)
-            
-            # Получаем просроченные приглашения (больше 1 часа)
-            expired_invites = trainer_db.fetch_all('''
-                SELECT username, training_id 
-                FROM invites 
-                WHERE status = 'PENDING'
-                AND invite_timestamp < datetime('now', '-2 hour')
-            ''')
-            
-            for invite in expired_invites:
-                username, training_id = invite
-                
-                # Отмечаем приглашение как отклоненное
-                trainer_db.execute_query('''
-                    UPDATE invites 
-                    SET status = 'DECLINED' 
-                    WHERE username = ? AND training_id = ?
-                ''', (username, training_id))
-
-                trainer_db.remove_participant(username, training_id)
-                trainer_db.remove_from_reserve(username, training_id)
-
-                # Отправляем уведомление пользователю
-                if user_id := self.admin_db.get_user_id(username):
-                    training = trainer_db.get_training_details(training_id)
-                    if training:
-                        notification = (
-                            "⌛️ Время на принятие приглашения истекло:\n\n"
-                            f"📅 Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                            f"🏋️‍♂️ Тип: {training.kind}\n"
-                            f"📍 Место: {training.location}"
-                        )
-                        try:
-                            self.bot.send_message(user_id, notification)
-                        except Exception as e:
-                            print(f"Error notifying user {username}: {e}")
-                            
-                        # Обновляем список в форуме
-                        if topic_id := trainer_db.get_topic_id(training_id):
-                            from new_bot.utils.forum_manager import ForumManager
-                            forum_manager = ForumManager(self.bot)
-                            participants = trainer_db.get_participants_by_training_id(training_id)
-                            forum_manager.update_participants_list(training, participants, topic_id, trainer_db)
-
-class PaymentScheduler:
-    def __init__(self, bot: TeleBot):
-        self.bot = bot
-        self.admin_db = AdminDB()
-        self.channel_db = ChannelDB()
-        self.is_running = False
-        self.thread = None
-        
-    def start(self):
-        """Запускает планировщик в отдельном потоке"""
-        if not self.is_running:
-            self.is_running = True
-            self.thread = threading.Thread(target=self._run)
-            self.thread.daemon = True
-            self.thread.start()
-            
-    def stop(self):
-        """Останавливает планировщик"""
-        self.is_running = False
-        if self.thread:
-            self.thread.join()
-            
-    def _run(self):
-        """Основной цикл проверки оплат"""
+                print(f"Error in event scheduler: {e}")
+                delay = self.RETRY_DELAY
+            self._log_metrics()
+            self._wakeup.wait(delay)
+
+    def _log_metrics(self) -> None:
+        """Периодически печатает сводку метрик планировщика"""
+        now = time.time()
+        if not self.METRICS_LOG_INTERVAL or now - self._metrics_logged_at < self.METRICS_LOG_INTERVAL:
+            return
+        self._metrics_logged_at = now
+        if summary := metrics.format_summary():
+            print(f"Scheduler metrics:\n{summary}")
+
+    def _next_delay(self, exclude=()) -> float:
+        due_at = self.store.next_job_due(exclude)
+        if due_at is None:
+            return self.MAX_SLEEP
+        return min(max(due_at - time.time(), 0), self.MAX_SLEEP)
+
+    def _process_due_jobs(self) -> None:
+        """Выполняет задания, срок которых наступил"""
         while self.is_running:
+            jobs = self.store.get_due_jobs(time.time(), self.BATCH_SIZE)
+            self._run_jobs(jobs)
+            if len(jobs) < self.BATCH_SIZE:
+                return
+
+    def _dispatch_due_jobs(self) -> float:
+        """Раздает наступившие задания шардам и возвращает паузу до следующей раздачи"""
+        in_flight = set().union(*(shard.in_flight for shard in self.shards))
+        jobs = self.store.get_due_jobs(time.time(), self.BATCH_SIZE * len(self.shards), in_flight)
+
+        by_shard = defaultdict(list)
+        for job in jobs:
+            by_shard[shard_for(job.admin_username or '', len(self.shards))].append(job)
+
+        saturated = False
+        for index, batch in by_shard.items():
+            shard = self.shards[index]
+            # Переполненный шард не получает новых заданий, они ждут в таблице
+            free = shard.free_slots()
+            if free < len(batch):
+                saturated = True
+            if free > 0:
+                shard.submit(batch[:free])
+                in_flight.update(job.id for job in batch[:free])
+
+        if saturated or len(jobs) == self.BATCH_SIZE * len(self.shards):
+            return self.SATURATED_POLL
+        return self._next_delay(in_flight)
+
+    def _log_health(self) -> None:
+        now = time.time()
+        report = self.health()
+        slow = [h for h in report if h.busy_for > self.SLOW_SHARD_SECONDS]
+        if not slow and now - self._health_logged_at < self.HEALTH_LOG_INTERVAL:
+            return
+        self._health_logged_at = now
+        for h in report:
+            print(
+                f"Scheduler shard {h.shard}: pending={h.pending} processed={h.processed} "
+                f"errors={h.errors} latency={h.last_latency:.1f}s max={h.max_latency:.1f}s"
+                + (f" busy={h.busy_for:.0f}s" if h.busy_for else "")
+                + (f" last_error={h.last_error}" if h.last_error else "")
+            )
+
+    def _run_jobs(self, jobs: List[ScheduledJob]) -> int:
+        """Выполняет пачку заданий и возвращает число заданий, отложенных из-за ошибки"""
+        errors = 0
+        now = time.time()
+        for job in jobs:
+            # Опоздание: насколько позже назначенного срока задание начало выполняться
+            metrics.observe('scheduler_job_lateness_seconds', max(now - job.due_at, 0), job.kind.partition(':')[0])
+
+        for kind, batch_handler in self._batch_handlers.items():
+            batch = [job for job in jobs if job.kind == kind]
+            if not batch:
+                continue
             try:
-                self._check_payments()
+                with metrics.measure('scheduler_job', kind, len(batch)):
+                    batch_handler(batch)
             except Exception as e:
-                print(f"Error in payment scheduler: {e}")
-            time.sleep(180)  # Проверяем каждую минуту
-            
-    def _check_payments(self):
-        """Проверяет оплаты и перемещает неоплативших в резерв"""
-        admins = self.admin_db.get_all_admins()
-        
-        for admin in admins:
-            admin_username = admin[0]
-            payment_time_limit = self.admin_db.get_payment_time_limit(admin_username)
-            
-            # Пропускаем, если функция отключена
-            if payment_time_limit == 0:
+                print(f"Error processing {kind} jobs: {e}")
+                errors += len(batch)
+                for job in batch:
+                    self.store.retry_job(job, time.time() + self.RETRY_DELAY)
+        for job in jobs:
+            if job.kind in self._batch_handlers:
                 continue
-                
-            trainer_db = TrainerDB(admin_username)
-            trainings = trainer_db.get_all_trainings()
-            
-            for training in trainings:
-                if training.status != "OPEN":
-                    continue
-                    
-                # Получаем информацию о группе
-                group = self.channel_db.get_channel(training.channel_id)
-                if not group:
-                    continue
-
-                # Получаем только активных участников (не RESERVE_PENDING)
-                participants = trainer_db.fetch_all('''
-                    SELECT username 
-                    FROM participants 
-                    WHERE training_id = ? 
-                    AND status = 'ACTIVE'
-                ''', (training.id,))
-                
-                for participant in participants:
-                    username = participant[0]
-                    # Проверяем время с момента записи
-                    signup_time = trainer_db.get_signup_time(username, training.id)
-                    if not signup_time:
-                        continue
-                        
-                    time_passed = (datetime.now() - signup_time).total_seconds() / 60
-                    print(time_passed)
-                    print(payment_time_limit)
-
-                    if payment_time_limit - time_passed > 59 and payment_time_limit - time_passed < 61:
-                        if trainer_db.get_payment_status(username, training.id) != 2:
-                            user_id = self.admin_db.get_user_id(username)
-                            notification = (
-                                "⚠️ У вас осталось менее часа на оплату тренировки:\n\n"
-                                f"👥 Группа: {group[1]}\n"
-                                f"📅 Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                                f"🏋️‍♂️ Тип: {training.kind}\n"
-                                f"📍 Место: {training.location}\n"
-                            )
-                            try:
-                                self.bot.send_message(user_id, notification)
-                            except Exception as e:
-                                print(f"Error notifying user {username}: {e}")
-                            continue
-
-                    if time_passed > payment_time_limit:
-                        # Проверяем оплату
-                        if trainer_db.get_payment_status(username, training.id) != 2:
-                            # Перемещаем в резерв
-                            trainer_db.remove_participant(username, training.id)
-                            position = trainer_db.add_to_reserve(username, training.id)
-                            
-                            # Уведомляем участника
-                            if user_id := self.admin_db.get_user_id(username):
-                                notification = (
-                                    "⚠️ Вы перемещены в резерв из-за отсутствия оплаты:\n\n"
-                                    f"👥 Группа: {group[1]}\n"
-                                    f"📅 Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                                    f"🏋️‍♂️ Тип: {training.kind}\n"
-                                    f"📍 Место: {training.location}\n"
-                                    f"📋 Позиция в резерве: {position}\n\n"
-                                    f"Время на оплату: {payment_time_limit/60} часов"
-                                )
-                                try:
-                                    self.bot.send_message(user_id, notification)
-                                except Exception as e:
-                                    print(f"Error notifying user {username}: {e}")
-                            
-                            # Предлагаем место следующему в резерве
-                            offer_spot_to_reserve(training.id, admin_username, self.bot)
-                            
-                            # Уведомляем админа
-                            if admin_id := self.admin_db.get_user_id(admin_username):
-                                notification = (
-                                    f"ℹ️ Участник @{username} перемещен в резерв из-за отсутствия оплаты:\n\n"
-                                    f"👥 Группа: {group[1]}\n"
-                                    f"📅 Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                                    f"🏋️‍♂️ Тип: {training.kind}"
-                                )
-                                try:
-                                    self.bot.send_message(admin_id, notification)
-                                except Exception as e:
-                                    print(f"Error notifying admin {admin_username}: {e}")
-                            
-                            # Обновляем список в форуме
-                            if topic_id := trainer_db.get_topic_id(training.id):
-                                from new_bot.utils.forum_manager import ForumManager
-                                forum_manager = ForumManager(self.bot)
-                                participants = trainer_db.get_participants_by_training_id(training.id)
-                                forum_manager.update_participants_list(training, participants, topic_id, trainer_db) 
-
-class ReserveScheduler:
-    def __init__(self, bot: TeleBot):
-        self.bot = bot
-        self.admin_db = AdminDB()
-        self.channel_db = ChannelDB()
-        self.is_running = False
-        self.thread = None
-        
-    def start(self):
-        """Запускает планировщик в отдельном потоке"""
-        if not self.is_running:
-            self.is_running = True
-            self.thread = threading.Thread(target=self._run)
-            self.thread.daemon = True
-            self.thread.start()
-            
-    def stop(self):
-        """Останавливает планировщик"""
-        self.is_running = False
-        if self.thread:
-            self.thread.join()
-            
-    def _run(self):
-        """Основной цикл проверки резерва"""
-        while self.is_running:
+            kind = job.kind.partition(':')[0]
+            handler = self._handlers.get(kind)
             try:
-                self._check_expired_offers()
+                if handler:
+                    with metrics.measure('scheduler_job', kind):
+                        handler(job)
+                else:
+                    print(f"Unknown job kind: {job.kind}")
+                    self.store.claim_job(job)
             except Exception as e:
-                print(f"Error in reserve scheduler: {e}")
-            time.sleep(10)  # Проверяем каждые 10 секунд
-            
-    def _check_expired_offers(self):
-        """Проверяет и обрабатывает просроченные предложения из резерва"""
-        admins = self.admin_db.get_all_admins()
-        
-        for admin in admins:
-            admin_username = admin[0]
-            trainer_db = TrainerDB(admin_username)
-            
-            # Получаем просроченные предложения (больше 2 часов)
-            expired_offers = trainer_db.fetch_all('''
-                SELECT username, training_id, signup_time 
-                FROM participants 
-                WHERE status = 'RESERVE_PENDING'
-                AND signup_time < datetime('now', '-2 hours')
-            ''')
-            
-            for offer in expired_offers:
-                username, training_id, signup_time = offer
-                print(f"Processing expired offer: user={username}, training={training_id}, signup_time={signup_time}")
-                
-                # Удаляем из основного списка
-                trainer_db.execute_query(
-                    "DELETE FROM participants WHERE username = ? AND training_id = ? AND status = 'RESERVE_PENDING'",
-                    (username, training_id)
+                print(f"Error processing {job.kind} for training {job.training_id}: {e}")
+                errors += 1
+                self.store.retry_job(job, time.time() + self.RETRY_DELAY)
+        return errors
+
+    def _trainer_db(self, job: ScheduledJob):
+        admin_username = self.store.get_training_admin(job.training_id)
+        return TrainerDB(admin_username) if admin_username else None
+
+    def _update_forum(self, trainer_db: TrainerDB, training) -> None:
+        """Обновляет список участников в теме форума"""
+        if topic_id := trainer_db.get_topic_id(training.id):
+            from new_bot.utils.forum_manager import ForumManager
+            forum_manager = ForumManager(self.bot)
+            forum_manager.update_participants_list(training, topic_id, trainer_db)
+
+    def _process_expired_invite(self, job: ScheduledJob):
+        """Отклоняет приглашение, на которое не ответили вовремя"""
+        username, training_id = job.username, job.training_id
+        trainer_db = self._trainer_db(job)
+        if not trainer_db:
+            self.store.claim_job(job)
+            return
+
+        # Отмечаем приглашение как отклоненное и убираем из списков одной транзакцией
+        with trainer_db.transaction():
+            if not trainer_db.claim_job(job):
+                return
+            # Приглашение могли принять, отклонить или отправить заново
+            if not trainer_db.fetch_one('''
+                SELECT 1 FROM invites
+                WHERE username = ? AND training_id = ? AND status = 'PENDING'
+                AND invite_timestamp <= datetime('now', ?)
+            ''', (username, training_id, f'-{INVITE_TTL} seconds')):
+                return
+
+            trainer_db.execute_query('''
+                UPDATE invites 
+                SET status = 'DECLINED' 
+                WHERE username = ? AND training_id = ?
+            ''', (username, training_id))
+
+            trainer_db.remove_participant(username, training_id)
+            trainer_db.remove_from_reserve(username, training_id)
+
+        # Отправляем уведомление пользователю
+        if user_id := self.admin_db.get_user_id(username):
+            training = trainer_db.get_training_details(training_id)
+            if training:
+                notification = f"⌛️ Время на принятие приглашения истекло:\n\n{render_card(training)}"
+                try:
+                    self.bot.send_message(user_id, notification)
+                except Exception as e:
+                    print(f"Error notifying user {username}: {e}")
+
+                # Обновляем список в форуме
+                self._update_forum(trainer_db, training)
+
+    def _process_expired_offer(self, job: ScheduledJob):
+        """Возвращает в резерв того, кто не принял предложенное место вовремя"""
+        username, training_id = job.username, job.training_id
+        trainer_db = self._trainer_db(job)
+        if not trainer_db:
+            self.store.claim_job(job)
+            return
+
+        with trainer_db.transaction():
+            if not trainer_db.claim_job(job):
+                return
+            if not trainer_db.fetch_one('''
+                SELECT 1 FROM participants
+                WHERE username = ? AND training_id = ? AND status = 'RESERVE_PENDING'
+                AND signup_time <= datetime('now', ?)
+            ''', (username, training_id, f'-{OFFER_TTL} seconds')):
+                return
+
+            # Удаляем из основного списка
+            trainer_db.execute_query(
+                "DELETE FROM participants WHERE username = ? AND training_id = ? AND status = 'RESERVE_PENDING'",
+                (username, training_id)
+            )
+
+            # Добавляем в конец резерва с новым статусом WAITING
+            position = trainer_db.add_to_reserve(username, training_id)
+
+            # Сбрасываем статус в резерве на WAITING
+            trainer_db.execute_query('''
+                UPDATE reserve 
+                SET status = 'WAITING' 
+                WHERE username = ? AND training_id = ?
+            ''', (username, training_id))
+
+        # Предлагаем место следующему
+        offer_spot_to_reserve(training_id, trainer_db.admin_username, self.bot)
+
+        # Уведомляем пользователя
+        if user_id := self.admin_db.get_user_id(username):
+            training = trainer_db.get_training_details(training_id)
+            if training:
+                notification = (
+                    "⌛️ Время на принятие места истекло:\n\n"
+                    f"{render_card(training)}\n\n"
+                    f"Вы перемещены на позицию {position} в списке резерва"
                 )
-                
-                # Добавляем в конец резерва с новым статусом WAITING
-                position = trainer_db.add_to_reserve(username, training_id)
-                print(f"Added {username} back to reserve at position {position}")
-                
-                # Сбрасываем статус в резерве на WAITING
-                trainer_db.execute_query('''
-                    UPDATE reserve 
-                    SET status = 'WAITING' 
-                    WHERE username = ? AND training_id = ?
-                ''', (username, training_id))
-                
-                # Предлагаем место следующему
-                offer_spot_to_reserve(training_id, admin_username, self.bot)
-                
-                # Уведомляем пользователя
-                if user_id := self.admin_db.get_user_id(username):
-                    training = trainer_db.get_training_details(training_id)
-                    if training:
-                        notification = (
-                            "⌛️ Время на принятие места истекло:\n\n"
-                            f"📅 Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                            f"🏋️‍♂️ Тип: {training.kind}\n"
-                            f"📍 Место: {training.location}\n\n"
-                            f"Вы перемещены на позицию {position} в списке резерва"
-                        )
-                        try:
-                            self.bot.send_message(user_id, notification)
-                            print(f"Sent notification to {username}")
-                        except Exception as e:
-                            print(f"Error notifying user {username}: {e}") 
-
-class ReminderScheduler:
-    def __init__(self, bot: TeleBot):
-        self.bot = bot
-        self.admin_db = AdminDB()
-        self.channel_db = ChannelDB()
-        self.is_running = False
-        self.thread = None
-        
-    def start(self):
-        """Запускает планировщик в отдельном потоке"""
-        if not self.is_running:
-            self.is_running = True
-            self.thread = threading.Thread(target=self._run)
-            self.thread.daemon = True
-            self.thread.start()
-            
-    def stop(self):
-        """Останавливает планировщик"""
-        self.is_running = False
-        if self.thread:
-            self.thread.join()
-            
-    def _run(self):
-        """Основной цикл проверки напоминаний"""
-        while self.is_running:
-            try:
-                self._check_and_send_reminders()
-            except Exception as e:
-                print(f"Error in reminder scheduler: {e}")
-            time.sleep(660)  # Проверяем каждые 8 минут
-            
-    def _check_and_send_reminders(self):
-        """Проверяет и отправляет напоминания о тренировках"""
-        admins = self.admin_db.get_all_admins()
-        
-        for admin in admins:
-            try:
-                admin_username = admin[0]
-                trainer_db = TrainerDB(admin_username)
-                trainings = trainer_db.get_all_trainings()
-                
-                for training in trainings:
-                    if training.status != "OPEN":
-                        continue
-                        
-                    time_until = training.date_time - datetime.now()
-                    hours_until = time_until.total_seconds() / 3600
-                    
-                    # Получаем участников
-                    participants = trainer_db.fetch_all('''
-                        SELECT username 
-                        FROM participants 
-                        WHERE training_id = ? 
-                        AND status = 'ACTIVE'
-                    ''', (training.id,))
-                    
-                    # Получаем информацию о группе
-                    group = self.channel_db.get_channel(training.channel_id)
-                    if not group:
-                        continue
-                    
-                    # За 24 часа
-                    if 23.9 <= hours_until <= 24.1:
-                        for participant in participants:
-                            username = participant[0]
-                            if user_id := self.admin_db.get_user_id(username):
-                                notification = (
-                                    "⏰ Напоминание о тренировке через 24 часа:\n\n"
-                                    f"👥 Группа: {group[1]}\n"
-                                    f"📅 Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                                    f"🏋️‍♂️ Тип: {training.kind}\n"
-                                    f"📍 Место: {training.location}"
-                                )
-                                try:
-                                    self.bot.send_message(user_id, notification)
-                                except Exception as e:
-                                    print(f"Error sending 24h reminder to {username}: {e}")
-                    
-                    # За 1 час
-                    if 0.9 <= hours_until <= 1.1:
-                        for participant in participants:
-                            username = participant[0]
-                            if user_id := self.admin_db.get_user_id(username):
-                                notification = (
-                                    "⏰ Напоминание о тренировке через 1 час:\n\n"
-                                    f"👥 Группа: {group[1]}\n"
-                                    f"📅 Дата: {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-                                    f"🏋️‍♂️ Тип: {training.kind}\n"
-                                    f"📍 Место: {training.location}"
-                                )
-                                try:
-                                    self.bot.send_message(user_id, notification)
-                                except Exception as e:
-                                    print(f"Error sending 1h reminder to {username}: {e}")
-                                    
-            except Exception as e:
-                print(f"Error processing reminders for admin {admin_username}: {e}")
-                continue 
\ No newline at end of file
+                try:
+                    self.bot.send_message(user_id, notification)
+                except Exception as e:
+                    print(f"Error notifying user {username}: {e}")
+
+    def _process_payments(self, jobs: List[ScheduledJob]):
+        """Предупреждает о сроке оплаты и переносит в резерв неоплативших участников.
+
+        По одному запросу к каждой БД на всю пачку, все переносы в одной транзакции.
+        Задание переставляется на следующий срок (предупреждение, затем перенос);
+        отметка warned в payload гарантирует, что предупреждение уйдет один раз.
+        """
+        rows = self.store.get_unpaid_for_jobs([job.id for job in jobs])
+        admins = {admin_username for _, _, admin_username, _, _ in rows}
+        usernames = {username for _, _, _, username, _ in rows} | admins
+        limits, user_ids = self.admin_db.get_payment_context(admins, usernames)
+        titles = self.channel_db.get_channel_titles({training.channel_id for _, training, _, _, _ in rows})
+
+        now = datetime.now()
+        warned, moved = [], []
+        with self.store.transaction():
+            # Задания без строки в выборке (оплачено, участник ушел) просто удаляются
+            claimed = {job.id: job for job in self.store.claim_jobs(jobs)}
+            for job_id, training, admin_username, username, signup_time in rows:
+                job = claimed.get(job_id)
+                payment_time_limit = limits.get(admin_username, 0)
+                # Функция отключена - задание больше не нужно
+                if not job or not signup_time or not payment_time_limit or training.channel_id not in titles:
+                    continue
+
+                deadline = datetime.strptime(signup_time, DB_TIME_FORMAT) + timedelta(minutes=payment_time_limit)
+                warning_at = deadline - PAYMENT_WARNING_BEFORE
+                # Предупреждаем, только если на оплату дается больше часа
+                warn = timedelta(minutes=payment_time_limit) > PAYMENT_WARNING_BEFORE and not job.payload.get('warned')
+
+                if now >= deadline:
+                    trainer_db = TrainerDB(admin_username)
+                    trainer_db.remove_participant(username, training.id)
+                    position = trainer_db.add_to_reserve(username, training.id)
+                    moved.append((training, admin_username, username, position, payment_time_limit))
+                elif warn and now >= warning_at:
+                    self.store.schedule_job(ScheduledJob.PAYMENT, deadline.timestamp(), training.id, username, {'warned': True})
+                    warned.append((training, username))
+                else:
+                    next_due = warning_at if warn else deadline
+                    self.store.schedule_job(ScheduledJob.PAYMENT, next_due.timestamp(), training.id, username, job.payload)
+
+        for training, username in warned:
+            if user_id := user_ids.get(username):
+                notification = (
+                    "⚠️ У вас осталось менее часа на оплату тренировки:\n\n"
+                    + render_card(training, group=titles[training.channel_id])
+                )
+                try:
+                    self.bot.send_message(user_id, notification)
+                except Exception as e:
+                    print(f"Error notifying user {username}: {e}")
+
+        for training, admin_username, username, position, payment_time_limit in moved:
+            group_title = titles[training.channel_id]
+
+            # Уведомляем участника
+            if user_id := user_ids.get(username):
+                notification = (
+                    "⚠️ Вы перемещены в резерв из-за отсутствия оплаты:\n\n"
+                    f"{render_card(training, group=group_title)}\n"
+                    f"📋 Позиция в резерве: {position}\n\n"
+                    f"Время на оплату: {payment_time_limit/60} часов"
+                )
+                try:
+                    self.bot.send_message(user_id, notification)
+                except Exception as e:
+                    print(f"Error notifying user {username}: {e}")
+
+            # Предлагаем место следующему в резерве
+            offer_spot_to_reserve(training.id, admin_username, self.bot)
+
+            # Уведомляем админа
+            if admin_id := user_ids.get(admin_username):
+                notification = (
+                    f"ℹ️ Участник @{username} перемещен в резерв из-за отсутствия оплаты:\n\n"
+                    + render_card(training, 'short', group=group_title)
+                )
+                try:
+                    self.bot.send_message(admin_id, notification)
+                except Exception as e:
+                    print(f"Error notifying admin {admin_username}: {e}")
+
+        # Обновляем списки в форуме, по одному разу на тренировку
+        updated = {}
+        for training, admin_username, _, _, _ in moved:
+            updated[training.id] = (training, admin_username)
+        for training, admin_username in updated.values():
+            self._update_forum(TrainerDB(admin_username), training)
+
+    def _process_reminder(self, job: ScheduledJob):
+        """Напоминает участникам о тренировке. Журнал reminders_sent исключает повторы"""
+        trainer_db = self._trainer_db(job)
+        training = trainer_db.get_training_details(job.training_id) if trainer_db else None
+        group = self.channel_db.get_channel(training.channel_id) if training else None
+        offset = job.reminder_offset
+        recipients = []
+
+        with self.store.transaction():
+            if not self.store.claim_job(job):
+                return
+            # Тренировку могли закрыть или перенести - тогда напоминание уже пересоздано
+            if not group or offset is None or training.status != 'OPEN':
+                return
+            date_time = training.date_time.strftime('%Y-%m-%d %H:%M')
+            if job.payload.get('date_time') != date_time:
+                return
+            recipients = trainer_db.mark_reminders_sent(training.id, offset, date_time)
+
+        if not recipients:
+            return
+        # Текст одинаковый для всех получателей
+        notification = f"{reminder_title(offset)}\n\n{render_card(training, group=group[1])}"
+        for username in recipients:
+            if user_id := self.admin_db.get_user_id(username):
+                try:
+                    self.bot.send_message(user_id, notification)
+                except Exception as e:
+                    print(f"Error sending {job.kind} reminder to {username}: {e}")
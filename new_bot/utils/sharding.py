@@ -0,0 +1,111 @@
+import queue
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Set
+from new_bot.types import ScheduledJob
+
+@dataclass
+class ShardHealth:
+    """Состояние шарда планировщика"""
+    shard: int
+    pending: int             # заданий в очереди и в работе
+    processed: int           # выполнено заданий с запуска
+    errors: int              # заданий, завершившихся ошибкой
+    last_latency: float      # задержка последней пачки: от срока задания до выполнения, сек
+    max_latency: float
+    busy_for: float          # сколько секунд выполняется текущая пачка (0 - простаивает)
+    last_error: Optional[str] = None
+
+def shard_for(key: str, shards: int) -> int:
+    """Номер шарда для ключа (админа). crc32 стабилен между перезапусками, в отличие от hash()"""
+    return zlib.crc32(key.encode()) % shards
+
+class SchedulerShard:
+    """Поток, выполняющий задания планировщика одной группы админов.
+
+    Медленный админ или 429 от Telegram задерживают только свой шард.
+    capacity ограничивает число заданий в очереди шарда: остальные остаются
+    в scheduled_jobs до освобождения места.
+    """
+
+    def __init__(self, index: int, run_jobs: Callable[[List[ScheduledJob]], int],
+                 capacity: int, on_done: Callable[[], None]):
+        self.index = index
+        self.capacity = capacity
+        self._run_jobs = run_jobs
+        self._on_done = on_done
+        self._queue: "queue.Queue[Optional[List[ScheduledJob]]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._in_flight: Set[int] = set()
+        self._processed = 0
+        self._errors = 0
+        self._last_latency = 0.0
+        self._max_latency = 0.0
+        self._last_error: Optional[str] = None
+        self._busy_since: Optional[float] = None
+        self._thread = threading.Thread(target=self._run, name=f"scheduler-shard-{index}", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Дожидается выполнения уже принятых заданий и останавливает поток"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    @property
+    def in_flight(self) -> Set[int]:
+        with self._lock:
+            return set(self._in_flight)
+
+    def free_slots(self) -> int:
+        with self._lock:
+            return self.capacity - len(self._in_flight)
+
+    def submit(self, jobs: List[ScheduledJob]) -> None:
+        with self._lock:
+            self._in_flight.update(job.id for job in jobs)
+        self._queue.put(jobs)
+
+    def _run(self) -> None:
+        while True:
+            jobs = self._queue.get()
+            if jobs is None:
+                return
+            self._busy_since = time.time()
+            try:
+                errors = self._run_jobs(jobs)
+                error = None
+            except Exception as e:
+                errors, error = len(jobs), str(e)
+                print(f"Error in scheduler shard {self.index}: {e}")
+            finally:
+                now = time.time()
+                latency = max(now - job.due_at for job in jobs)
+                with self._lock:
+                    self._in_flight.difference_update(job.id for job in jobs)
+                    self._processed += len(jobs) - errors
+                    self._errors += errors
+                    self._last_latency = latency
+                    self._max_latency = max(self._max_latency, latency)
+                    if error:
+                        self._last_error = error
+                self._busy_since = None
+            self._on_done()
+
+    def health(self) -> ShardHealth:
+        busy_since = self._busy_since
+        with self._lock:
+            return ShardHealth(
+                shard=self.index,
+                pending=len(self._in_flight),
+                processed=self._processed,
+                errors=self._errors,
+                last_latency=self._last_latency,
+                max_latency=self._max_latency,
+                busy_for=time.time() - busy_since if busy_since else 0.0,
+                last_error=self._last_error,
+            )
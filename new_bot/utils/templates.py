@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from new_bot.types import Training
+
+# Строки карточки тренировки в порядке вывода
+CARD_LINES = (
+    ('date', lambda t: f"📅 Дата: {t.date_time.strftime('%d.%m.%Y %H:%M')}"),
+    ('kind', lambda t: f"🏋️‍♂️ Тип: {t.kind}"),
+    ('duration', lambda t: f"⏱ Длительность: {t.duration} минут"),
+    ('location', lambda t: f"📍 Место: {t.location}"),
+    ('price', lambda t: f"💰 Стоимость: {t.price}₽"),
+    ('max_participants', lambda t: f"👥 Максимум участников: {t.max_participants}"),
+)
+
+# Шаблон - набор строк карточки
+TEMPLATES: Dict[str, Tuple[str, ...]] = {
+    'basic': ('date', 'kind', 'location'),
+    'short': ('date', 'kind'),
+    'priced': ('date', 'kind', 'location', 'price'),
+    'details': ('date', 'kind', 'duration', 'location', 'max_participants'),
+    'full': ('date', 'kind', 'duration', 'location', 'price', 'max_participants'),
+}
+
+# Сколько отрисованных карточек хранить
+CACHE_SIZE = 1024
+
+def training_version(training: Training) -> tuple:
+    """Версия карточки: меняется при любом изменении отображаемых полей тренировки"""
+    return (training.date_time, training.kind, training.duration, training.location,
+            training.price, training.max_participants)
+
+class CardRenderer:
+    """Отрисовка карточек тренировок с LRU-кэшем.
+
+    Ключ кэша - (training_id, версия, шаблон, группа), поэтому измененная
+    тренировка получает новую запись, а старая вытесняется. Рассылка по
+    тысячам получателей отрисовывает карточку один раз.
+    """
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self._cache: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, training: Training, template: str = 'basic', group: Optional[str] = None) -> str:
+        key = (training.id, training_version(training), template, group)
+        with self._lock:
+            if (text := self._cache.get(key)) is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return text
+
+        fields = TEMPLATES[template]
+        lines = [f"👥 Группа: {group}"] if group else []
+        lines += [render(training) for name, render in CARD_LINES if name in fields]
+        text = "\n".join(lines)
+
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = text
+            if len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+        return text
+
+# Общий кэш карточек процесса
+cards = CardRenderer()
+
+def render_card(training: Training, template: str = 'basic', group: Optional[str] = None) -> str:
+    """Карточка тренировки: строки шаблона, с группой в начале, если она передана"""
+    return cards.render(training, template, group)
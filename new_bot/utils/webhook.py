@@ -0,0 +1,111 @@
+import hmac
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Optional
+from telebot.types import Update
+from new_bot.utils.metrics import metrics
+
+# Заголовок, в котором Telegram передает secret_token из set_webhook
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+# Максимальный размер тела запроса с обновлением, байты
+MAX_BODY_SIZE = 1024 * 1024
+
+class WebhookServer:
+    """Локальный HTTP-сервер для приема обновлений Telegram через webhook.
+
+    Сервер только принимает POST с JSON обновления и сразу отвечает, а
+    обработка идет в ограниченном пуле потоков через зарегистрированные
+    обработчики бота. Если пул и очередь заняты, отвечаем 503 - Telegram
+    повторит доставку позже.
+    """
+
+    def __init__(self, bot, host: str = '127.0.0.1', port: int = 8443, path: str = '/webhook',
+                 secret_token: Optional[str] = None, workers: int = 8, queue_size: int = 100):
+        self.bot = bot
+        self.path = path
+        self.secret_token = secret_token
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="webhook-worker")
+        # Одновременно выполняемые и ожидающие в пуле обновления
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._server = HTTPServer((host, port), self._make_handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def start(self):
+        """Запускает прием запросов в фоновом потоке"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, name="webhook-server", daemon=True)
+            self._thread.start()
+            print(f"Webhook принимает обновления на http://{self.address[0]}:{self.address[1]}{self.path}")
+
+    def stop(self):
+        """Перестает принимать запросы и дожидается обработки уже принятых"""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+        self._pool.shutdown(wait=True)
+
+    def submit(self, payload) -> bool:
+        """Ставит обновление (dict или JSON-строка) в пул. False - пул переполнен"""
+        if not self._slots.acquire(blocking=False):
+            metrics.inc('webhook_rejected_total')
+            return False
+        future = self._pool.submit(self._dispatch, payload)
+        future.add_done_callback(lambda _: self._slots.release())
+        return True
+
+    def _dispatch(self, payload):
+        with metrics.measure('webhook_update'):
+            try:
+                update = Update.de_json(payload)
+                self.bot.process_new_updates([update])
+            except Exception as e:
+                print(f"Ошибка обработки обновления из webhook: {e}")
+                raise
+
+    def _authorized(self, headers) -> bool:
+        if not self.secret_token:
+            return True
+        return hmac.compare_digest(headers.get(SECRET_HEADER, ''), self.secret_token)
+
+    def _make_handler(self):
+        server = self
+
+        class _WebhookHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != server.path:
+                    return self._reply(404)
+                if not server._authorized(self.headers):
+                    return self._reply(403)
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                except ValueError:
+                    return self._reply(400)
+                if length <= 0 or length > MAX_BODY_SIZE:
+                    return self._reply(400)
+                try:
+                    payload = json.loads(self.rfile.read(length))
+                except ValueError:
+                    return self._reply(400)
+                self._reply(200 if server.submit(payload) else 503)
+
+            def do_GET(self):
+                self._reply(405)
+
+            def _reply(self, code: int):
+                self.send_response(code)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return _WebhookHandler
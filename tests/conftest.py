@@ -0,0 +1,25 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# Модули обработчиков создают экземпляры БД при импорте new_bot, поэтому папку
+# data подменяем до первого импорта пакета
+_session_data_dir = tempfile.mkdtemp(prefix='volleybot-tests-')
+os.environ['BOT_DATA_DIR'] = _session_data_dir
+
+from new_bot.database import base  # noqa: E402
+
+
+def pytest_unconfigure(config):
+    base.close_all_handles()
+    shutil.rmtree(_session_data_dir, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    """Каждый тест работает с отдельной папкой data, не трогая файлы бота"""
+    monkeypatch.setattr(base, 'default_data_dir', lambda: str(tmp_path))
+    yield tmp_path
+    base.close_all_handles()
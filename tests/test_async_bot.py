@@ -0,0 +1,68 @@
+import asyncio
+import json
+import os
+import threading
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from telebot.types import Update, User  # noqa: E402
+
+from new_bot.utils.async_bot import AsyncBotAdapter  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+@pytest.fixture
+def adapter():
+    adapter = AsyncBotAdapter('123456:TEST', workers=2)
+    polled = threading.Event()
+
+    async def get_me():
+        return User(123456, True, 'Bot')
+
+    async def get_updates(*args, **kwargs):
+        # Long polling без сети: ждем, пока polling не отменят
+        polled.set()
+        await asyncio.sleep(60)
+        return []
+
+    adapter.async_bot.get_me = get_me
+    adapter.async_bot.get_updates = get_updates
+    adapter.polled = polled
+    yield adapter
+    if not adapter.loop.is_closed():
+        adapter.stop_bot()
+
+
+def test_stop_bot_ends_polling_and_closes_loop(adapter):
+    polling = threading.Thread(target=adapter.infinity_polling)
+    polling.start()
+    assert adapter.polled.wait(5)
+
+    adapter.stop_bot()
+
+    polling.join(5)
+    assert not polling.is_alive()
+    assert adapter.loop.is_closed()
+    assert not adapter._thread.is_alive()
+
+
+def test_stop_bot_without_polling(adapter):
+    adapter.stop_bot()
+    assert adapter.loop.is_closed()
+
+
+def test_sync_handler_runs_for_update(adapter):
+    handled = threading.Event()
+
+    @adapter.message_handler(commands=['start'])
+    def start(message):
+        handled.set()
+
+    with open(os.path.join(FIXTURES, 'update_start.json')) as f:
+        update = Update.de_json(json.load(f))
+    asyncio.run_coroutine_threadsafe(adapter.async_bot.process_new_updates([update]), adapter.loop).result(5)
+
+    assert handled.wait(5)
@@ -0,0 +1,26 @@
+from new_bot.database.trainer import TrainerDB, TrainingStore
+from new_bot.handlers.user import auto_signup_available
+
+
+def test_auto_signup_schedule_counts_requests_in_one_query():
+    coach = TrainerDB('coach')
+    other = TrainerDB('other')
+    full = coach.add_training(-100, "2030-01-01 19:00", 120, "Игровая", "Зал", 4, "CLOSED", 500)
+    free = other.add_training(-100, "2030-01-02 19:00", 120, "Игровая", "Зал", 4, "CLOSED", 500)
+    elsewhere = coach.add_training(-200, "2030-01-03 19:00", 120, "Игровая", "Зал", 4, "OPEN", 500)
+    for username in ("a", "b"):
+        coach.add_auto_signup_request(username, full)
+    other.add_auto_signup_request("a", free)
+
+    store = TrainingStore()
+    rows = {training.id: (admin, requests, has_request)
+            for training, admin, requests, has_request in store.get_auto_signup_schedule("a")}
+    assert rows == {full: ('coach', 2, True), free: ('other', 1, True), elsewhere: ('coach', 0, False)}
+
+    closed = [
+        (training.id, requests)
+        for training, _, requests, has_request in store.get_auto_signup_schedule("c", -100, status="CLOSED")
+        if auto_signup_available(training, requests, has_request)
+    ]
+    # На тренировке из 4 мест под автозаписи отведено 2, и обе заняты
+    assert closed == [(free, 1)]
@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+import pytest
+from telebot.apihelper import ApiTelegramException
+
+from new_bot.database.trainer import TrainerDB
+from new_bot.utils import forum_manager
+from new_bot.utils.forum_manager import ParticipantListUpdater
+
+
+class ForumBot:
+    def __init__(self):
+        self.calls = []
+        self.next_message_id = 100
+        self.missing = set()
+
+    def send_message(self, chat_id, text, **kwargs):
+        self.next_message_id += 1
+        self.calls.append(('send', self.next_message_id))
+        return SimpleNamespace(message_id=self.next_message_id)
+
+    def pin_chat_message(self, chat_id, message_id, **kwargs):
+        self.calls.append(('pin', message_id))
+
+    def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        if message_id in self.missing:
+            raise ApiTelegramException('editMessageText', None, {
+                'error_code': 400, 'description': 'Bad Request: message to edit not found'
+            })
+        self.calls.append(('edit', message_id))
+
+
+@pytest.fixture
+def updater():
+    updater = ParticipantListUpdater(delay=60)
+    yield updater
+    updater.stop()
+
+
+def _publish(updater, bot, db, training_id):
+    updater.request(bot, db.get_training_details(training_id), 7, db)
+    updater.flush()
+
+
+def test_unchanged_list_is_not_edited_until_forgotten(updater):
+    bot = ForumBot()
+    db = TrainerDB('coach')
+    training_id = db.add_training(-100, "2030-01-01 19:00", 120, "Игровая", "Зал", 10, "OPEN", 500)
+
+    _publish(updater, bot, db, training_id)
+    _publish(updater, bot, db, training_id)
+    assert bot.calls == [('send', 101), ('pin', 101)]
+
+    # После закрытия или удаления тренировки кэш сбрасывается и список публикуется снова
+    updater.forget(training_id)
+    _publish(updater, bot, db, training_id)
+    assert bot.calls[-1] == ('edit', 101)
+
+
+def test_deleted_list_message_is_sent_again(updater):
+    bot = ForumBot()
+    db = TrainerDB('coach')
+    training_id = db.add_training(-100, "2030-01-01 19:00", 120, "Игровая", "Зал", 10, "OPEN", 500)
+    _publish(updater, bot, db, training_id)
+
+    bot.missing.add(101)
+    db.signup("ivan", training_id)
+    _publish(updater, bot, db, training_id)
+
+    assert bot.calls[-2:] == [('send', 102), ('pin', 102)]
+    assert db.get_list_message_id(training_id) == 102
+    assert updater._published[training_id][0] == 102
+
+
+def test_published_cache_is_bounded(updater, monkeypatch):
+    monkeypatch.setattr(forum_manager, 'PUBLISHED_CACHE_SIZE', 2)
+    bot = ForumBot()
+    db = TrainerDB('coach')
+    training_ids = [
+        db.add_training(-100, f"2030-01-0{day} 19:00", 120, "Игровая", "Зал", 10, "OPEN", 500)
+        for day in (1, 2, 3)
+    ]
+    for training_id in training_ids:
+        _publish(updater, bot, db, training_id)
+
+    assert list(updater._published) == training_ids[1:]
@@ -0,0 +1,55 @@
+import sqlite3
+import threading
+import time
+
+from new_bot.database.outbox import OutboxDB
+from new_bot.utils.outbox import OutboundDispatcher
+
+
+class RecordingBot:
+    def __init__(self):
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send_message(self, chat_id, text, **kwargs):
+        with self.lock:
+            self.sent.append((chat_id, text))
+
+
+def _wait_for(condition, timeout: float = 5) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def test_failed_mark_sent_does_not_resend(monkeypatch):
+    bot = RecordingBot()
+    dispatcher = OutboundDispatcher(bot, rate=1000)
+    # Первая отметка доставки падает, как при ошибке диска или блокировке БД
+    mark_sent = dispatcher.db.mark_sent
+    failures = []
+
+    def flaky_mark_sent(message_ids):
+        if not failures:
+            failures.append(message_ids)
+            raise sqlite3.OperationalError("disk I/O error")
+        mark_sent(message_ids)
+
+    monkeypatch.setattr(dispatcher.db, 'mark_sent', flaky_mark_sent)
+    monkeypatch.setattr(OutboundDispatcher, 'RETRY_DELAY', 0.1)
+
+    db = OutboxDB()
+    db.enqueue(42, "Привет")
+    dispatcher.start()
+    try:
+        assert _wait_for(lambda: failures and db.get_pending_count() == 0)
+        # Даем диспетчеру несколько проходов: повторной отправки быть не должно
+        time.sleep(0.3)
+    finally:
+        dispatcher.stop()
+
+    assert bot.sent == [(42, "Привет")]
+    assert dispatcher._unrecorded == set()
@@ -0,0 +1,89 @@
+import threading
+from collections import Counter
+
+from new_bot.database.trainer import TrainerDB
+from new_bot.types import SignupResult
+
+THREADS = 40
+PRESSES = 3
+MAX_PARTICIPANTS = 10
+
+
+def test_signup_does_not_overbook_under_concurrent_presses():
+    db = TrainerDB('coach')
+    training_id = db.add_training(-100, "2030-01-01 19:00", 120, "Игровая", "Зал", MAX_PARTICIPANTS, "OPEN", 500)
+    assert training_id
+    results = []
+    errors = []
+    start = threading.Barrier(THREADS)
+
+    def worker(index: int):
+        worker_db = TrainerDB('coach')
+        start.wait()
+        try:
+            # Повторные нажатия одного пользователя на кнопку записи
+            for _ in range(PRESSES):
+                results.append(worker_db.signup(f"user{index}", training_id))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    outcomes = Counter(result.status for result in results)
+    assert outcomes == {
+        SignupResult.MAIN: MAX_PARTICIPANTS,
+        SignupResult.RESERVE: THREADS - MAX_PARTICIPANTS,
+        SignupResult.DUPLICATE: THREADS * (PRESSES - 1),
+    }
+
+    main_rows = db.fetch_one("SELECT COUNT(*) FROM participants WHERE training_id = ?", (training_id,))[0]
+    assert main_rows == MAX_PARTICIPANTS
+    positions = [row[0] for row in db.fetch_all(
+        "SELECT position FROM reserve WHERE training_id = ? ORDER BY position", (training_id,)
+    )]
+    assert positions == list(range(1, THREADS - MAX_PARTICIPANTS + 1))
+
+
+def test_signup_reports_existing_place():
+    db = TrainerDB('coach')
+    training_id = db.add_training(-100, "2030-01-01 19:00", 120, "Игровая", "Зал", 1, "OPEN", 500)
+
+    assert db.signup("first", training_id).status == SignupResult.MAIN
+    assert db.signup("second", training_id) == SignupResult(SignupResult.RESERVE, position=1)
+    assert db.signup("first", training_id).in_main_list
+    assert db.signup("second", training_id) == SignupResult(SignupResult.DUPLICATE, position=1)
+    assert not db.add_participant("third", training_id)
+    assert db.signup("ghost", training_id + 1).status == SignupResult.NOT_FOUND
+
+
+def test_signup_button_for_missing_training_reports_not_found(monkeypatch):
+    from telebot import TeleBot
+    from telebot.types import Update
+    from new_bot.database.admin import AdminDB
+    from new_bot.handlers import user
+
+    monkeypatch.setattr(user, 'admin_db', AdminDB())
+    bot = TeleBot('123456:TEST', threaded=False)
+    sent = []
+    monkeypatch.setattr(bot, 'send_message', lambda chat_id, text, **kwargs: sent.append(text))
+    monkeypatch.setattr(bot, 'delete_message', lambda *args, **kwargs: None)
+    user.register_user_handlers(bot)
+
+    sender = {"id": 42, "is_bot": False, "first_name": "Иван", "username": "ivan"}
+    bot.process_new_updates([Update.de_json({
+        "update_id": 1,
+        "callback_query": {
+            "id": "1",
+            "from": sender,
+            "chat_instance": "1",
+            "data": "signup_training_$coach$_999",
+            "message": {"message_id": 7, "date": 0, "chat": {"id": 42, "type": "private"}, "text": "..."},
+        },
+    })])
+
+    assert sent == ["❌ Тренировка не найдена"]
@@ -0,0 +1,54 @@
+import threading
+
+from new_bot.database.trainer import TrainerDB
+
+THREADS = 50
+TRAININGS = 5
+LIMIT = 25
+
+
+def _add_trainings(db: TrainerDB, count: int, limit: int):
+    return [
+        db.add_training(-100, f"2030-01-{day + 1:02d} 19:00", 120, "Игровая", "Зал", limit, "OPEN", 500)
+        for day in range(count)
+    ]
+
+
+def test_connections_use_wal_and_busy_timeout():
+    db = TrainerDB('coach')
+    conn = db.connection
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+    # synchronous=NORMAL
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+
+
+def test_add_participant_from_many_threads(capsys):
+    db = TrainerDB('coach')
+    training_ids = _add_trainings(db, TRAININGS, LIMIT)
+    assert all(training_ids)
+    errors = []
+    start = threading.Barrier(THREADS)
+
+    def worker(index: int):
+        # У каждого потока свой экземпляр, как у обработчиков telebot
+        worker_db = TrainerDB('coach')
+        start.wait()
+        try:
+            for training_id in training_ids:
+                for press in range(3):
+                    worker_db.add_participant(f"user{index}_{press}", training_id)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    # add_participant печатает ошибки вместо исключений
+    assert "database is locked" not in capsys.readouterr().out
+    for training_id in training_ids:
+        assert len(db.get_participants_by_training_id(training_id)) == LIMIT
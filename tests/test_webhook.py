@@ -0,0 +1,65 @@
+import http.client
+import os
+import threading
+
+import pytest
+from telebot import TeleBot
+
+from new_bot.utils.webhook import SECRET_HEADER, WebhookServer
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+SECRET = 'test-secret'
+
+
+@pytest.fixture
+def recorded_update() -> bytes:
+    with open(os.path.join(FIXTURES, 'update_start.json'), 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def bot():
+    # threaded=False: обработчик выполняется в потоке пула webhook
+    return TeleBot('123456:TEST', threaded=False)
+
+
+@pytest.fixture
+def server(bot):
+    server = WebhookServer(bot, port=0, secret_token=SECRET, workers=2, queue_size=2)
+    server.start()
+    yield server
+    server.stop()
+
+
+def _post(server: WebhookServer, body: bytes, headers: dict) -> int:
+    conn = http.client.HTTPConnection(*server.address, timeout=5)
+    try:
+        conn.request('POST', server.path, body=body, headers=headers)
+        return conn.getresponse().status
+    finally:
+        conn.close()
+
+
+def test_recorded_update_reaches_handler(bot, server, recorded_update):
+    handled = threading.Event()
+    received = []
+
+    @bot.message_handler(commands=['start'])
+    def start(message):
+        received.append((message.from_user.username, message.chat.id))
+        handled.set()
+
+    status = _post(server, recorded_update, {SECRET_HEADER: SECRET, 'Content-Type': 'application/json'})
+
+    assert status == 200
+    assert handled.wait(5)
+    assert received == [('ivan_volley', 287451903)]
+
+
+def test_rejects_wrong_secret(server, recorded_update):
+    assert _post(server, recorded_update, {SECRET_HEADER: 'wrong'}) == 403
+
+
+def test_rejects_malformed_requests(server):
+    assert _post(server, b'not json', {SECRET_HEADER: SECRET}) == 400
+    assert _post(server, b'{}', {SECRET_HEADER: SECRET, 'Content-Length': 'abc'}) == 400